@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 
 import os
 from pathlib import Path
+from typing import Any
 
 import environ
 
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "music_tracker.tracker.middleware.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -57,9 +59,19 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "music_tracker.urls"
 
-TEMPLATES = [
+# Per-view timing metrics, see tracker/metrics.py. The p50/p95/p99 are available to
+# staff at /performance/
+PERFORMANCE_METRICS_ENABLED = env.bool("PERFORMANCE_METRICS_ENABLED", default=False)
+PERFORMANCE_METRICS_WINDOW = env.int("PERFORMANCE_METRICS_WINDOW", default=1000)
+PERFORMANCE_SERVER_TIMING = env.bool("PERFORMANCE_SERVER_TIMING", default=DEBUG)
+
+TEMPLATES: list[dict[str, Any]] = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": (
+            "music_tracker.tracker.metrics.TimedDjangoTemplates"
+            if PERFORMANCE_METRICS_ENABLED
+            else "django.template.backends.django.DjangoTemplates"
+        ),
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -75,14 +87,95 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "music_tracker.wsgi.application"
 
+# Cache-Control for the public pages: how long browsers and shared caches like nginx
+# (see music_tracker_nginx.conf) keep a page before revalidating it with its ETag
+PAGE_MAX_AGE = env.int("PAGE_MAX_AGE", default=0)
+PAGE_SHARED_MAX_AGE = env.int("PAGE_SHARED_MAX_AGE", default=60)
+
+# Route the public pages to the async views in tracker/async_views.py, for serving
+# asgi.py with an ASGI server like uvicorn. Under WSGI they'd only add overhead.
+ASYNC_PUBLIC_VIEWS = env.bool("ASYNC_PUBLIC_VIEWS", default=False)
+
 
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# Applied to every new SQLite connection. WAL lets readers carry on while the admin
+# writes, and NORMAL sync is safe with WAL. A negative cache_size is in KiB.
+SQLITE_PRAGMAS = {
+    "journal_mode": env.str("SQLITE_JOURNAL_MODE", default="WAL"),
+    "synchronous": env.str("SQLITE_SYNCHRONOUS", default="NORMAL"),
+    "mmap_size": env.int("SQLITE_MMAP_SIZE", default=256 * 1024 * 1024),
+    "cache_size": env.int("SQLITE_CACHE_SIZE", default=-64 * 1024),
+    "temp_store": env.str("SQLITE_TEMP_STORE", default="MEMORY"),
+}
+
+# How often, in seconds, a persistent connection runs PRAGMA optimize. 0 turns it off.
+SQLITE_OPTIMIZE_INTERVAL = env.int("SQLITE_OPTIMIZE_INTERVAL", default=60 * 60)
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": env.int("DB_CONN_MAX_AGE", default=10 * 60),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "init_command": ";".join(
+                f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()
+            ),
+            # Seconds to wait on a lock before "database is locked"
+            "timeout": env.float("SQLITE_BUSY_TIMEOUT", default=5),
+            # Take the write lock up front, so the busy timeout applies instead of
+            # failing when a read transaction tries to upgrade
+            "transaction_mode": "IMMEDIATE",
+        },
+    }
+}
+
+# Public pages read from a read-only snapshot of the database, refreshed after every
+# committed write, so they never wait on the admin. See tracker/snapshot.py
+SNAPSHOT_DATABASE_ENABLED = env.bool("SNAPSHOT_DATABASE_ENABLED", default=False)
+SNAPSHOT_DATABASE_PATH = env.str(
+    "SNAPSHOT_DATABASE_PATH", default=os.path.join(BASE_DIR, "snapshot.sqlite3")
+)
+SNAPSHOT_MMAP_SIZE = env.int("SNAPSHOT_MMAP_SIZE", default=1024 * 1024 * 1024)
+
+if SNAPSHOT_DATABASE_ENABLED:
+    DATABASES["snapshot"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        # Nothing writes to the snapshot in place, so SQLite can skip locking and
+        # change detection entirely
+        "NAME": f"{Path(SNAPSHOT_DATABASE_PATH).as_uri()}?mode=ro&immutable=1",
+        "CONN_MAX_AGE": DATABASES["default"]["CONN_MAX_AGE"],
+        "OPTIONS": {
+            "init_command": ";".join(
+                [
+                    f"PRAGMA mmap_size={SNAPSHOT_MMAP_SIZE}",
+                    f"PRAGMA cache_size={SQLITE_PRAGMAS['cache_size']}",
+                    f"PRAGMA temp_store={SQLITE_PRAGMAS['temp_store']}",
+                ]
+            ),
+        },
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["music_tracker.tracker.snapshot.SnapshotRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# File based by default so every uwsgi worker sees the same entries (and the same
+# invalidations)
+
+CACHES = {
+    "default": {
+        "BACKEND": env.str(
+            "CACHE_BACKEND",
+            default="django.core.cache.backends.filebased.FileBasedCache",
+        ),
+        "LOCATION": env.str("CACHE_LOCATION", default=os.path.join(BASE_DIR, "cache")),
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": env.int("CACHE_MAX_ENTRIES", default=10000)},
     }
 }
 
@@ -124,6 +217,11 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
 
+# Pre-rendered pages written by `manage.py export_static`, served directly by nginx
+STATIC_EXPORT_ROOT = env.str(
+    "STATIC_EXPORT_ROOT", default=os.path.join(BASE_DIR, "export")
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
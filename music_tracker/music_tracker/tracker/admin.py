@@ -1,11 +1,338 @@
-from django.contrib import admin
+import io
+from functools import partial
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.utils import unquote
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.paginator import EmptyPage, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Model
+from django.http import Http404, HttpResponseRedirect, JsonResponse
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.functional import cached_property
 
 # Register your models here.
-from music_tracker.tracker import models
+from music_tracker.tracker import caching, importing, models, reordering, search
+
+# As many results as the admin's own autocomplete returns at a time
+AUTOCOMPLETE_PAGE_SIZE = 20
+
+
+def get_years(model):
+    """Every year of `model`'s rows, cached for the filter sidebar"""
+    return caching.get_admin_choices(
+        model,
+        "year",
+        lambda: list(
+            model.objects.order_by("year").distinct().values_list("year", flat=True)
+        ),
+    )
+
+
+class YearListFilter(admin.AllValuesFieldListFilter):
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.lookup_choices = get_years(model)
+
+
+class DecadeListFilter(admin.SimpleListFilter):
+    title = "decade"
+    parameter_name = "decade"
+
+    def lookups(self, request, model_admin):
+        years = get_years(model_admin.model)
+        decades = {year // 10 * 10 for year in years if year is not None}
+        return [(decade, f"{decade}s") for decade in sorted(decades, reverse=True)]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            try:
+                decade = int(self.value())
+            except ValueError as e:
+                raise IncorrectLookupParameters(e)
+            return queryset.filter(year__range=(decade, decade + 9))
+        return queryset
+
+
+class CachedRelatedListFilter(admin.RelatedFieldListFilter):
+    """For small related tables, like the lists, whose rows are the choices"""
+
+    def field_choices(self, field, request, model_admin):
+        return caching.get_admin_choices(
+            field.related_model,
+            "choices",
+            partial(super().field_choices, field, request, model_admin),
+        )
+
+
+class EstimatedCountPaginator(Paginator):
+    """Counts an unfiltered changelist over a large table from the row estimate in
+    sqlite_stat1, which `PRAGMA optimize` keeps roughly current, rather than with
+    COUNT(*). Small tables and filtered changelists are counted exactly.
+
+    A stale estimate that runs past the end of the table is corrected from the
+    page that finds the end, so the page links stop at the real last page, though
+    the admin still shows the estimate as the result count. A low estimate hides the
+    last pages until the next `PRAGMA optimize`."""
+
+    estimate_above = 10000
+    estimated = False
+
+    def get_estimate(self):
+        table = self.object_list.model._meta.db_table
+        try:
+            with connections[self.object_list.db].cursor() as cursor:
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+                estimates = [int(stat.split()[0]) for (stat,) in cursor.fetchall()]
+        except DatabaseError:
+            # Nothing has been analyzed yet
+            return None
+        return max(estimates, default=None)
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = self.get_estimate()
+            if estimate is not None and estimate > self.estimate_above:
+                self.estimated = True
+                return estimate
+        return super().count
+
+    def _correct_count(self, count):
+        self.estimated = False
+        self.count = count
+        self.__dict__.pop("num_pages", None)
+
+    def page(self, number):
+        page = super().page(number)
+        if self.estimated and len(page.object_list) < self.per_page:
+            # Only the last page is short, and an empty one is past the end
+            if page.object_list:
+                self._correct_count(page.start_index() - 1 + len(page.object_list))
+            else:
+                self._correct_count(self.object_list.count())
+                if number > 1:
+                    raise EmptyPage(self.error_messages["no_results"])
+        return page
+
+
+class LargeTableMixin:
+    """Changelists that skip counting the whole table"""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class FullTextSearchMixin:
+    """Search the full-text index, see tracker/search.py, rather than running
+    `search_fields` as LIKE lookups across the credits, which also needs no
+    DISTINCT. `search_fields` still turns the search box on."""
+
+    def get_search_results(self, request, queryset, search_term):
+        return search.filter_queryset(queryset, search_term), False
+
+
+class CachedLabelAutocompleteSelect(AutocompleteSelect):
+    """An autocomplete select that labels its selected option from `labels`, which
+    is shared by the copy of the widget each form in a formset gets, so labels
+    fetched up front don't cost a query per row. `url` replaces the admin's
+    autocomplete view."""
+
+    def __init__(self, field, admin_site, url=None, labels=None, **kwargs):
+        super().__init__(field, admin_site, **kwargs)
+        self.url = url
+        self.labels = {} if labels is None else labels
+
+    def get_url(self):
+        return self.url or super().get_url()
+
+    def optgroups(self, name, value, attr=None):
+        selected = {
+            str(v) for v in value if str(v) not in self.choices.field.empty_values
+        }
+        missing = selected - self.labels.keys()
+        if missing:
+            self.labels.update(
+                (str(obj.pk), self.choices.field.label_from_instance(obj))
+                for obj in self.choices.queryset.using(self.db).filter(pk__in=missing)
+            )
+
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, "", "", False, 0))
+        for option_value in selected & self.labels.keys():
+            options.append(
+                self.create_option(
+                    name, option_value, self.labels[option_value], True, len(options)
+                )
+            )
+        return [(None, options, 0)]
+
+
+class CachedLabelAutocompleteMixin:
+    """Render `autocomplete_fields` with `CachedLabelAutocompleteSelect`"""
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs.setdefault(
+                "widget",
+                CachedLabelAutocompleteSelect(
+                    db_field, self.admin_site, using=kwargs.get("using")
+                ),
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class ReorderMixin:
+    """A drag and drop page for putting a list's entries, `reorder_model`, in a new
+    order, which is saved in one go by tracker/reordering.py"""
+
+    change_form_template = "admin/tracker/reorderable_change_form.html"
+    reorder_model: type[Model] | None = None
+    reorder_select_related: list[str] = []
+
+    def get_reorder_group(self, obj):
+        return obj
+
+    def get_reorder_label(self, entry):
+        return str(entry)
+
+    def get_urls(self):
+        opts = self.model._meta
+        return [
+            path(
+                "<path:object_id>/reorder/",
+                self.admin_site.admin_view(self.reorder_view),
+                name=f"{opts.app_label}_{opts.model_name}_reorder",
+            ),
+            *super().get_urls(),
+        ]
+
+    def reorder_view(self, request, object_id):
+        obj = self.get_object(request, unquote(object_id))
+        if obj is None:
+            raise Http404
+        if not self.has_change_permission(request, obj):
+            raise PermissionDenied
+
+        group = self.get_reorder_group(obj)
+        if request.method == "POST":
+            try:
+                reordering.reorder(
+                    self.reorder_model, group, request.POST.getlist("order")
+                )
+            except ValidationError as e:
+                self.message_user(request, e.messages[0], messages.ERROR)
+            else:
+                self.message_user(request, f"Saved the new order of {obj}.")
+                return HttpResponseRedirect(request.path)
+
+        entries = reordering.get_entries(self.reorder_model, group).select_related(
+            *self.reorder_select_related
+        )
+        return TemplateResponse(
+            request,
+            "admin/tracker/reorder.html",
+            {
+                **self.admin_site.each_context(request),
+                "title": f"Reorder {obj}",
+                "opts": self.model._meta,
+                "original": obj,
+                "entries": [
+                    (entry.pk, self.get_reorder_label(entry)) for entry in entries
+                ],
+            },
+        )
+
+
+class ImportListForm(forms.Form):
+    file = forms.FileField(
+        help_text=(
+            "CSV or JSON with a title, artists, album, position and year for each "
+            'song. Separate a CSV row\'s artists with ";".'
+        )
+    )
+    year = forms.IntegerField(
+        required=False, help_text="The list's year, for rows without one"
+    )
+    replace = forms.BooleanField(
+        required=False, help_text="Replace the entries of lists that already have some"
+    )
+
+
+class ImportListMixin:
+    """An upload page on the changelist for importing whole lists of `import_kind`,
+    see tracker/importing.py"""
+
+    change_list_template = "admin/tracker/importable_change_list.html"
+    import_kind: str | None = None
+
+    def get_urls(self):
+        opts = self.model._meta
+        return [
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_view),
+                name=f"{opts.app_label}_{opts.model_name}_import",
+            ),
+            *super().get_urls(),
+        ]
+
+    def import_view(self, request):
+        if not (
+            self.has_add_permission(request) and self.has_change_permission(request)
+        ):
+            raise PermissionDenied
+
+        form = ImportListForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            upload = form.cleaned_data["file"]
+            try:
+                counts = importing.import_list(
+                    importing.read_rows(
+                        io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline=""),
+                        importing.get_format(upload.name),
+                    ),
+                    self.import_kind,
+                    year=form.cleaned_data["year"],
+                    replace=form.cleaned_data["replace"],
+                )
+            except ValidationError as e:
+                self.message_user(request, e.messages[0], messages.ERROR)
+            else:
+                self.message_user(
+                    request,
+                    "Imported "
+                    + ", ".join(
+                        f"{count} songs for {year}" for year, count in counts.items()
+                    ),
+                )
+                opts = self.model._meta
+                return HttpResponseRedirect(
+                    reverse(
+                        f"admin:{opts.app_label}_{opts.model_name}_changelist",
+                        current_app=self.admin_site.name,
+                    )
+                )
+
+        return TemplateResponse(
+            request,
+            "admin/tracker/import.html",
+            {
+                **self.admin_site.each_context(request),
+                "title": f"Import {self.model._meta.verbose_name_plural}",
+                "opts": self.model._meta,
+                "form": form,
+            },
+        )
 
 
 @admin.register(models.Album)
-class AlbumAdmin(admin.ModelAdmin):
+class AlbumAdmin(LargeTableMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = [
         "title",
         "display_artists",
@@ -17,82 +344,139 @@ class AlbumAdmin(admin.ModelAdmin):
         "release_date",
     ]
     list_editable = ["listened", "priority", "original_rating", "rank"]
-    list_filter = ["year", "listened", "priority"]
+    list_filter = [DecadeListFilter, ("year", YearListFilter), "listened", "priority"]
     search_fields = ["title", "artists__name"]
 
 
 @admin.register(models.Artist)
-class ArtistAdmin(admin.ModelAdmin):
+class ArtistAdmin(LargeTableMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = ["name"]
     search_fields = ["name"]
 
 
 @admin.register(models.TopTenAlbumsList)
-class TopTenAlbumsListAdmin(admin.ModelAdmin):
+class TopTenAlbumsListAdmin(ReorderMixin, admin.ModelAdmin):
     list_display = ["title", "published"]
     list_editable = ["published"]
+    reorder_model = models.Album
+
+    def get_reorder_group(self, obj):
+        # The list is the year's ranked albums
+        return obj.year
+
+    def get_reorder_label(self, entry):
+        return f"{entry.title} - {entry.artist_credit}"
 
 
 @admin.register(models.Song)
-class SongAdmin(admin.ModelAdmin):
+class SongAdmin(LargeTableMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = ["title", "album", "display_artists"]
+    list_select_related = ["album"]
+    list_filter = [DecadeListFilter]
     search_fields = ["title", "artists__name"]
 
 
 @admin.register(models.ObsessionList)
-class ObsessionListAdmin(admin.ModelAdmin):
+class ObsessionListAdmin(ImportListMixin, ReorderMixin, admin.ModelAdmin):
     list_display = ["title", "published"]
     list_editable = ["published"]
+    import_kind = "obsessions"
+    reorder_model = models.ObsessionSongs
+    reorder_select_related = ["song"]
+
+    def get_reorder_label(self, entry):
+        return str(entry.song)
 
 
 @admin.register(models.ObsessionSongs)
-class ObsessionSongAdmin(admin.ModelAdmin):
+class ObsessionSongAdmin(
+    CachedLabelAutocompleteMixin, LargeTableMixin, admin.ModelAdmin
+):
     list_display = ["song", "obsession_list", "ordering"]
-    list_filter = ["obsession_list"]
+    list_select_related = ["song", "obsession_list"]
+    list_filter = [("obsession_list", CachedRelatedListFilter)]
     autocomplete_fields = ["song"]
 
 
 @admin.register(models.SpotifyTop100List)
-class SpotifyTop100ListAdmin(admin.ModelAdmin):
+class SpotifyTop100ListAdmin(ImportListMixin, ReorderMixin, admin.ModelAdmin):
     list_display = ["title", "published"]
     list_editable = ["published"]
+    import_kind = "spotify_top_100"
+    reorder_model = models.SpotifyTop100Songs
+    reorder_select_related = ["song"]
+
+    def get_reorder_label(self, entry):
+        return str(entry.song)
 
 
 @admin.register(models.SpotifyTop100Songs)
-class SpotifyTop100SongAdmin(admin.ModelAdmin):
+class SpotifyTop100SongAdmin(
+    CachedLabelAutocompleteMixin, LargeTableMixin, admin.ModelAdmin
+):
     list_display = ["song", "top_100_list", "ordering"]
-    list_filter = ["top_100_list"]
+    list_select_related = ["song", "top_100_list"]
+    list_filter = [("top_100_list", CachedRelatedListFilter)]
     autocomplete_fields = ["song"]
 
 
-class ArtistAlbumRankingEntryInline(admin.TabularInline):
+class ArtistAlbumRankingEntryInline(CachedLabelAutocompleteMixin, admin.TabularInline):
     model = models.ArtistAlbumRankingEntry
     extra = 0
     fields = ["rank", "album", "notes"]
     ordering = ["rank"]
+    autocomplete_fields = ["album"]
+
+    def get_queryset(self, request):
+        # Each row is titled with its album, see ArtistAlbumRankingEntry.__str__
+        return super().get_queryset(request).select_related("album")
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
-        if db_field.name == "album":
-            # For existing objects, filter by the artist
-            if hasattr(request, "_obj_") and request._obj_ and request._obj_.artist:
-                kwargs["queryset"] = models.Album.objects.filter(
-                    artists=request._obj_.artist
-                )
-            else:
-                # For new objects, show all albums initially
-                # The user will need to save after selecting an artist to get filtering
-                kwargs["queryset"] = models.Album.objects.all()
+        ranking = getattr(request, "_obj_", None)
+        if db_field.name == "album" and ranking and ranking.pk and ranking.artist_id:
+            # Search the artist's albums, and label every row's album up front.
+            # New rankings have no artist yet, so they search every album.
+            kwargs["queryset"] = models.Album.objects.filter(artists=ranking.artist_id)
+            kwargs["widget"] = CachedLabelAutocompleteSelect(
+                db_field,
+                self.admin_site,
+                url=reverse(
+                    f"{self.admin_site.name}:tracker_artistalbumranking_albums",
+                    args=[ranking.pk],
+                ),
+                labels={
+                    str(album.pk): str(album)
+                    for album in models.Album.objects.filter(
+                        artistalbumrankingentry__ranking=ranking
+                    )
+                },
+                using=kwargs.get("using"),
+            )
 
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
 @admin.register(models.ArtistAlbumRanking)
-class ArtistAlbumRankingAdmin(admin.ModelAdmin):
+class ArtistAlbumRankingAdmin(ReorderMixin, admin.ModelAdmin):
     list_display = ["artist", "published", "updated_at"]
+    list_select_related = ["artist"]
     list_editable = ["published"]
-    list_filter = ["published", "artist"]
+    # Only the artists with rankings, rather than every artist
+    list_filter = ["published", ("artist", admin.RelatedOnlyFieldListFilter)]
     search_fields = ["artist__name"]
     inlines = [ArtistAlbumRankingEntryInline]
+    reorder_model = models.ArtistAlbumRankingEntry
+    reorder_select_related = ["album"]
+
+    def get_urls(self):
+        return [
+            path(
+                "<path:object_id>/albums/",
+                self.admin_site.admin_view(self.album_autocomplete_view),
+                name="tracker_artistalbumranking_albums",
+            ),
+            *super().get_urls(),
+        ]
 
     def get_form(self, request, obj=None, **kwargs):
         # Store the object in the request so the inline can access it
@@ -104,10 +488,61 @@ class ArtistAlbumRankingAdmin(admin.ModelAdmin):
         # After saving, update the object in the request for the inlines
         request._obj_ = obj
 
+    def album_autocomplete_view(self, request, object_id):
+        """The ranking artist's albums matching the search term, for the entries'
+        album pickers"""
+        ranking = self.get_object(request, unquote(object_id))
+        if ranking is None:
+            raise Http404
+        if not self.has_change_permission(request, ranking):
+            raise PermissionDenied
+
+        albums = search.filter_queryset(
+            models.Album.objects.filter(artists=ranking.artist_id),
+            request.GET.get("term", ""),
+        ).order_by("year", "title")
+        page = Paginator(albums, AUTOCOMPLETE_PAGE_SIZE).get_page(
+            request.GET.get("page")
+        )
+        return JsonResponse(
+            {
+                "results": [
+                    {"id": str(album.pk), "text": str(album)} for album in page
+                ],
+                "pagination": {"more": page.has_next()},
+            }
+        )
+
+
+class RankingListFilter(admin.RelatedFieldListFilter):
+    def field_choices(self, field, request, model_admin):
+        # Rankings are named after their artists
+        rankings = models.ArtistAlbumRanking.objects.select_related("artist")
+        return [(ranking.pk, str(ranking)) for ranking in rankings]
+
 
 @admin.register(models.ArtistAlbumRankingEntry)
-class ArtistAlbumRankingEntryAdmin(admin.ModelAdmin):
+class ArtistAlbumRankingEntryAdmin(
+    CachedLabelAutocompleteMixin, LargeTableMixin, admin.ModelAdmin
+):
     list_display = ["ranking", "rank", "album", "notes"]
-    list_filter = ["ranking__artist", "ranking"]
+    list_select_related = ["ranking__artist", "album"]
+    list_filter = [
+        ("ranking__artist", admin.RelatedOnlyFieldListFilter),
+        ("ranking", RankingListFilter),
+    ]
     search_fields = ["album__title", "ranking__artist__name"]
     ordering = ["ranking", "rank"]
+    autocomplete_fields = ["ranking", "album"]
+
+
+@admin.register(models.SongPlayCount)
+class SongPlayCountAdmin(
+    CachedLabelAutocompleteMixin, LargeTableMixin, admin.ModelAdmin
+):
+    """Written by `manage.py ingest_listening_history`, see tracker/listening.py"""
+
+    list_display = ["song", "date", "plays", "ms_played", "last_played_at"]
+    list_select_related = ["song"]
+    ordering = ["-date", "-plays"]
+    autocomplete_fields = ["song"]
@@ -0,0 +1,189 @@
+"""Read-only JSON for the published lists, the stats and the artists.
+
+Every endpoint is `versioned`, so a polling client gets a 304 from a single
+aggregate query, see tracker/versions.py.
+"""
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+
+from music_tracker.tracker import snapshot, stats, versions, views
+from music_tracker.tracker.conditional import versioned
+from music_tracker.tracker.models import (
+    Album,
+    ArtistAlbumRanking,
+    ObsessionList,
+    SpotifyTop100List,
+    TopTenAlbumsList,
+)
+
+
+def artist_entries(artists):
+    return [{"id": artist.id, "name": artist.name} for artist in artists]
+
+
+def album_entries(albums):
+    return [
+        {
+            "rank": album.rank,
+            "title": album.title,
+            "artists": artist_entries(album.artists.all()),
+        }
+        for album in albums
+    ]
+
+
+def song_entries(entries):
+    return [
+        {
+            "ordering": entry.ordering,
+            "title": entry.song.title,
+            "artists": artist_entries(entry.song.artists.all()),
+        }
+        for entry in entries
+    ]
+
+
+def published_lists(model):
+    return JsonResponse(
+        {
+            "lists": [
+                {"title": list_record.title, "year": list_record.year}
+                for list_record in model.get_published().order_by("year")
+            ]
+        }
+    )
+
+
+@require_safe
+@snapshot.reads_snapshot
+@versioned(lambda: versions.get_lists_version(TopTenAlbumsList))
+def top_ten_lists(request):
+    return published_lists(TopTenAlbumsList)
+
+
+@require_safe
+@snapshot.reads_snapshot
+@versioned(lambda year: versions.get_list_version(TopTenAlbumsList, year))
+def top_ten_list(request, year):
+    list_record = get_object_or_404(TopTenAlbumsList, year=year, published=True)
+
+    return JsonResponse(
+        {
+            "title": list_record.title,
+            "year": list_record.year,
+            "top_ten": album_entries(Album.get_top_ten(year).for_display()),
+            "honorable_mentions": album_entries(
+                Album.get_honorable_mentions(year).for_display()
+            ),
+        }
+    )
+
+
+@require_safe
+@snapshot.reads_snapshot
+@versioned(lambda: versions.get_lists_version(ObsessionList))
+def obsessions_lists(request):
+    return published_lists(ObsessionList)
+
+
+@require_safe
+@snapshot.reads_snapshot
+@versioned(
+    lambda year: versions.get_list_version(ObsessionList, year, "obsessionsongs")
+)
+def obsessions_list(request, year):
+    list_record = get_object_or_404(ObsessionList, year=year, published=True)
+
+    return JsonResponse(
+        {
+            "title": list_record.title,
+            "year": list_record.year,
+            "songs": song_entries(list_record.get_songs().for_display()),
+        }
+    )
+
+
+@require_safe
+@snapshot.reads_snapshot
+@versioned(lambda: versions.get_lists_version(ObsessionList))
+def obsessions_stats(request):
+    return JsonResponse(
+        views.obsessions_stats_tables(list(views.get_obsession_summaries()))
+    )
+
+
+@require_safe
+@snapshot.reads_snapshot
+@versioned(lambda: versions.get_lists_version(SpotifyTop100List))
+def spotify_top_100_lists(request):
+    return published_lists(SpotifyTop100List)
+
+
+@require_safe
+@snapshot.reads_snapshot
+@versioned(
+    lambda year: versions.get_list_version(
+        SpotifyTop100List, year, "spotifytop100songs"
+    )
+)
+def spotify_top_100_list(request, year):
+    list_record = get_object_or_404(SpotifyTop100List, year=year, published=True)
+
+    return JsonResponse(
+        {
+            "title": list_record.title,
+            "year": list_record.year,
+            "songs": song_entries(list_record.get_songs().for_display()),
+        }
+    )
+
+
+@require_safe
+@snapshot.reads_snapshot
+@versioned(lambda: versions.get_lists_version(SpotifyTop100List))
+def spotify_top_100_stats(request):
+    return JsonResponse(
+        stats.spotify_top_100_stats(list(views.get_published_spotify_years()))
+    )
+
+
+# The artist endpoints build from scratch rather than from the artist page's cached
+# summary, which could be older than the version
+
+
+@require_safe
+@snapshot.reads_snapshot
+@versioned(versions.get_artist_version)
+def artist(request, id):
+    summary = views.build_artist_summary(versions.get_artist_id(id))
+    del summary["years"]
+
+    return JsonResponse(summary)
+
+
+@require_safe
+@snapshot.reads_snapshot
+@versioned(versions.get_ranking_version)
+def artist_ranking(request, id):
+    ranking = get_object_or_404(
+        ArtistAlbumRanking.objects.select_related("artist"),
+        artist_id=versions.get_artist_id(id),
+        published=True,
+    )
+
+    return JsonResponse(
+        {
+            "artist": artist_entries([ranking.artist])[0],
+            "albums": [
+                {
+                    "rank": entry.rank,
+                    "title": entry.album.title,
+                    "year": entry.album.year,
+                    "notes": entry.notes,
+                }
+                for entry in ranking.get_ranked_albums()
+            ],
+        }
+    )
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TrackerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "music_tracker.tracker"
+
+    def ready(self):
+        from music_tracker.tracker import database, signals  # noqa: F401
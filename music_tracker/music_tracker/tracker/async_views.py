@@ -0,0 +1,285 @@
+"""Async versions of the public views, for ASGI deployments.
+
+They build the same pages as `views`, through Django's async ORM, so a request
+waiting on the database doesn't hold a worker thread. Independent queries are
+gathered, though the ORM still runs them one at a time on the request's database
+thread. Routed instead of `views` when ASYNC_PUBLIC_VIEWS is on.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count
+from django.http import Http404
+from django.shortcuts import aget_object_or_404, redirect, render
+
+from music_tracker.tracker import (
+    caching,
+    conditional,
+    search,
+    snapshot,
+    stats,
+    versions,
+    views,
+)
+from music_tracker.tracker.models import (
+    Album,
+    ObsessionList,
+    SpotifyTop100List,
+    TopTenAlbumsList,
+)
+
+
+async def alist(queryset):
+    return [item async for item in queryset]
+
+
+async def get_span_songs(artist, years):
+    if not years:
+        return 0
+    result = await views.get_span_obsession_songs(artist, years).aaggregate(
+        songs=Count("song", distinct=True)
+    )
+    return result["songs"]
+
+
+async def get_ranked_albums(artist, years):
+    ranked_albums = views.get_ranked_albums(artist, years)
+    return None if ranked_albums is None else await alist(ranked_albums)
+
+
+@snapshot.reads_snapshot
+async def index(request):
+    most_recent_top_ten = await TopTenAlbumsList.aget_most_recent()
+
+    return redirect("top_ten", year=most_recent_top_ten.year)
+
+
+async def get_navigation_links():
+    return await caching.aget_navigation(build_navigation_links)
+
+
+async def build_navigation_links():
+    lists = await asyncio.gather(
+        *(alist(queryset) for queryset in views.get_navigation_lists())
+    )
+    return views.navigation_links(*lists)
+
+
+@conditional.cache_public
+@snapshot.reads_snapshot
+@conditional.versioned(
+    lambda year: versions.get_list_page_version(TopTenAlbumsList, year, year)
+)
+@caching.cached_page("top_ten")
+async def top_ten_list(request, year):
+    list_record = await aget_object_or_404(TopTenAlbumsList, year=year, published=True)
+
+    top_ten_records, honorable_mentions_records, navigation = await asyncio.gather(
+        alist(Album.get_top_ten(year).for_display()),
+        alist(Album.get_honorable_mentions(year).for_display()),
+        get_navigation_links(),
+    )
+
+    context = {
+        "list_title": list_record.title,
+        "year": list_record.year,
+        "top_ten": views.album_entries(top_ten_records),
+        "honorable_mentions": views.album_entries(
+            honorable_mentions_records, ranked=False
+        ),
+        "navigation": navigation,
+    }
+    return render(request, "tracker/top-ten-albums.html", context)
+
+
+@conditional.cache_public
+@snapshot.reads_snapshot
+@conditional.versioned(
+    lambda decade: versions.get_list_page_version(TopTenAlbumsList, decade, decade + 9)
+)
+@caching.cached_page("top_ten_decade")
+async def top_ten_decade(request, decade):
+    list_records = await alist(
+        TopTenAlbumsList.get_published()
+        .filter(year__range=(decade, decade + 9))
+        .order_by("year")
+    )
+    if not list_records:
+        raise Http404
+
+    albums, navigation = await asyncio.gather(
+        alist(Album.get_top_tens_between(decade, decade + 9).for_display()),
+        get_navigation_links(),
+    )
+
+    context = {
+        "page_title": f"Top Albums of the {decade}s",
+        "decade": decade,
+        "years": views.decade_years(list_records, albums),
+        "navigation": navigation,
+    }
+    return render(request, "tracker/top-ten-decade.html", context)
+
+
+@conditional.cache_public
+@snapshot.reads_snapshot
+@conditional.versioned(
+    lambda year: versions.get_list_page_version(ObsessionList, year, year)
+)
+@caching.cached_page("obsessions")
+async def obsessions_list(request, year):
+    list_record = await aget_object_or_404(ObsessionList, year=year, published=True)
+
+    entries, navigation = await asyncio.gather(
+        alist(list_record.get_songs().for_display()), get_navigation_links()
+    )
+
+    context = {
+        "list_title": list_record.title,
+        "year": list_record.year,
+        "songs": views.song_entries(entries),
+        "navigation": navigation,
+    }
+
+    return render(request, "tracker/obsessions.html", context)
+
+
+@conditional.cache_public
+@snapshot.reads_snapshot
+@conditional.versioned(
+    lambda year: versions.get_list_page_version(SpotifyTop100List, year, year)
+)
+@caching.cached_page("spotify_top_100")
+async def spotify_top_100_list(request, year):
+    list_record = await aget_object_or_404(SpotifyTop100List, year=year, published=True)
+
+    entries, navigation = await asyncio.gather(
+        alist(list_record.get_songs().for_display()), get_navigation_links()
+    )
+
+    context = {
+        "list_title": list_record.title,
+        "year": list_record.year,
+        "songs": views.song_entries(entries, ordered=True),
+        "navigation": navigation,
+    }
+
+    return render(request, "tracker/top-100.html", context)
+
+
+@conditional.cache_public
+@snapshot.reads_snapshot
+@conditional.versioned(versions.get_navigation_version)
+@caching.cached_page("obsessions_stats")
+async def obsessions_stats(request):
+    summaries, navigation = await asyncio.gather(
+        alist(views.get_obsession_summaries()), get_navigation_links()
+    )
+
+    context = {
+        "page_title": "Obsessions Stats",
+        **views.obsessions_stats_tables(summaries),
+        "navigation": navigation,
+    }
+
+    return render(request, "tracker/obsessions-stats.html", context)
+
+
+async def build_artist_summary(id, years=None):
+    """Async `views.build_artist_summary`"""
+    artist = await aget_object_or_404(views.get_summary_artists(), id=id)
+
+    ranked_albums, listed_albums, obsession_stats, span_songs = await asyncio.gather(
+        get_ranked_albums(artist, years),
+        alist(artist.get_listed_albums(years)),
+        alist(artist.get_obsession_stats(years)),
+        get_span_songs(artist, years),
+    )
+
+    return views.artist_summary(
+        artist, ranked_albums, listed_albums, obsession_stats, years, span_songs
+    )
+
+
+@conditional.cache_public
+@snapshot.reads_snapshot
+@conditional.versioned(versions.get_artist_version)
+@caching.cached_page("artist_stats", views.artist_page_arg)
+async def artist_stats(request, id):
+    # The summary can 404, so the navigation waits for it
+    summary = await caching.aget_artist_summary(
+        views.artist_page_arg(id), build_artist_summary
+    )
+
+    context = {
+        **summary,
+        "navigation": await get_navigation_links(),
+    }
+
+    return render(request, "tracker/artist-stats.html", context)
+
+
+@conditional.cache_public
+@snapshot.reads_snapshot
+@conditional.versioned(
+    lambda id, first_year, last_year: versions.get_artist_version(id)
+)
+async def artist_stats_between(request, id, first_year, last_year):
+    if first_year > last_year:
+        raise Http404
+
+    context = {
+        **await build_artist_summary(
+            views.artist_page_arg(id), (first_year, last_year)
+        ),
+        "navigation": await get_navigation_links(),
+    }
+
+    return render(request, "tracker/artist-stats.html", context)
+
+
+@conditional.cache_public
+@snapshot.reads_snapshot
+@conditional.versioned(versions.get_navigation_version)
+@caching.cached_page("spotify_top_100_stats")
+async def spotify_top_100_stats(request):
+    published_years = await alist(views.get_published_spotify_years())
+
+    spotify_stats, navigation = await asyncio.gather(
+        sync_to_async(caching.get_spotify_top_100_stats)(
+            published_years, stats.spotify_top_100_stats
+        ),
+        get_navigation_links(),
+    )
+
+    context = {
+        "page_title": "Spotify Top 100 Stats",
+        **spotify_stats,
+        "navigation": navigation,
+    }
+
+    return render(request, "tracker/spotify-top-100-stats.html", context)
+
+
+@conditional.cache_public
+@snapshot.reads_snapshot
+async def search_page(request):
+    query = views.get_search_query(request)
+    hits = await sync_to_async(search.search)(query, limit=views.SEARCH_LIMIT)
+
+    results, navigation = await asyncio.gather(
+        asyncio.gather(
+            *(alist(queryset) for queryset in views.get_search_querysets(hits))
+        ),
+        get_navigation_links(),
+    )
+
+    context = {
+        "page_title": "Search",
+        "query": query,
+        **views.search_results(hits, *results),
+        "navigation": navigation,
+    }
+
+    return render(request, "tracker/search.html", context)
@@ -0,0 +1,239 @@
+import hashlib
+import time
+from functools import partial, wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.core.cache import cache
+from django.db import transaction
+
+from music_tracker.tracker import snapshot
+
+NAVIGATION_KEY = "tracker:navigation"
+STATS_VERSION_KEY = "tracker:stats-version"
+PAGE_GENERATION_KEY = "tracker:page-generation"
+
+# Pages that are built from the stats tables
+STATS_PAGES = [("obsessions_stats", ""), ("spotify_top_100_stats", "")]
+
+# Fingerprinted entries are never invalidated, they just stop being looked up
+FINGERPRINTED_TIMEOUT = 60 * 60 * 24
+
+# Pages and artist summaries are invalidated precisely, but a new generation leaves
+# the old one's entries behind, so they expire in case nothing culls them first
+PAGE_TIMEOUT = 60 * 60 * 24
+
+# Admin filter choices are invalidated by signals, and expire for the bulk writes
+# that skip them
+ADMIN_CHOICES_TIMEOUT = 60 * 10
+
+
+def _repeat_after_commit(invalidate):
+    """Other requests only see a change once it commits, and public pages read from
+    the snapshot only once it has caught up with the commit. Anything they render
+    in between would be cached stale, so invalidate again after the commit, or
+    after the snapshot refresh."""
+
+    @wraps(invalidate)
+    def wrapper(*args, **kwargs):
+        invalidate(*args, **kwargs)
+        callback = partial(invalidate, *args, **kwargs)
+        if snapshot.is_enabled():
+            snapshot.after_refresh(callback)
+        else:
+            transaction.on_commit(callback, robust=True)
+
+    return wrapper
+
+
+def _new_generation():
+    # For page generations and stats versions. Not a counter, which would restart
+    # from a number old entries may still be cached under when the cache culls its
+    # key
+    return time.time_ns()
+
+
+def _get_page_generation():
+    return cache.get_or_set(PAGE_GENERATION_KEY, _new_generation)
+
+
+async def _aget_page_generation():
+    return await cache.aget_or_set(PAGE_GENERATION_KEY, _new_generation)
+
+
+def get_navigation(build):
+    """Return the cached navigation structure, building it with `build` on a miss"""
+    return cache.get_or_set(NAVIGATION_KEY, build)
+
+
+async def aget_navigation(build):
+    """Async `get_navigation`, for a coroutine function `build`"""
+    navigation = await cache.aget(NAVIGATION_KEY)
+    if navigation is None:
+        navigation = await build()
+        await cache.aset(NAVIGATION_KEY, navigation)
+    return navigation
+
+
+@_repeat_after_commit
+def invalidate_navigation():
+    # Every page renders the navigation
+    cache.delete(NAVIGATION_KEY)
+    invalidate_all_pages()
+
+
+def _admin_choices_key(model):
+    return f"tracker:admin-choices:{model._meta.label_lower}"
+
+
+def get_admin_choices(model, name, build):
+    """Return the admin filter choices `name` built from `model`'s rows, building
+    them with `build` on a miss"""
+    key = _admin_choices_key(model)
+    choices = cache.get(key, {})
+    if name not in choices:
+        choices[name] = build()
+        cache.set(key, choices, ADMIN_CHOICES_TIMEOUT)
+    return choices[name]
+
+
+def invalidate_admin_choices(model):
+    cache.delete(_admin_choices_key(model))
+
+
+def get_stats_version():
+    return cache.get_or_set(STATS_VERSION_KEY, _new_generation)
+
+
+@_repeat_after_commit
+def bump_stats_version():
+    cache.set(STATS_VERSION_KEY, _new_generation())
+    invalidate_pages(STATS_PAGES)
+
+
+def get_spotify_top_100_stats(published_years, build):
+    """Return the Spotify Top 100 stats for the published years, building them with
+    `build` when the published lists or the stats tables have changed"""
+    fingerprint = hashlib.sha1(
+        repr((get_stats_version(), published_years)).encode()
+    ).hexdigest()
+    return cache.get_or_set(
+        f"tracker:spotify-top-100-stats:{fingerprint}",
+        lambda: build(published_years),
+        FINGERPRINTED_TIMEOUT,
+    )
+
+
+def _page_key(generation, name, arg):
+    return f"tracker:page:{generation}:{name}:{arg}"
+
+
+def cached_page(name, get_arg=str):
+    """Cache a view's responses to anonymous GETs.
+
+    Pages are keyed by `name` (the URL name) and the view's single URL argument,
+    normalized by `get_arg`, so signal handlers can invalidate exactly the pages a
+    change affects with `invalidate_pages`. Async views get an async wrapper.
+
+    Under `conditional.versioned`, each page is stored with the row version it was
+    rendered at, and only served for that version. So a page cached stale, by a
+    request that raced a change, can't go out under the change's ETag.
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            return _async_cached_page(view, name, get_arg)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != "GET" or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            arg = get_arg(*args, *kwargs.values()) if args or kwargs else ""
+            key = _page_key(_get_page_generation(), name, arg)
+            version = getattr(request, "tracker_version", None)
+            cached = cache.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, (version, response), PAGE_TIMEOUT)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _async_cached_page(view, name, get_arg):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != "GET" or (await request.auser()).is_authenticated:
+            return await view(request, *args, **kwargs)
+
+        arg = get_arg(*args, *kwargs.values()) if args or kwargs else ""
+        key = _page_key(await _aget_page_generation(), name, arg)
+        version = getattr(request, "tracker_version", None)
+        cached = await cache.aget(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        response = await view(request, *args, **kwargs)
+        if response.status_code == 200:
+            await cache.aset(key, (version, response), PAGE_TIMEOUT)
+        return response
+
+    return wrapper
+
+
+@_repeat_after_commit
+def invalidate_pages(pages):
+    """Drop the cached responses for `pages`, a collection of (name, arg) pairs,
+    along with the decade pages that include any top ten pages and the artist
+    summaries behind any artist pages"""
+    # Without a generation nothing is reachable, the next one is new
+    generation = cache.get(PAGE_GENERATION_KEY)
+    if generation is not None:
+        pages = {(name, str(arg)) for name, arg in pages}
+        pages |= {
+            ("top_ten_decade", str(int(arg) // 10 * 10))
+            for name, arg in pages
+            if name == "top_ten"
+        }
+        cache.delete_many(
+            [_page_key(generation, name, arg) for name, arg in pages]
+            + [
+                _artist_summary_key(generation, arg)
+                for name, arg in pages
+                if name == "artist_stats"
+            ]
+        )
+
+
+@_repeat_after_commit
+def invalidate_all_pages():
+    cache.set(PAGE_GENERATION_KEY, _new_generation())
+
+
+def _artist_summary_key(generation, artist_id):
+    return f"tracker:artist-summary:{generation}:{artist_id}"
+
+
+def get_artist_summary(artist_id, build):
+    """Return the cached summary behind an artist's page, building it with `build`
+    on a miss. It's invalidated along with the artist's page."""
+    return cache.get_or_set(
+        _artist_summary_key(_get_page_generation(), artist_id),
+        lambda: build(artist_id),
+        PAGE_TIMEOUT,
+    )
+
+
+async def aget_artist_summary(artist_id, build):
+    """Async `get_artist_summary`, for a coroutine function `build`"""
+    key = _artist_summary_key(await _aget_page_generation(), artist_id)
+    summary = await cache.aget(key)
+    if summary is None:
+        summary = await build(artist_id)
+        await cache.aset(key, summary, PAGE_TIMEOUT)
+    return summary
@@ -0,0 +1,92 @@
+"""Conditional GET from row versions.
+
+A view's version is one aggregate query over the rows it shows, see
+tracker/versions.py: their latest updated_at timestamps, and their row counts,
+which change when rows are deleted. `versioned` turns it into a strong ETag and a
+Last-Modified, so a client holding the current version gets a 304 without the
+view running.
+"""
+
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+
+def get_etag(version):
+    return hashlib.sha1(repr(sorted(version.items())).encode()).hexdigest()
+
+
+def get_last_modified(version):
+    timestamps = [value for value in version.values() if isinstance(value, datetime)]
+    return max(timestamps, default=None)
+
+
+def versioned(get_version):
+    """Serve the view with validators from `get_version`, which takes the view's URL
+    arguments and returns a dict of timestamps and counts, or None when there's
+    nothing to serve"""
+
+    def version(request, *args, **kwargs):
+        # condition() asks for the ETag and the Last-Modified separately
+        if not hasattr(request, "tracker_version"):
+            request.tracker_version = get_version(*args, **kwargs)
+        return request.tracker_version
+
+    def etag(request, *args, **kwargs):
+        row_version = version(request, *args, **kwargs)
+        return get_etag(row_version) if row_version else None
+
+    def last_modified(request, *args, **kwargs):
+        row_version = version(request, *args, **kwargs)
+        return get_last_modified(row_version) if row_version else None
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(
+            view
+        )
+        if not iscoroutinefunction(view):
+            return conditional_view
+
+        # condition() calls the validator functions synchronously, so an async view
+        # has to look the version up first
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            request.tracker_version = await sync_to_async(get_version)(*args, **kwargs)
+            return await conditional_view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _patch_public(response):
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=settings.PAGE_MAX_AGE,
+        s_maxage=settings.PAGE_SHARED_MAX_AGE,
+    )
+    return response
+
+
+def cache_public(view):
+    """Let browsers keep the page for PAGE_MAX_AGE seconds, and shared caches like
+    nginx for PAGE_SHARED_MAX_AGE, then revalidate it with its validators"""
+    if iscoroutinefunction(view):
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            return _patch_public(await view(request, *args, **kwargs))
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return _patch_public(view(request, *args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,10 @@
+class DecadeConverter:
+    """A decade written as its first year with an "s", like 1990s"""
+
+    regex = "[0-9]{3}0s"
+
+    def to_python(self, value):
+        return int(value[:-1])
+
+    def to_url(self, value):
+        return f"{value}s"
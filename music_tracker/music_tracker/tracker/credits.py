@@ -0,0 +1,74 @@
+"""The stored artist credits on albums and songs.
+
+`artist_credit` and `Song.full_display` are what the admin and `Song.__str__`
+show, so changelists and autocomplete widgets don't query the credits row by row.
+Signals refresh them when credits, artists or albums change, see signals.py.
+"""
+
+from django.db import connection, transaction
+
+from music_tracker.tracker.models import Album, Song, format_artist_credit
+
+_BATCH_SIZE = 500
+
+
+def _save(model, fields, records):
+    # bulk_update's CASE expressions cost more to build than to run, so update each
+    # row by its primary key instead
+    opts = model._meta
+    quote_name = connection.ops.quote_name
+    fields = [opts.get_field(name) for name in fields]
+    assignments = ", ".join(f"{quote_name(field.column)} = %s" for field in fields)
+    rows = [
+        [
+            field.get_db_prep_save(getattr(record, field.attname), connection)
+            for field in fields
+        ]
+        + [opts.pk.get_db_prep_value(record.pk, connection)]
+        for record in records
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {quote_name(opts.db_table)} SET {assignments} "
+            f"WHERE {quote_name(opts.pk.column)} = %s",
+            rows,
+        )
+
+
+def _refresh(model, queryset):
+    fields = ["artist_credit"] + (["full_display"] if model is Song else [])
+    batch = []
+    with transaction.atomic():
+        for record in queryset.for_display().iterator(chunk_size=_BATCH_SIZE):
+            record.artist_credit = format_artist_credit(record.artists.all())
+            if model is Song:
+                record.full_display = record.format_full_info(
+                    record.album.title if record.album else None
+                )
+            batch.append(record)
+            if len(batch) == _BATCH_SIZE:
+                _save(model, fields, batch)
+                batch = []
+        _save(model, fields, batch)
+
+
+def refresh(model, ids):
+    """Recompute the credits of the `model` objects `ids`, Album or Song"""
+    _refresh(model, model.objects.filter(id__in=ids))
+
+
+def refresh_artists(artist_ids):
+    """Recompute the credits of everything credited to any of `artist_ids`"""
+    for model in (Album, Song):
+        refresh(
+            model,
+            model.artists.through.objects.filter(artist_id__in=artist_ids).values(
+                f"{model._meta.model_name}_id"
+            ),
+        )
+
+
+def rebuild():
+    """Recompute every credit from scratch"""
+    for model in (Album, Song):
+        _refresh(model, model.objects.all())
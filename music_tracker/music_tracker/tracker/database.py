@@ -0,0 +1,39 @@
+"""Upkeep for the persistent SQLite connections configured in settings.DATABASES"""
+
+from time import monotonic
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def schedule_optimize(sender, connection, **kwargs):
+    if connection.vendor == "sqlite" and settings.SQLITE_OPTIMIZE_INTERVAL > 0:
+        connection.next_optimize = monotonic() + settings.SQLITE_OPTIMIZE_INTERVAL
+
+
+@receiver(request_finished)
+def optimize_connections(sender, **kwargs):
+    """Run PRAGMA optimize on connections that are due.
+
+    SQLite suggests running it before closing a connection, but persistent
+    connections rarely close, so it runs on an interval instead. This happens
+    after the response has been sent.
+    """
+    now = monotonic()
+    for connection in connections.all(initialized_only=True):
+        next_optimize = getattr(connection, "next_optimize", None)
+        if (
+            next_optimize is None
+            or now < next_optimize
+            or connection.connection is None
+            or connection.in_atomic_block
+        ):
+            continue
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA optimize")
+        connection.next_optimize = now + settings.SQLITE_OPTIMIZE_INTERVAL
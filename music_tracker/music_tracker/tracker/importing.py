@@ -0,0 +1,324 @@
+"""Importing whole obsession and Spotify Top 100 lists from CSV or JSON.
+
+Each row is a song: its title, its artists, optionally its album, its position
+and its list's year. CSV separates artists with ";", since names can hold commas,
+and JSON can give them as a list. JSON is either an array of objects or one
+object per line. Both are parsed as they're read, so files of any size import in
+constant memory apart from what's created.
+
+Artists, albums and songs are matched on normalized names, through dicts built
+once per import, and whatever's missing is created. Everything is written with
+bulk_create in one transaction. That skips the signals, so the stats, the search
+index, the cached pages and the snapshot are brought up to date afterwards.
+"""
+
+import csv
+import json
+import unicodedata
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from music_tracker.tracker import caching, search, snapshot, stats
+from music_tracker.tracker.models import (
+    Album,
+    Artist,
+    ObsessionList,
+    ObsessionSongs,
+    Song,
+    SpotifyTop100List,
+    SpotifyTop100Songs,
+    format_artist_credit,
+    is_valid_year,
+)
+
+# The list model, entry model, the entry's list field and the title of new lists
+# for each kind of list
+KINDS = {
+    "obsessions": (ObsessionList, ObsessionSongs, "obsession_list", "{} Obsessions"),
+    "spotify_top_100": (
+        SpotifyTop100List,
+        SpotifyTop100Songs,
+        "top_100_list",
+        "Spotify Top 100: {}",
+    ),
+}
+
+FORMATS = ["csv", "json"]
+
+_BATCH_SIZE = 1000
+_READ_SIZE = 64 * 1024
+
+
+def normalize(name):
+    """`name` folded for matching, so case, spacing and Unicode forms don't
+    matter"""
+    return " ".join(unicodedata.normalize("NFKC", name).casefold().split())
+
+
+def _read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def _read_json(stream):
+    """Each object in a JSON array, or in a stream of JSON objects"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    done = False
+    while True:
+        # Skip to the next value, past the array's brackets and commas
+        while position < len(buffer) and buffer[position] in " \t\r\n,[]":
+            position += 1
+        try:
+            row, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if done:
+                if buffer[position:].strip():
+                    raise ValidationError("The file isn't valid JSON")
+                return
+            chunk = stream.read(_READ_SIZE)
+            done = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        if end == len(buffer) and not done:
+            # A number or a truncated value may continue in the next chunk
+            chunk = stream.read(_READ_SIZE)
+            done = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        if not isinstance(row, dict):
+            raise ValidationError("Every song in a JSON file has to be an object")
+        yield row
+        position = end
+
+
+def get_format(name):
+    """The format of the file called `name`, from its extension"""
+    return "csv" if name.lower().endswith(".csv") else "json"
+
+
+def read_rows(stream, format):
+    """The rows in the text `stream`, a "csv" or "json" file, as they're read"""
+    return _read_csv(stream) if format == "csv" else _read_json(stream)
+
+
+def _get_artist_names(value):
+    if isinstance(value, str):
+        value = value.split(";")
+    return [name.strip() for name in value or [] if name and name.strip()]
+
+
+class _Catalog:
+    """The artists, albums and songs, indexed by normalized name, and the ones
+    created for the import so far"""
+
+    def __init__(self):
+        self.artists = {
+            normalize(name): Artist(id=id, name=name)
+            for id, name in Artist.objects.values_list("id", "name")
+        }
+        self.albums = {
+            (normalize(title), normalize(credit)): Album(id=id, title=title)
+            for id, title, credit in Album.objects.values_list(
+                "id", "title", "artist_credit"
+            )
+        }
+        self.songs = {
+            (normalize(title), normalize(credit)): id
+            for id, title, credit in Song.objects.values_list(
+                "id", "title", "artist_credit"
+            )
+        }
+        self.created = {Artist: [], Album: [], Song: []}
+        self.credits = {Album: [], Song: []}
+
+    def get_artists(self, names):
+        artists = {}
+        for name in names:
+            key = normalize(name)
+            if key not in self.artists:
+                self.artists[key] = Artist(name=name)
+                self.created[Artist].append(self.artists[key])
+            artists[key] = self.artists[key]
+        # In the order stored credits list them, see models.ordered_artists
+        return sorted(artists.values(), key=lambda artist: artist.name)
+
+    def add_credits(self, model, obj, artists):
+        field = f"{model._meta.model_name}_id"
+        self.credits[model] += [
+            model.artists.through(**{field: obj.id}, artist_id=artist.id)
+            for artist in artists
+        ]
+
+    def get_album(self, title, artists, credit, year):
+        key = (normalize(title), normalize(credit))
+        if key not in self.albums:
+            album = Album(title=title, year=year, artist_credit=credit)
+            self.albums[key] = album
+            self.created[Album].append(album)
+            self.add_credits(Album, album, artists)
+        return self.albums[key]
+
+    def get_song_id(self, row, year):
+        artists = self.get_artists(_get_artist_names(row.get("artists")))
+        credit = format_artist_credit(artists)
+        key = (normalize(row["title"]), normalize(credit))
+        if key not in self.songs:
+            album_title = (row.get("album") or "").strip()
+            album = (
+                self.get_album(album_title, artists, credit, year)
+                if album_title
+                else None
+            )
+            song = Song(
+                title=row["title"].strip(),
+                year=year,
+                album_id=album.id if album else None,
+                artist_credit=credit,
+            )
+            song.full_display = song.format_full_info(album.title if album else None)
+            self.songs[key] = song.id
+            self.created[Song].append(song)
+            self.add_credits(Song, song, artists)
+        return self.songs[key]
+
+    def save(self):
+        for model in (Artist, Album, Song):
+            model.objects.bulk_create(self.created[model], batch_size=_BATCH_SIZE)
+        for model in (Album, Song):
+            model.artists.through.objects.bulk_create(
+                self.credits[model], batch_size=_BATCH_SIZE
+            )
+
+
+def _get_year(row, year, number):
+    value = row.get("year") or year
+    if value in (None, ""):
+        raise ValidationError(f"Row {number} has no year, and no year was given")
+    try:
+        is_valid_year(value)
+    except ValidationError:
+        raise ValidationError(f"Row {number}: {value} is not a valid year")
+    return int(value)
+
+
+def _get_position(row, default, number):
+    value = row.get("position")
+    if value in (None, ""):
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"Row {number}: {value} is not a position")
+
+
+def _read_entries(rows, year, catalog):
+    """The song id at each position of each year's list in `rows`"""
+    entries = {}
+    try:
+        for number, row in enumerate(rows, start=1):
+            if not (row.get("title") or "").strip():
+                raise ValidationError(f"Row {number} has no title")
+            row_year = _get_year(row, year, number)
+            songs = entries.setdefault(row_year, {})
+            position = _get_position(row, len(songs) + 1, number)
+            song_id = catalog.get_song_id(row, row_year)
+            if position in songs:
+                raise ValidationError(
+                    f"Row {number}: {row_year} already has a song at {position}"
+                )
+            if song_id in songs.values():
+                raise ValidationError(
+                    f"Row {number}: {row['title']} is on the {row_year} list twice"
+                )
+            songs[position] = song_id
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise ValidationError(f"The file can't be read: {e}")
+    return entries
+
+
+def import_list(rows, kind, year=None, replace=False):
+    """Import `rows` into the `kind` lists of their years, or of `year` for rows
+    without one, creating any lists that don't exist yet unpublished. Lists that
+    already have entries are refused unless `replace` is set, which deletes them
+    first. Returns the number of entries imported by year."""
+    list_model, entry_model, list_field, title = KINDS[kind]
+
+    with transaction.atomic():
+        catalog = _Catalog()
+        entries = _read_entries(rows, year, catalog)
+
+        lists = {
+            list_record.year: list_record
+            for list_record in list_model.objects.filter(year__in=entries)
+        }
+        existing = entry_model.objects.filter(**{f"{list_field}__in": lists.values()})
+        if existing.exists():
+            if not replace:
+                years = sorted(
+                    set(existing.values_list(f"{list_field}__year", flat=True))
+                )
+                raise ValidationError(
+                    "Already imported: "
+                    + ", ".join(str(list_year) for list_year in years)
+                )
+            # Without a round of signals per entry, since everything they'd
+            # update is refreshed below
+            replaced_artist_ids = set(
+                existing.values_list("song__artists", flat=True).distinct()
+            )
+            existing._raw_delete(existing.db)
+        else:
+            replaced_artist_ids = set()
+        for list_year in entries.keys() - lists.keys():
+            lists[list_year] = list_model.objects.create(
+                title=title.format(list_year),
+                year=list_year,
+            )
+
+        catalog.save()
+        entry_model.objects.bulk_create(
+            [
+                entry_model(
+                    **{list_field: lists[list_year]},
+                    song_id=song_id,
+                    ordering=position,
+                )
+                for list_year, songs in entries.items()
+                for position, song_id in songs.items()
+            ],
+            batch_size=_BATCH_SIZE,
+        )
+
+        _refresh(catalog, kind, lists.values(), replaced_artist_ids)
+    return {list_year: len(songs) for list_year, songs in sorted(entries.items())}
+
+
+def _refresh(catalog, kind, lists, replaced_artist_ids):
+    """Catch everything the bulk writes skipped up with the import"""
+    list_model, entry_model, list_field, _ = KINDS[kind]
+    for model, created in catalog.created.items():
+        search.index(model, [obj.id for obj in created])
+
+    entries = entry_model.objects.filter(**{f"{list_field}__in": lists})
+    stats.refresh_artist_stats(
+        replaced_artist_ids
+        | set(
+            Song.artists.through.objects.filter(
+                song__in=entries.values("song_id")
+            ).values_list("artist_id", flat=True)
+        )
+    )
+
+    # For the API's ETags
+    list_model.objects.filter(id__in=[list_record.id for list_record in lists]).update(
+        updated_at=timezone.now()
+    )
+    for model in (Album, Song):
+        caching.invalidate_admin_choices(model)
+    caching.invalidate_all_pages()
+    snapshot.schedule_refresh()
@@ -0,0 +1,213 @@
+"""Ingesting listening history into per-song, per-day play counts.
+
+Reads Spotify's streaming history exports, either the account data's
+StreamingHistory*.json (endTime, artistName, trackName, msPlayed) or the extended
+history's Streaming_History_Audio_*.json (ts, ms_played,
+master_metadata_track_name and so on), or a CSV with either set of columns.
+
+Ingesting is a pipeline of generators, so only one event is in memory at a time:
+the rows are read as they're parsed (see `importing.read_rows`), parsed into
+plays, matched to songs through a dict of normalized titles and artists, and
+summed into one count per song and day. Only those counts are stored, in
+SongPlayCount, never the events.
+
+Each song day keeps the time of its last play counted, and only the plays after
+it are added, so ingesting an export again, or one that overlaps an earlier one
+or picks up partway through a day, counts each play once. That takes exports to
+be ingested in the order they were exported: a play before a day's last counted
+one is taken to be counted already.
+"""
+
+from collections import Counter
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from music_tracker.tracker import snapshot
+from music_tracker.tracker.importing import normalize
+from music_tracker.tracker.models import Song, SongPlayCount
+
+# Spotify only counts a stream as a play after 30 seconds
+MIN_PLAY_MS = 30_000
+
+# The timestamp, track, artist, album and duration keys of each export format
+_FIELDS = [
+    (
+        "ts",
+        "master_metadata_track_name",
+        "master_metadata_album_artist_name",
+        "master_metadata_album_album_name",
+        "ms_played",
+    ),
+    ("endTime", "trackName", "artistName", None, "msPlayed"),
+]
+
+_BATCH_SIZE = 500
+
+
+def _get_played_at(value, number):
+    try:
+        played_at = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"Event {number}: {value} is not a timestamp")
+    if played_at.tzinfo is None:
+        # Both formats are in UTC
+        played_at = played_at.replace(tzinfo=dt_timezone.utc)
+    return played_at
+
+
+def parse_plays(rows, report):
+    """The (time, title, artist, album, ms played) of each play in `rows`, leaving
+    out podcasts and anything too short to count as a play"""
+    for number, row in enumerate(rows, start=1):
+        report["events"] += 1
+        for timestamp, title, artist, album, duration in _FIELDS:
+            if timestamp in row:
+                break
+        else:
+            raise ValidationError(f"Event {number} isn't from a known export format")
+
+        try:
+            ms_played = int(row.get(duration) or 0)
+        except ValueError:
+            raise ValidationError(f"Event {number}: {row[duration]} is not a duration")
+        if not row.get(title) or ms_played < MIN_PLAY_MS:
+            report["skipped"] += 1
+            continue
+        yield (
+            _get_played_at(row[timestamp], number),
+            row[title],
+            row.get(artist) or "",
+            (row.get(album) or "") if album else "",
+            ms_played,
+        )
+
+
+class _SongIndex:
+    """Songs by normalized title and credited artist, and album when there are
+    several"""
+
+    def __init__(self):
+        self.songs = {}
+        self.album_songs = {}
+        credits = Song.artists.through.objects.values_list(
+            "song_id", "song__title", "artist__name", "song__album__title"
+        )
+        for song_id, title, artist, album in credits.iterator(chunk_size=5000):
+            key = (normalize(title), normalize(artist))
+            self.songs.setdefault(key, song_id)
+            self.album_songs.setdefault((*key, normalize(album or "")), song_id)
+        # Exports repeat the same tracks over and over, so remember each one's match
+        self.matches = {}
+
+    def get_song_id(self, title, artist, album):
+        try:
+            return self.matches[title, artist, album]
+        except KeyError:
+            key = (normalize(title), normalize(artist))
+            song_id = self.album_songs.get((*key, normalize(album))) or self.songs.get(
+                key
+            )
+            self.matches[title, artist, album] = song_id
+            return song_id
+
+
+def match_plays(plays, index, report):
+    """The (song id, time, ms played) of each of `plays` that's of a known song"""
+    for played_at, title, artist, album, ms_played in plays:
+        song_id = index.get_song_id(title, artist, album)
+        if song_id is None:
+            report["unmatched"][artist, title] += 1
+            continue
+        report["matched"] += 1
+        yield song_id, played_at, ms_played
+
+
+def _get_last_played():
+    """The last play counted of each (song id, date)"""
+    return {
+        (song_id, date): last_played_at
+        for song_id, date, last_played_at in SongPlayCount.objects.values_list(
+            "song_id", "date", "last_played_at"
+        ).iterator(chunk_size=5000)
+    }
+
+
+def count_plays(matches, last_played, report):
+    """The plays, total ms played and last play of each song on each day, leaving
+    out the plays up to the `last_played` ones already counted"""
+    # Looked up once, as it's too slow to do for every event
+    tz = timezone.get_current_timezone()
+    counts = {}
+    for song_id, played_at, ms_played in matches:
+        key = (song_id, played_at.astimezone(tz).date())
+        counted = last_played.get(key)
+        if counted is not None and played_at <= counted:
+            report["counted"] += 1
+            continue
+        count = counts.setdefault(key, [0, 0, played_at])
+        count[0] += 1
+        count[1] += ms_played
+        count[2] = max(count[2], played_at)
+    return counts
+
+
+def _save(counts):
+    """Add `counts` to SongPlayCount"""
+    opts = SongPlayCount._meta
+    # The connection itself, as going through the proxy for every value is slow
+    connection = connections[SongPlayCount.objects.db]
+    quote_name = connection.ops.quote_name
+    fields = [
+        opts.get_field(name)
+        for name in ["song", "date", "plays", "ms_played", "last_played_at"]
+    ]
+    rows = (
+        [
+            field.get_db_prep_save(value, connection)
+            for field, value in zip(fields, (*key, *count))
+        ]
+        for key, count in counts.items()
+    )
+    song, date, plays, ms_played, last_played_at = [
+        quote_name(field.column) for field in fields
+    ]
+    sql = (
+        f"INSERT INTO {quote_name(opts.db_table)} "
+        f"({song}, {date}, {plays}, {ms_played}, {last_played_at}) "
+        f"VALUES (%s, %s, %s, %s, %s) ON CONFLICT ({song}, {date}) DO UPDATE SET "
+        f"{plays} = {plays} + excluded.{plays}, "
+        f"{ms_played} = {ms_played} + excluded.{ms_played}, "
+        f"{last_played_at} = excluded.{last_played_at}"
+    )
+    with connection.cursor() as cursor:
+        while batch := list(islice(rows, _BATCH_SIZE)):
+            cursor.executemany(sql, batch)
+
+
+def ingest(rows):
+    """Add the plays in `rows`, the events of a listening history export, to the
+    play counts. Returns a report of the events read and skipped, the plays
+    matched, a Counter of the (artist, title) of unmatched plays, the plays
+    already counted and the number of song days counted."""
+    report = {
+        "events": 0,
+        "skipped": 0,
+        "matched": 0,
+        "unmatched": Counter(),
+        "counted": 0,
+    }
+    with transaction.atomic():
+        counts = count_plays(
+            match_plays(parse_plays(rows, report), _SongIndex(), report),
+            _get_last_played(),
+            report,
+        )
+        _save(counts)
+        snapshot.schedule_refresh()
+    report["song_days"] = len(counts)
+    return report
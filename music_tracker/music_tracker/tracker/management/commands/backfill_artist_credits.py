@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from music_tracker.tracker import credits, search
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the stored artist credits on every album and song, and the "
+        "search index that reads them"
+    )
+
+    def handle(self, *args, **options):
+        credits.rebuild()
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS("Backfilled artist credits"))
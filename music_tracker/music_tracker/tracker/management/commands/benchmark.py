@@ -0,0 +1,243 @@
+import json
+import platform
+import statistics
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+from time import perf_counter
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import Client, override_settings
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from music_tracker.tracker import stats
+from music_tracker.tracker.models import (
+    Artist,
+    ObsessionArtistSummary,
+    ObsessionList,
+    SpotifyTop100List,
+    TopTenAlbumsList,
+)
+
+# Arguments to generate_fixture_data for each dataset size
+SIZES = {
+    "small": {
+        "artists": 200,
+        "albums": 500,
+        "songs": 2_000,
+        "years": 5,
+        "rankings": 20,
+    },
+    "medium": {
+        "artists": 5_000,
+        "albums": 10_000,
+        "songs": 50_000,
+        "years": 30,
+        "rankings": 200,
+    },
+    "large": {
+        "artists": 50_000,
+        "albums": 100_000,
+        "songs": 500_000,
+        "years": 120,
+        "rankings": 1_000,
+    },
+}
+
+# Caches off, so every run measures the real work
+UNCACHED = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+def get_benchmarks():
+    """Name -> callable for every view and heavy model method, against the middle
+    year of the dataset and its busiest artist"""
+    years = list(
+        TopTenAlbumsList.get_published().order_by("year").values_list("year", flat=True)
+    )
+    year = years[len(years) // 2]
+    artist = Artist.objects.get(
+        id=ObsessionArtistSummary.objects.order_by("-song_count").first().artist_id
+    )
+    obsession_list = ObsessionList.objects.get(year=year)
+    client = Client()
+
+    def view(path):
+        def run():
+            response = client.get(path)
+            if response.status_code not in (200, 302):
+                raise CommandError(f"{path} returned {response.status_code}")
+
+        return run
+
+    return {
+        "view:index": view("/"),
+        "view:top_ten": view(f"/albums/{year}"),
+        "view:top_ten_decade": view(f"/albums/decade/{year // 10 * 10}s"),
+        "view:obsessions": view(f"/obsessions/{year}"),
+        "view:obsessions_stats": view("/obsessions/stats"),
+        "view:spotify_top_100": view(f"/top-100/{year}"),
+        "view:spotify_top_100_stats": view("/top-100-stats/"),
+        "view:artist_stats": view(f"/artist/{artist.id}"),
+        "view:artist_stats_between": view(f"/artist/{artist.id}/{year - 9}-{year}"),
+        "Artist.get_listed_albums": lambda: list(artist.get_listed_albums()),
+        "ObsessionList.get_songs": lambda: list(obsession_list.get_songs()),
+        "stats.spotify_top_100_stats": lambda: stats.spotify_top_100_stats(
+            list(SpotifyTop100List.get_published().values_list("year", flat=True))
+        ),
+    }
+
+
+def measure(func, iterations):
+    timings = []
+    for _ in range(iterations):
+        # The log is capped, so it has to have room for this run's queries
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            func()
+            timings.append(perf_counter() - start)
+
+    # A separate run for memory, since tracing slows everything down
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "iterations": iterations,
+        "mean_ms": round(statistics.mean(timings) * 1000, 3),
+        "p50_ms": round(timings[len(timings) // 2] * 1000, 3),
+        "p95_ms": round(
+            timings[min(len(timings) - 1, len(timings) * 95 // 100)] * 1000, 3
+        ),
+        "max_ms": round(timings[-1] * 1000, 3),
+        "queries": len(queries),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every tracker view and the heavy model methods against generated "
+        "datasets, writing the results as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="small,medium",
+            help=f"Comma separated dataset sizes, from {', '.join(SIZES)}",
+        )
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument(
+            "--output",
+            default=settings.BASE_DIR / "benchmark-results.json",
+            help="File to write the results to",
+        )
+        parser.add_argument(
+            "--compare",
+            help="A previous results file to check for regressions against",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=1.25,
+            help="How much slower than --compare a p50 can get before it's a regression",
+        )
+
+    def handle(self, *args, **options):
+        sizes = options["sizes"].split(",")
+        for size in sizes:
+            if size not in SIZES:
+                raise CommandError(f"Unknown size {size}")
+
+        results = {
+            "commit": get_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "sizes": {},
+        }
+
+        setup_test_environment()
+        try:
+            for size in sizes:
+                results["sizes"][size] = self.run_size(size, options["iterations"])
+        finally:
+            teardown_test_environment()
+
+        with open(options["output"], "w") as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+        if options["compare"]:
+            self.compare(results, options["compare"], options["threshold"])
+
+    def run_size(self, size, iterations):
+        """Benchmark against a fresh test database filled to `size`"""
+        old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+        try:
+            self.stdout.write(f"Generating {size} dataset")
+            call_command("generate_fixture_data", stdout=self.stdout, **SIZES[size])
+
+            size_results = {}
+            with override_settings(CACHES=UNCACHED):
+                for name, func in get_benchmarks().items():
+                    size_results[name] = measure(func, iterations)
+                    self.stdout.write(
+                        f"  {size:<6} {name:<30} "
+                        f"p50 {size_results[name]['p50_ms']:>9.2f}ms  "
+                        f"p95 {size_results[name]['p95_ms']:>9.2f}ms  "
+                        f"{size_results[name]['queries']:>4} queries  "
+                        f"{size_results[name]['peak_memory_kb']:>9.1f}KB"
+                    )
+            return size_results
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def compare(self, results, previous_file, threshold):
+        with open(previous_file) as f:
+            previous = json.load(f)
+
+        regressions = []
+        for size, size_results in results["sizes"].items():
+            for name, result in size_results.items():
+                before = previous["sizes"].get(size, {}).get(name)
+                if before is None:
+                    continue
+                if result["p50_ms"] > before["p50_ms"] * threshold:
+                    regressions.append(
+                        f"{size} {name}: p50 {before['p50_ms']}ms -> {result['p50_ms']}ms"
+                    )
+                if result["queries"] > before["queries"]:
+                    regressions.append(
+                        f"{size} {name}: {before['queries']} -> {result['queries']} queries"
+                    )
+
+        if regressions:
+            raise CommandError(
+                f"Regressions against {previous_file} ({previous.get('commit')}):\n"
+                + "\n".join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {previous_file}"))
@@ -0,0 +1,239 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, connections
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment
+
+from music_tracker.tracker.management.commands.benchmark import SIZES, UNCACHED
+from music_tracker.tracker.management.commands.export_static import (
+    get_published_paths,
+)
+from music_tracker.tracker.models import Album, ObsessionSongs
+
+# Database settings for each profile. "tuned" is whatever settings.DATABASES
+# configures, "untuned" is Django's stock SQLite setup.
+UNTUNED = {"CONN_MAX_AGE": 0, "OPTIONS": {}}
+JOURNAL_MODES = {"tuned": None, "untuned": "DELETE"}
+
+
+def _init_worker(database_file, database_settings):
+    django.setup()
+    # Never share the parent's database connection across processes
+    connections.close_all()
+    connections["default"].settings_dict.update(NAME=database_file, **database_settings)
+    setup_test_environment()
+    override_settings(CACHES=UNCACHED).enable()
+
+
+def _wait_until(start_at):
+    time.sleep(max(0, start_at - time.time()))
+
+
+def run_reader(paths, start_at, duration, seed):
+    """Request random public pages until the run is over"""
+    rng = random.Random(seed)
+    client = Client()
+    timings = []
+    errors = 0
+
+    _wait_until(start_at)
+    while time.time() < start_at + duration:
+        start = perf_counter()
+        try:
+            if client.get(rng.choice(paths)).status_code != 200:
+                errors += 1
+        except OperationalError:
+            errors += 1
+        timings.append(perf_counter() - start)
+        # The test client skips the request signals that recycle connections
+        close_old_connections()
+    return "read", timings, errors
+
+
+def run_writer(start_at, duration, delay, seed):
+    """Save albums and list entries through the ORM, the way the admin does"""
+    rng = random.Random(seed)
+    album_ids = list(Album.objects.values_list("id", flat=True))
+    entry_ids = list(ObsessionSongs.objects.values_list("id", flat=True))
+    close_old_connections()
+    timings = []
+    errors = 0
+
+    _wait_until(start_at)
+    while time.time() < start_at + duration:
+        start = perf_counter()
+        try:
+            if rng.random() < 0.5:
+                album = Album.objects.get(id=rng.choice(album_ids))
+                album.listened = not album.listened
+                album.save()
+            else:
+                ObsessionSongs.objects.get(id=rng.choice(entry_ids)).save()
+        except OperationalError:
+            errors += 1
+        timings.append(perf_counter() - start)
+        close_old_connections()
+        time.sleep(delay)
+    return "write", timings, errors
+
+
+def summarize(timings, errors, duration):
+    timings = sorted(timings)
+    if not timings:
+        return {"count": 0, "errors": errors}
+    return {
+        "count": len(timings),
+        "per_second": round(len(timings) / duration, 1),
+        "p50_ms": round(timings[len(timings) // 2] * 1000, 3),
+        "p95_ms": round(
+            timings[min(len(timings) - 1, len(timings) * 95 // 100)] * 1000, 3
+        ),
+        "p99_ms": round(
+            timings[min(len(timings) - 1, len(timings) * 99 // 100)] * 1000, 3
+        ),
+        "errors": errors,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark public page reads running alongside admin-style writes, from "
+        "separate processes like uwsgi workers, with and without the SQLite tuning "
+        "in settings.DATABASES"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            default="small",
+            choices=list(SIZES),
+            help="Dataset size, as in the benchmark command",
+        )
+        parser.add_argument(
+            "--profiles",
+            default="tuned,untuned",
+            help=f"Comma separated database profiles, from {', '.join(JOURNAL_MODES)}",
+        )
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--writers", type=int, default=1)
+        parser.add_argument(
+            "--duration", type=float, default=10, help="Seconds per profile"
+        )
+        parser.add_argument(
+            "--write-delay",
+            type=float,
+            default=0.01,
+            help="Seconds each writer pauses between writes",
+        )
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        profiles = options["profiles"].split(",")
+        for profile in profiles:
+            if profile not in JOURNAL_MODES:
+                raise CommandError(f"Unknown profile {profile}")
+
+        tuned = {
+            "CONN_MAX_AGE": connection.settings_dict["CONN_MAX_AGE"],
+            "OPTIONS": connection.settings_dict["OPTIONS"],
+        }
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Worker processes can't share an in-memory test database
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(
+                directory, "dataset.sqlite3"
+            )
+            old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+            try:
+                self.stdout.write(f"Generating {options['size']} dataset")
+                call_command(
+                    "generate_fixture_data",
+                    stdout=self.stdout,
+                    **SIZES[options["size"]],
+                )
+                paths = get_published_paths()
+
+                results = {}
+                for profile in profiles:
+                    database_file = os.path.join(directory, f"{profile}.sqlite3")
+                    self.copy_database(database_file, JOURNAL_MODES[profile])
+                    results[profile] = self.run_profile(
+                        database_file,
+                        tuned if profile == "tuned" else UNTUNED,
+                        paths,
+                        options,
+                    )
+                    self.report(profile, results[profile])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def copy_database(self, database_file, journal_mode):
+        destination = sqlite3.connect(database_file)
+        try:
+            connection.ensure_connection()
+            connection.connection.backup(destination)
+            if journal_mode:
+                destination.execute(f"PRAGMA journal_mode={journal_mode}")
+        finally:
+            destination.close()
+
+    def run_profile(self, database_file, database_settings, paths, options):
+        duration = options["duration"]
+        readers, writers = options["readers"], options["writers"]
+        connections.close_all()
+
+        with ProcessPoolExecutor(
+            max_workers=readers + writers,
+            initializer=_init_worker,
+            initargs=(database_file, database_settings),
+        ) as pool:
+            # Leave the workers time to start up before the clock starts
+            start_at = time.time() + 2
+            futures = [
+                pool.submit(run_reader, paths, start_at, duration, seed)
+                for seed in range(readers)
+            ] + [
+                pool.submit(
+                    run_writer, start_at, duration, options["write_delay"], seed
+                )
+                for seed in range(writers)
+            ]
+
+            collected = {"read": ([], 0), "write": ([], 0)}
+            for future in futures:
+                kind, timings, errors = future.result()
+                all_timings, all_errors = collected[kind]
+                collected[kind] = (all_timings + timings, all_errors + errors)
+
+        return {
+            kind: summarize(timings, errors, duration)
+            for kind, (timings, errors) in collected.items()
+        }
+
+    def report(self, profile, result):
+        for kind, summary in result.items():
+            if not summary["count"]:
+                self.stdout.write(f"  {profile:<8} {kind:<6} no requests finished")
+                continue
+            self.stdout.write(
+                f"  {profile:<8} {kind:<6} {summary['per_second']:>8.1f}/s  "
+                f"p50 {summary['p50_ms']:>8.2f}ms  "
+                f"p95 {summary['p95_ms']:>8.2f}ms  "
+                f"p99 {summary['p99_ms']:>8.2f}ms  "
+                f"{summary['errors']:>4} errors"
+            )
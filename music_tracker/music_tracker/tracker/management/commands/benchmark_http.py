@@ -0,0 +1,90 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+from music_tracker.tracker.management.commands.benchmark_concurrency import summarize
+from music_tracker.tracker.management.commands.export_static import (
+    get_published_paths,
+)
+
+
+def run_client(base_url, paths, start_at, duration, seed):
+    """Request random pages from the server until the run is over"""
+    rng = random.Random(seed)
+    timings = []
+    errors = 0
+
+    time.sleep(max(0, start_at - time.time()))
+    while time.time() < start_at + duration:
+        start = perf_counter()
+        try:
+            with urlopen(base_url + rng.choice(paths), timeout=30) as response:
+                response.read()
+        except (URLError, OSError):
+            errors += 1
+        timings.append(perf_counter() - start)
+    return timings, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark a running server, such as uwsgi or an ASGI server like uvicorn, "
+        "with concurrent clients requesting the published pages"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--duration", type=float, default=10, help="Seconds")
+        parser.add_argument(
+            "--paths",
+            help="Comma separated paths to request, instead of every published page",
+        )
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        paths = (
+            options["paths"].split(",") if options["paths"] else get_published_paths()
+        )
+        if not paths:
+            raise CommandError("There are no published pages to request")
+
+        base_url = options["url"].rstrip("/")
+        duration = options["duration"]
+        concurrency = options["concurrency"]
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            start_at = time.time() + 1
+            futures = [
+                pool.submit(run_client, base_url, paths, start_at, duration, seed)
+                for seed in range(concurrency)
+            ]
+            timings, errors = [], 0
+            for future in futures:
+                client_timings, client_errors = future.result()
+                timings += client_timings
+                errors += client_errors
+
+        result = summarize(timings, errors, duration)
+        if result["count"]:
+            self.stdout.write(
+                f"{base_url}  {concurrency} clients  "
+                f"{result['per_second']:>8.1f}/s  "
+                f"p50 {result['p50_ms']:>8.2f}ms  "
+                f"p95 {result['p95_ms']:>8.2f}ms  "
+                f"p99 {result['p99_ms']:>8.2f}ms  "
+                f"{result['errors']:>4} errors"
+            )
+        else:
+            self.stdout.write(f"{base_url}  no requests finished")
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(result, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
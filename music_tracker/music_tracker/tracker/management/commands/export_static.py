@@ -0,0 +1,176 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import resolve
+
+from music_tracker.tracker.models import (
+    Album,
+    ObsessionArtistStat,
+    ObsessionList,
+    SpotifyTop100ArtistStat,
+    SpotifyTop100List,
+    TopTenAlbumsList,
+)
+
+MANIFEST_NAME = "manifest.json"
+
+
+def get_published_paths():
+    """Every public page, including the artist pages the lists and stats link to"""
+    top_ten_years = list(
+        TopTenAlbumsList.get_published().values_list("year", flat=True)
+    )
+    obsession_years = ObsessionList.get_published().values_list("year", flat=True)
+    spotify_years = SpotifyTop100List.get_published().values_list("year", flat=True)
+
+    artist_ids = set(
+        Album.objects.filter(year__in=top_ten_years, rank__isnull=False).values_list(
+            "artists", flat=True
+        )
+    )
+    artist_ids |= set(
+        ObsessionArtistStat.objects.filter(published=True).values_list(
+            "artist_id", flat=True
+        )
+    )
+    artist_ids |= set(
+        SpotifyTop100ArtistStat.objects.filter(published=True).values_list(
+            "artist_id", flat=True
+        )
+    )
+    artist_ids.discard(None)
+
+    return (
+        [f"/albums/{year}" for year in top_ten_years]
+        + [
+            f"/albums/decade/{decade}s"
+            for decade in sorted({year // 10 * 10 for year in top_ten_years})
+        ]
+        + [f"/obsessions/{year}" for year in obsession_years]
+        + ["/obsessions/stats"]
+        + [f"/top-100/{year}" for year in spotify_years]
+        + ["/top-100-stats/"]
+        + [f"/artist/{artist_id}" for artist_id in sorted(map(str, artist_ids))]
+    )
+
+
+def _init_worker():
+    django.setup()
+    # Never share the parent's database connection across processes
+    connections.close_all()
+
+
+def render_page(path, etag=None):
+    """Render `path` as an anonymous visitor would see it, unless its ETag is still
+    `etag`. Every page is versioned, see tracker/conditional.py, so that only
+    takes the version query."""
+    headers = {"If-None-Match": etag} if etag else {}
+    request = RequestFactory().get(path, headers=headers)
+    request.user = AnonymousUser()
+    match = resolve(path)
+    response = match.func(request, *match.args, **match.kwargs)
+    return path, response.status_code, response.get("ETag"), response.content
+
+
+def get_output_file(output_dir, path):
+    return os.path.join(output_dir, path.strip("/"), "index.html")
+
+
+class Command(BaseCommand):
+    help = "Render every published page to HTML files that nginx can serve directly"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=settings.STATIC_EXPORT_ROOT,
+            help="Directory to export to",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of rendering processes, 1 renders in this one",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Render every page, even if what it shows hasn't changed",
+        )
+
+    def handle(self, *args, **options):
+        output_dir = options["output"]
+        manifest_file = os.path.join(output_dir, MANIFEST_NAME)
+
+        manifest = {}
+        if os.path.exists(manifest_file):
+            with open(manifest_file) as f:
+                manifest = json.load(f)
+
+        paths = get_published_paths()
+        # The ETag each page was exported at, for the pages still on disk
+        etags = [
+            (
+                None
+                if options["force"]
+                or not os.path.exists(get_output_file(output_dir, path))
+                else manifest.get(path)
+            )
+            for path in paths
+        ]
+
+        written = 0
+        new_manifest = {}
+        with ExitStack() as stack:
+            if options["workers"] == 1:
+                pages = map(render_page, paths, etags)
+            else:
+                connections.close_all()
+                pool = stack.enter_context(
+                    ProcessPoolExecutor(
+                        max_workers=options["workers"], initializer=_init_worker
+                    )
+                )
+                pages = pool.map(render_page, paths, etags, chunksize=16)
+
+            for path, status_code, etag, content in pages:
+                if status_code not in (200, 304):
+                    self.stderr.write(f"Skipping {path}: {status_code}")
+                    continue
+                new_manifest[path] = etag
+                if status_code == 304:
+                    continue
+
+                output_file = get_output_file(output_dir, path)
+                os.makedirs(os.path.dirname(output_file), exist_ok=True)
+                with open(output_file + ".tmp", "wb") as f:
+                    f.write(content)
+                os.replace(output_file + ".tmp", output_file)
+                written += 1
+
+        # Pages that were unpublished since the last export
+        removed = 0
+        for path in manifest.keys() - new_manifest.keys():
+            output_file = get_output_file(output_dir, path)
+            if os.path.exists(output_file):
+                os.remove(output_file)
+                removed += 1
+
+        with open(manifest_file + ".tmp", "w") as f:
+            json.dump(new_manifest, f, indent=2, sort_keys=True)
+        os.replace(manifest_file + ".tmp", manifest_file)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Exported {len(new_manifest)} pages to {output_dir}: "
+                f"{written} written, {removed} removed, "
+                f"{len(new_manifest) - written} unchanged"
+            )
+        )
@@ -0,0 +1,246 @@
+import random
+from itertools import islice
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from music_tracker.tracker import caching, credits, search, stats
+from music_tracker.tracker.models import (
+    Album,
+    Artist,
+    ArtistAlbumRanking,
+    ArtistAlbumRankingEntry,
+    ObsessionList,
+    ObsessionSongs,
+    Song,
+    SpotifyTop100List,
+    SpotifyTop100Songs,
+    TopTenAlbumsList,
+)
+
+# fmt: off
+WORDS = [
+    "black", "blue", "bright", "broken", "city", "cold", "dark", "dawn", "dead",
+    "desert", "dream", "electric", "empty", "fire", "ghost", "glass", "gold",
+    "heart", "high", "house", "ice", "iron", "light", "lost", "love", "midnight",
+    "moon", "night", "ocean", "paper", "queen", "rain", "red", "river", "rose",
+    "silver", "sky", "slow", "smoke", "snow", "soft", "star", "stone", "summer",
+    "sun", "sweet", "thunder", "velvet", "white", "wild", "wind", "winter",
+]
+# fmt: on
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic artists, albums, songs and published lists "
+        "for capacity planning. Use an empty database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--artists", type=int, default=50_000)
+        parser.add_argument("--albums", type=int, default=100_000)
+        parser.add_argument("--songs", type=int, default=500_000)
+        parser.add_argument("--years", type=int, default=120)
+        parser.add_argument("--start-year", type=int, default=1900)
+        parser.add_argument(
+            "--obsessions-per-list",
+            type=int,
+            default=50,
+            help="Songs on each year's obsession list",
+        )
+        parser.add_argument(
+            "--rankings",
+            type=int,
+            default=1_000,
+            help="Number of artists with a published album ranking",
+        )
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        years = [options["start_year"] + offset for offset in range(options["years"])]
+
+        artist_ids = self.timed("artists", self.create_artists, options["artists"])
+        albums_by_year = self.timed(
+            "albums", self.create_albums, options["albums"], years, artist_ids
+        )
+        songs_by_year = self.timed(
+            "songs", self.create_songs, options["songs"], albums_by_year
+        )
+        self.timed(
+            "lists",
+            self.create_lists,
+            years,
+            songs_by_year,
+            options["obsessions_per_list"],
+        )
+        self.timed(
+            "album rankings",
+            self.create_rankings,
+            options["rankings"],
+            artist_ids,
+            albums_by_year,
+        )
+
+        # bulk_create skips the signals that keep these up to date
+        self.timed("stats", stats.rebuild_stats)
+        self.timed("artist credits", credits.rebuild)
+        self.timed("search index", search.rebuild)
+        caching.invalidate_navigation()
+
+    def timed(self, label, func, *args):
+        start = perf_counter()
+        result = func(*args)
+        self.stdout.write(f"Created {label} in {perf_counter() - start:.1f}s")
+        return result
+
+    def bulk_create(self, model, objects):
+        with transaction.atomic():
+            for batch in batched(objects, self.batch_size):
+                model.objects.bulk_create(batch)
+
+    def title(self, words):
+        return " ".join(self.random.sample(WORDS, words)).title()
+
+    def create_artists(self, count):
+        artists = [Artist(name=f"{self.title(2)} {index}") for index in range(count)]
+        self.bulk_create(Artist, artists)
+        return [artist.id for artist in artists]
+
+    def create_albums(self, count, years, artist_ids):
+        """Spread albums evenly over the years, ranking the first 20 of each year"""
+        albums_by_year = {year: [] for year in years}
+        credits = []
+
+        def albums():
+            for index in range(count):
+                year = years[index % len(years)]
+                position = len(albums_by_year[year])
+                album = Album(
+                    title=self.title(3),
+                    year=year,
+                    listened=position < 40 or self.random.random() < 0.3,
+                    original_rating=self.random.choice([None, 1, 2, 3]),
+                    rank=position + 1 if position < 20 else None,
+                )
+                album_artist_ids = self.random.sample(
+                    artist_ids, self.random.choice([1, 1, 1, 2])
+                )
+                albums_by_year[year].append((album.id, album_artist_ids))
+                for artist_id in album_artist_ids:
+                    credits.append(
+                        Album.artists.through(album_id=album.id, artist_id=artist_id)
+                    )
+                yield album
+
+        self.bulk_create(Album, albums())
+        self.bulk_create(Album.artists.through, credits)
+        return albums_by_year
+
+    def create_songs(self, count, albums_by_year):
+        """Give each song an album, crediting the album's artists"""
+        years = list(albums_by_year)
+        songs_by_year = {year: [] for year in years}
+        credits = []
+
+        def songs():
+            for index in range(count):
+                year = years[index % len(years)]
+                if not albums_by_year[year]:
+                    continue
+                album_id, album_artist_ids = self.random.choice(albums_by_year[year])
+                song = Song(title=self.title(2), year=year, album_id=album_id)
+                songs_by_year[year].append(song.id)
+                for artist_id in album_artist_ids:
+                    credits.append(
+                        Song.artists.through(song_id=song.id, artist_id=artist_id)
+                    )
+                yield song
+
+        self.bulk_create(Song, songs())
+        self.bulk_create(Song.artists.through, credits)
+        return songs_by_year
+
+    def create_lists(self, years, songs_by_year, obsessions_per_list):
+        obsessions = []
+        spotify_songs = []
+
+        # Multi-table inherited lists can't be bulk created
+        with transaction.atomic():
+            for year in years:
+                TopTenAlbumsList.objects.create(
+                    title=f"Top Albums of {year}", year=year, published=True
+                )
+                obsession_list = ObsessionList.objects.create(
+                    title=f"{year} Obsessions", year=year, published=True
+                )
+                top_100_list = SpotifyTop100List.objects.create(
+                    title=f"Spotify Top 100: {year}", year=year, published=True
+                )
+
+                song_ids = songs_by_year[year]
+                for ordering, song_id in enumerate(
+                    self.random.sample(
+                        song_ids, min(obsessions_per_list, len(song_ids))
+                    ),
+                    start=1,
+                ):
+                    obsessions.append(
+                        ObsessionSongs(
+                            song_id=song_id,
+                            obsession_list=obsession_list,
+                            ordering=ordering,
+                        )
+                    )
+                for ordering, song_id in enumerate(
+                    self.random.sample(song_ids, min(100, len(song_ids))), start=1
+                ):
+                    spotify_songs.append(
+                        SpotifyTop100Songs(
+                            song_id=song_id,
+                            top_100_list=top_100_list,
+                            ordering=ordering,
+                        )
+                    )
+
+        self.bulk_create(ObsessionSongs, obsessions)
+        self.bulk_create(SpotifyTop100Songs, spotify_songs)
+
+    def create_rankings(self, count, artist_ids, albums_by_year):
+        albums_by_artist = {}
+        for albums in albums_by_year.values():
+            for album_id, album_artist_ids in albums:
+                for artist_id in album_artist_ids:
+                    albums_by_artist.setdefault(artist_id, []).append(album_id)
+
+        rankings = []
+        entries = []
+        ranked_artist_ids = [
+            artist_id for artist_id in artist_ids if artist_id in albums_by_artist
+        ]
+        for artist_id in self.random.sample(
+            ranked_artist_ids, min(count, len(ranked_artist_ids))
+        ):
+            ranking = ArtistAlbumRanking(artist_id=artist_id, published=True)
+            rankings.append(ranking)
+            album_ids = albums_by_artist[artist_id]
+            for rank, album_id in enumerate(
+                self.random.sample(album_ids, len(album_ids)), start=1
+            ):
+                entries.append(
+                    ArtistAlbumRankingEntry(
+                        ranking=ranking, album_id=album_id, rank=rank
+                    )
+                )
+
+        self.bulk_create(ArtistAlbumRanking, rankings)
+        self.bulk_create(ArtistAlbumRankingEntry, entries)
@@ -0,0 +1,46 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from music_tracker.tracker import importing
+
+
+class Command(BaseCommand):
+    help = (
+        "Import obsession or Spotify Top 100 lists from a CSV or JSON file with a "
+        "title, artists, album, position and year for each song"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("kind", choices=list(importing.KINDS))
+        parser.add_argument(
+            "--year", type=int, help="The list's year, for rows without one"
+        )
+        parser.add_argument(
+            "--format",
+            choices=importing.FORMATS,
+            help="Defaults to the file's extension",
+        )
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Replace the entries of lists that already have some",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        format = options["format"] or importing.get_format(path)
+        try:
+            with open(path, encoding="utf-8-sig", newline="") as stream:
+                counts = importing.import_list(
+                    importing.read_rows(stream, format),
+                    options["kind"],
+                    year=options["year"],
+                    replace=options["replace"],
+                )
+        except ValidationError as e:
+            raise CommandError(e.messages[0])
+
+        for year, count in counts.items():
+            self.stdout.write(f"Imported {count} songs for {year}")
+        self.stdout.write(self.style.SUCCESS(f"Imported {path}"))
@@ -0,0 +1,52 @@
+from contextlib import ExitStack
+from itertools import chain
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from music_tracker.tracker import importing, listening
+
+
+class Command(BaseCommand):
+    help = (
+        "Add the plays in a Spotify streaming history export, JSON or CSV files, to "
+        "the per-song daily play counts. Exports can be ingested again, or overlap, "
+        "without counting any play twice, as long as they're ingested in order."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="+",
+            help="Every file of the export, so days split between files add up",
+        )
+        parser.add_argument(
+            "--format",
+            choices=importing.FORMATS,
+            help="Defaults to each file's extension",
+        )
+
+    def handle(self, *args, **options):
+        with ExitStack() as stack:
+            rows = chain.from_iterable(
+                importing.read_rows(
+                    stack.enter_context(open(path, encoding="utf-8-sig", newline="")),
+                    options["format"] or importing.get_format(path),
+                )
+                for path in options["paths"]
+            )
+            try:
+                report = listening.ingest(rows)
+            except ValidationError as e:
+                raise CommandError(e.messages[0])
+
+        unmatched = report["unmatched"]
+        self.stdout.write(
+            f"{report['events']} events, {report['skipped']} skipped, "
+            f"{report['matched']} plays matched, {report['counted']} already counted, "
+            f"{report['song_days']} song days counted, "
+            f"{unmatched.total()} plays of unknown songs"
+        )
+        for (artist, title), plays in unmatched.most_common(10):
+            self.stdout.write(f"  {plays} plays of {title} by {artist}")
+        self.stdout.write(self.style.SUCCESS("Ingested listening history"))
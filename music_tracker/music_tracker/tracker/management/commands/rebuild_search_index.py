@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from music_tracker.tracker import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from scratch"
+
+    def handle(self, *args, **options):
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS("Rebuilt search index"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from music_tracker.tracker import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the obsession and Spotify Top 100 stats tables from scratch"
+
+    def handle(self, *args, **options):
+        stats.rebuild_stats()
+        self.stdout.write(self.style.SUCCESS("Rebuilt stats tables"))
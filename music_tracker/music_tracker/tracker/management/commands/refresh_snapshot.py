@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from music_tracker.tracker import snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the database to the read-only snapshot that public pages read from, "
+        "after changes that skip the ORM's signals"
+    )
+
+    def handle(self, *args, **options):
+        if not snapshot.is_enabled():
+            raise CommandError("SNAPSHOT_DATABASE_ENABLED is off")
+
+        snapshot.refresh()
+        self.stdout.write(
+            self.style.SUCCESS(f"Refreshed {settings.SNAPSHOT_DATABASE_PATH}")
+        )
@@ -0,0 +1,126 @@
+"""Per-view timing metrics, collected by PerformanceMiddleware.
+
+Samples are kept in memory, so under uwsgi each worker process reports on the
+requests it has served itself.
+"""
+
+import threading
+from collections import deque
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+
+METRICS = ["wall_time", "db_queries", "db_time", "template_time"]
+PERCENTILES = [50, 95, 99]
+
+current_timings: ContextVar["RequestTimings | None"] = ContextVar(
+    "current_timings", default=None
+)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        """A connection.execute_wrapper that times every query"""
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_time += perf_counter() - start
+
+
+class RollingHistogram:
+    """The most recent `size` samples of a metric"""
+
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)
+
+    def add(self, value):
+        self.samples.append(value)
+
+    def percentiles(self):
+        samples = sorted(self.samples)
+        if not samples:
+            return {}
+        return {
+            f"p{p}": samples[min(len(samples) - 1, len(samples) * p // 100)]
+            for p in PERCENTILES
+        }
+
+
+_histograms: dict[str, dict[str, RollingHistogram]] = {}
+_lock = threading.Lock()
+
+
+def record(view_name, wall_time, timings):
+    histograms = _histograms.get(view_name)
+    if histograms is None:
+        with _lock:
+            histograms = _histograms.setdefault(
+                view_name,
+                {
+                    metric: RollingHistogram(settings.PERFORMANCE_METRICS_WINDOW)
+                    for metric in METRICS
+                },
+            )
+
+    histograms["wall_time"].add(wall_time)
+    histograms["db_queries"].add(timings.db_queries)
+    histograms["db_time"].add(timings.db_time)
+    histograms["template_time"].add(timings.template_time)
+
+
+def get_summary():
+    """p50/p95/p99 of every metric, per view. Times are in milliseconds."""
+    summary = {}
+    for view_name, histograms in sorted(_histograms.items()):
+        summary[view_name] = {"requests": len(histograms["wall_time"].samples)}
+        for metric, histogram in histograms.items():
+            scale = 1 if metric == "db_queries" else 1000
+            summary[view_name][metric] = {
+                p: round(value * scale, 3)
+                for p, value in histogram.percentiles().items()
+            }
+    return summary
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        timings = current_timings.get()
+        if timings is None:
+            return self.template.render(context, request)
+
+        start = perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            timings.template_time += perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render times added to the current request's
+    timings"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
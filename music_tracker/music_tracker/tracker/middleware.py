@@ -0,0 +1,52 @@
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from music_tracker.tracker import metrics
+
+
+class PerformanceMiddleware:
+    """Records wall time, query count, query time and template time per URL name.
+
+    When PERFORMANCE_METRICS_ENABLED is off the middleware removes itself from the
+    stack, so there's no cost at all.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PERFORMANCE_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = metrics.RequestTimings()
+        token = metrics.current_timings.set(timings)
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timings.record_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            metrics.current_timings.reset(token)
+        wall_time = perf_counter() - start
+
+        match = request.resolver_match
+        # Only the tracker's own views, not the admin
+        if match and match.url_name and not match.namespace:
+            metrics.record(match.url_name, wall_time, timings)
+
+        if settings.PERFORMANCE_SERVER_TIMING:
+            response["Server-Timing"] = ", ".join(
+                [
+                    f"total;dur={wall_time * 1000:.1f}",
+                    f'db;dur={timings.db_time * 1000:.1f};desc="{timings.db_queries} queries"',
+                    f"template;dur={timings.template_time * 1000:.1f}",
+                ]
+            )
+
+        return response
@@ -0,0 +1,185 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+import music_tracker.tracker.models
+
+
+def populate_stats(apps, schema_editor):
+    ObsessionSongs = apps.get_model("tracker", "ObsessionSongs")
+    SpotifyTop100Songs = apps.get_model("tracker", "SpotifyTop100Songs")
+    ObsessionArtistStat = apps.get_model("tracker", "ObsessionArtistStat")
+    ObsessionArtistSummary = apps.get_model("tracker", "ObsessionArtistSummary")
+    SpotifyTop100ArtistStat = apps.get_model("tracker", "SpotifyTop100ArtistStat")
+
+    obsessions = ObsessionSongs.objects.filter(song__artists__isnull=False)
+    ObsessionArtistStat.objects.bulk_create(
+        ObsessionArtistStat(
+            artist_id=row["song__artists"],
+            obsession_list_id=row["obsession_list"],
+            year=row["obsession_list__year"],
+            published=row["obsession_list__published"],
+            song_count=row["songs"],
+        )
+        for row in obsessions.values(
+            "song__artists",
+            "obsession_list",
+            "obsession_list__year",
+            "obsession_list__published",
+        ).annotate(songs=Count("song", distinct=True))
+    )
+    ObsessionArtistSummary.objects.bulk_create(
+        ObsessionArtistSummary(
+            artist_id=row["song__artists"],
+            song_count=row["songs"],
+            list_count=row["lists"],
+        )
+        for row in obsessions.filter(obsession_list__published=True)
+        .values("song__artists")
+        .annotate(
+            songs=Count("song", distinct=True),
+            lists=Count("obsession_list", distinct=True),
+        )
+    )
+
+    spotify_songs = SpotifyTop100Songs.objects.filter(song__artists__isnull=False)
+    SpotifyTop100ArtistStat.objects.bulk_create(
+        SpotifyTop100ArtistStat(
+            artist_id=row["song__artists"],
+            top_100_list_id=row["top_100_list"],
+            year=row["top_100_list__year"],
+            published=row["top_100_list__published"],
+            song_count=row["songs"],
+        )
+        for row in spotify_songs.values(
+            "song__artists",
+            "top_100_list",
+            "top_100_list__year",
+            "top_100_list__published",
+        ).annotate(songs=Count("song", distinct=True))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracker", "0007_artistalbumranking_artistalbumrankingentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ObsessionArtistSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("song_count", models.IntegerField(default=0)),
+                ("list_count", models.IntegerField(default=0)),
+                (
+                    "artist",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE, to="tracker.artist"
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ObsessionArtistStat",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "year",
+                    music_tracker.tracker.models.YearField(
+                        max_length=4,
+                        validators=[music_tracker.tracker.models.is_valid_year],
+                    ),
+                ),
+                ("published", models.BooleanField(default=False)),
+                ("song_count", models.IntegerField(default=0)),
+                (
+                    "artist",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="tracker.artist"
+                    ),
+                ),
+                (
+                    "obsession_list",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="tracker.obsessionlist",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["published", "year"],
+                        name="tracker_obs_publish_804f9a_idx",
+                    )
+                ],
+                "unique_together": {("artist", "obsession_list")},
+            },
+        ),
+        migrations.CreateModel(
+            name="SpotifyTop100ArtistStat",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "year",
+                    music_tracker.tracker.models.YearField(
+                        max_length=4,
+                        validators=[music_tracker.tracker.models.is_valid_year],
+                    ),
+                ),
+                ("published", models.BooleanField(default=False)),
+                ("song_count", models.IntegerField(default=0)),
+                (
+                    "artist",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="tracker.artist"
+                    ),
+                ),
+                (
+                    "top_100_list",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="tracker.spotifytop100list",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["published", "year"],
+                        name="tracker_spo_publish_e34bc5_idx",
+                    )
+                ],
+                "unique_together": {("artist", "top_100_list")},
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracker", "0008_artist_stats"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="album",
+            index=models.Index(
+                fields=["year", "rank"], name="tracker_alb_year_400173_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="album",
+            index=models.Index(
+                fields=["listened", "year"], name="tracker_alb_listene_cbbf6d_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="list",
+            index=models.Index(
+                fields=["published"], name="tracker_lis_publish_893af4_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="obsessionsongs",
+            index=models.Index(
+                fields=["obsession_list", "ordering"],
+                name="tracker_obs_obsessi_d08ac8_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="spotifytop100songs",
+            index=models.Index(
+                fields=["top_100_list", "ordering"],
+                name="tracker_spo_top_100_778763_idx",
+            ),
+        ),
+        # Covering indexes for the reverse side of the artist M2Ms (artist -> albums,
+        # artist -> songs). Auto-created through tables can't declare Meta.indexes.
+        migrations.RunSQL(
+            'CREATE INDEX "tracker_album_artists_artist_album_idx" '
+            'ON "tracker_album_artists" ("artist_id", "album_id")',
+            'DROP INDEX "tracker_album_artists_artist_album_idx"',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX "tracker_song_artists_artist_song_idx" '
+            'ON "tracker_song_artists" ("artist_id", "song_id")',
+            'DROP INDEX "tracker_song_artists_artist_song_idx"',
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:27
+
+from django.db import migrations
+
+import music_tracker.tracker.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracker", "0009_access_path_indexes"),
+    ]
+
+    operations = [
+        # Blank years were saved as empty strings, which can't be cast to integers.
+        # Historical models build YearField from the current code, so this can't
+        # go through the ORM.
+        migrations.RunSQL(
+            "UPDATE tracker_song SET year = NULL WHERE year = ''",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name="album",
+            name="year",
+            field=music_tracker.tracker.models.YearField(
+                validators=[music_tracker.tracker.models.is_valid_year]
+            ),
+        ),
+        migrations.AlterField(
+            model_name="obsessionartiststat",
+            name="year",
+            field=music_tracker.tracker.models.YearField(
+                validators=[music_tracker.tracker.models.is_valid_year]
+            ),
+        ),
+        migrations.AlterField(
+            model_name="obsessionlist",
+            name="year",
+            field=music_tracker.tracker.models.YearField(
+                unique=True, validators=[music_tracker.tracker.models.is_valid_year]
+            ),
+        ),
+        migrations.AlterField(
+            model_name="song",
+            name="year",
+            field=music_tracker.tracker.models.YearField(
+                blank=True,
+                default=None,
+                null=True,
+                validators=[music_tracker.tracker.models.is_valid_year],
+            ),
+        ),
+        migrations.AlterField(
+            model_name="spotifytop100artiststat",
+            name="year",
+            field=music_tracker.tracker.models.YearField(
+                validators=[music_tracker.tracker.models.is_valid_year]
+            ),
+        ),
+        migrations.AlterField(
+            model_name="spotifytop100list",
+            name="year",
+            field=music_tracker.tracker.models.YearField(
+                unique=True, validators=[music_tracker.tracker.models.is_valid_year]
+            ),
+        ),
+        migrations.AlterField(
+            model_name="toptenalbumslist",
+            name="year",
+            field=music_tracker.tracker.models.YearField(
+                unique=True, validators=[music_tracker.tracker.models.is_valid_year]
+            ),
+        ),
+    ]
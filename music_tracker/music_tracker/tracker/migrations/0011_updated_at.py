@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracker", "0010_integer_years"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="artist",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="artistalbumrankingentry",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="list",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="obsessionsongs",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="spotifytop100songs",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.db import migrations
+
+
+def credits(through_table, column):
+    return (
+        "(SELECT group_concat(name, ', ') FROM (SELECT artist.name FROM "
+        f"{through_table} credit JOIN tracker_artist artist "
+        f"ON artist.id = credit.artist_id WHERE credit.{column} = source.id "
+        "ORDER BY artist.name))"
+    )
+
+
+SOURCES = [
+    ("artist", "tracker_artist", "source.name", "''"),
+    (
+        "album",
+        "tracker_album",
+        "source.title",
+        credits("tracker_album_artists", "album_id"),
+    ),
+    (
+        "song",
+        "tracker_song",
+        "source.title",
+        credits("tracker_song_artists", "song_id"),
+    ),
+]
+
+
+def populate_sql():
+    statements = []
+    for kind, table, title, artists in SOURCES:
+        statements += [
+            "INSERT INTO tracker_search_key (kind, object_id) "
+            f"SELECT '{kind}', source.id FROM {table} source",
+            "INSERT INTO tracker_search (rowid, title, artists) "
+            f"SELECT entry.id, {title}, {artists} FROM {table} source "
+            "JOIN tracker_search_key entry "
+            f"ON entry.kind = '{kind}' AND entry.object_id = source.id",
+        ]
+    return statements
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracker", "0011_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [
+                "CREATE TABLE tracker_search_key ("
+                "id integer NOT NULL PRIMARY KEY AUTOINCREMENT, "
+                "kind varchar(6) NOT NULL, "
+                "object_id char(32) NOT NULL, "
+                "UNIQUE (kind, object_id))",
+                "CREATE VIRTUAL TABLE tracker_search USING fts5("
+                "title, artists, tokenize='trigram')",
+                *populate_sql(),
+            ],
+            [
+                "DROP TABLE tracker_search",
+                "DROP TABLE tracker_search_key",
+            ],
+        ),
+    ]
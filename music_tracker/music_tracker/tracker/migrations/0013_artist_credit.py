@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:11
+
+from django.db import migrations, models
+from django.db.models import Prefetch
+
+
+def populate_credits(apps, schema_editor):
+    Artist = apps.get_model("tracker", "Artist")
+    Album = apps.get_model("tracker", "Album")
+    Song = apps.get_model("tracker", "Song")
+    ordered_artists = Prefetch("artists", queryset=Artist.objects.order_by("name"))
+
+    def credit(record):
+        return ", ".join(artist.name for artist in record.artists.all())
+
+    albums = list(Album.objects.prefetch_related(ordered_artists))
+    for album in albums:
+        album.artist_credit = credit(album)
+    Album.objects.bulk_update(albums, ["artist_credit"], batch_size=500)
+
+    songs = list(Song.objects.select_related("album").prefetch_related(ordered_artists))
+    for song in songs:
+        song.artist_credit = credit(song)
+        album_part = f" ({song.album.title})" if song.album else ""
+        song.full_display = f"{song.title} - {song.artist_credit}{album_part}"
+    Song.objects.bulk_update(songs, ["artist_credit", "full_display"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracker", "0012_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="album",
+            name="artist_credit",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.AddField(
+            model_name="song",
+            name="artist_credit",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.AddField(
+            model_name="song",
+            name="full_display",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.RunPython(populate_credits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracker", "0013_artist_credit"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SongPlayCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("plays", models.PositiveIntegerField(default=0)),
+                ("ms_played", models.PositiveBigIntegerField(default=0)),
+                ("last_played_at", models.DateTimeField()),
+                (
+                    "song",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="tracker.song"
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["date"], name="tracker_son_date_68ad4b_idx")
+                ],
+                "unique_together": {("song", "date")},
+            },
+        ),
+    ]
@@ -3,6 +3,7 @@ from uuid import uuid4
 
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Prefetch
 
 
 # Create your models here.
@@ -22,16 +23,43 @@ class UUIDPKField(models.UUIDField):
         super().__init__(*args, **kwargs)
 
 
-class YearField(models.CharField):
+class YearField(models.PositiveSmallIntegerField):
     def __init__(self, *args: Any, **kwargs: Any) -> None:
-        kwargs["max_length"] = 4
         kwargs["validators"] = [is_valid_year]
         super().__init__(*args, **kwargs)
 
 
+def format_artist_credit(artists):
+    return ", ".join(artist.name for artist in artists)
+
+
+def ordered_artists(lookup="artists"):
+    """Prefetch the artists for `lookup` in the order they're displayed"""
+    return Prefetch(lookup, queryset=Artist.objects.order_by("name"))
+
+
+class AlbumQuerySet(models.QuerySet):
+    def for_display(self):
+        return self.prefetch_related(ordered_artists())
+
+
+class SongQuerySet(models.QuerySet):
+    def for_display(self):
+        return self.select_related("album").prefetch_related(ordered_artists())
+
+
+class ListEntryQuerySet(models.QuerySet):
+    def for_display(self):
+        return self.select_related("song", "song__album").prefetch_related(
+            ordered_artists("song__artists")
+        )
+
+
 class Artist(models.Model):
     id = UUIDPKField()
     name = models.CharField(max_length=250)
+    # Also bumped whenever anything on the artist's page changes, see signals
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self) -> str:
         return self.name
@@ -39,11 +67,13 @@ class Artist(models.Model):
     def get_albums(self, **kwargs):
         return Album.objects.filter(artists=self.id, **kwargs)
 
-    def get_listed_albums(self):
-        published_top_tens = list(
-            TopTenAlbumsList.get_published().values_list("year", flat=True)
-        )
+    def get_listed_albums(self, years=None):
+        """Albums from the published top ten years, optionally limited to the
+        (first, last) span `years`"""
+        published_top_tens = TopTenAlbumsList.get_published().values("year")
         albums = self.get_albums(listened=True)
+        if years:
+            albums = albums.filter(year__range=years)
         return albums.filter(year__in=published_top_tens).order_by("year", "rank")
 
     def get_top_ten_albums(self):
@@ -58,6 +88,12 @@ class Artist(models.Model):
     def get_obsession_list_songs(self):
         return ObsessionSongs.get_songs().filter(song__artists=self.id)
 
+    def get_obsession_stats(self, years=None):
+        stats = ObsessionArtistStat.objects.filter(artist=self.id, published=True)
+        if years:
+            stats = stats.filter(year__range=years)
+        return stats.order_by("year")
+
     def get_published_album_ranking(self):
         try:
             return (
@@ -84,12 +120,16 @@ class Album(models.Model):
         choices=[(i, i) for i in range(1, 21)], null=True, default=None, blank=True
     )
     artists = models.ManyToManyField(Artist, null=True, blank=True, default=None)
+    # The artists' names, kept up to date by tracker/credits.py
+    artist_credit = models.TextField(blank=True, default="", editable=False)
+
+    objects = AlbumQuerySet.as_manager()
 
     def __str__(self) -> str:
         return self.title
 
     def display_artists(self):
-        return ", ".join([str(a) for a in self.artists.all()])
+        return self.artist_credit
 
     @classmethod
     def get_ranked_albums(cls, year):
@@ -103,14 +143,31 @@ class Album(models.Model):
     def get_honorable_mentions(cls, year):
         return cls.get_ranked_albums(year).filter(rank__gt=10).order_by("rank")
 
+    @classmethod
+    def get_top_tens_between(cls, first_year, last_year):
+        """The top ten albums of every published list from `first_year` to
+        `last_year`, inclusive"""
+        published_top_tens = TopTenAlbumsList.get_published().values("year")
+        return cls.objects.filter(
+            year__range=(first_year, last_year),
+            year__in=published_top_tens,
+            rank__lt=11,
+        ).order_by("year", "rank")
+
     class Meta:
         unique_together = [("rank", "year")]
+        indexes = [
+            models.Index(fields=["year", "rank"]),
+            models.Index(fields=["listened", "year"]),
+        ]
 
 
 class List(models.Model):
     id = UUIDPKField()
     title = models.CharField(max_length=250)
     published = models.BooleanField(default=False)
+    # Also bumped whenever anything on the list's page changes, see signals
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self) -> str:
         return self.title
@@ -119,6 +176,9 @@ class List(models.Model):
     def get_published(cls):
         return cls.objects.filter(published=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["published"])]
+
 
 class TopTenAlbumsList(List):
     year = YearField(unique=True)
@@ -127,6 +187,10 @@ class TopTenAlbumsList(List):
     def get_most_recent(cls):
         return cls.get_published().order_by("-year").first()
 
+    @classmethod
+    async def aget_most_recent(cls):
+        return await cls.get_published().order_by("-year").afirst()
+
 
 class Song(models.Model):
     id = UUIDPKField()
@@ -136,18 +200,26 @@ class Song(models.Model):
         Album, on_delete=models.SET_NULL, null=True, blank=True, default=None
     )
     artists = models.ManyToManyField(Artist, null=True, blank=True, default=None)
+    # The artists' names and `display_full_info`, kept up to date by
+    # tracker/credits.py
+    artist_credit = models.TextField(blank=True, default="", editable=False)
+    full_display = models.TextField(blank=True, default="", editable=False)
+
+    objects = SongQuerySet.as_manager()
 
     def __str__(self) -> str:
         return self.display_full_info()
 
     def display_artists(self):
-        return ", ".join([str(a) for a in self.artists.all()])
+        return self.artist_credit
 
     def display_full_info(self):
         """Display song as 'Title - Artist (Album)'"""
-        artists = self.display_artists()
-        album_part = f" ({self.album.title})" if self.album else ""
-        return f"{self.title} - {artists}{album_part}"
+        return self.full_display
+
+    def format_full_info(self, album_title):
+        album_part = f" ({album_title})" if album_title is not None else ""
+        return f"{self.title} - {self.artist_credit}{album_part}"
 
 
 class ObsessionList(List):
@@ -163,6 +235,9 @@ class ObsessionSongs(models.Model):
     song = models.ForeignKey(Song, on_delete=models.CASCADE)
     obsession_list = models.ForeignKey(ObsessionList, on_delete=models.CASCADE)
     ordering = models.IntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ListEntryQuerySet.as_manager()
 
     @classmethod
     def get_songs(cls):
@@ -170,6 +245,7 @@ class ObsessionSongs(models.Model):
 
     class Meta:
         unique_together = [("ordering", "obsession_list"), ("song", "obsession_list")]
+        indexes = [models.Index(fields=["obsession_list", "ordering"])]
 
 
 class SpotifyTop100List(List):
@@ -185,6 +261,9 @@ class SpotifyTop100Songs(models.Model):
     song = models.ForeignKey(Song, on_delete=models.CASCADE)
     top_100_list = models.ForeignKey(SpotifyTop100List, on_delete=models.CASCADE)
     ordering = models.IntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ListEntryQuerySet.as_manager()
 
     @classmethod
     def get_songs(cls):
@@ -192,6 +271,7 @@ class SpotifyTop100Songs(models.Model):
 
     class Meta:
         unique_together = [("ordering", "top_100_list"), ("song", "top_100_list")]
+        indexes = [models.Index(fields=["top_100_list", "ordering"])]
 
 
 class ArtistAlbumRanking(models.Model):
@@ -205,7 +285,11 @@ class ArtistAlbumRanking(models.Model):
         return f"{self.artist.name} - Album Ranking"
 
     def get_ranked_albums(self):
-        return ArtistAlbumRankingEntry.objects.filter(ranking=self).order_by("rank")
+        return (
+            ArtistAlbumRankingEntry.objects.filter(ranking=self)
+            .select_related("album")
+            .order_by("rank")
+        )
 
 
 class ArtistAlbumRankingEntry(models.Model):
@@ -216,9 +300,61 @@ class ArtistAlbumRankingEntry(models.Model):
     notes = models.TextField(
         blank=True, null=True, help_text="Optional notes about this album's ranking"
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self) -> str:
         return f"#{self.rank} - {self.album.title}"
 
     class Meta:
         unique_together = [("ranking", "rank"), ("ranking", "album")]
+
+
+class ObsessionArtistStat(models.Model):
+    """Songs an artist has on an obsession list, maintained by tracker.stats"""
+
+    artist = models.ForeignKey(Artist, on_delete=models.CASCADE)
+    obsession_list = models.ForeignKey(ObsessionList, on_delete=models.CASCADE)
+    year = YearField()
+    published = models.BooleanField(default=False)
+    song_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [("artist", "obsession_list")]
+        indexes = [models.Index(fields=["published", "year"])]
+
+
+class ObsessionArtistSummary(models.Model):
+    """An artist's totals across every published obsession list"""
+
+    artist = models.OneToOneField(Artist, on_delete=models.CASCADE)
+    song_count = models.IntegerField(default=0)
+    list_count = models.IntegerField(default=0)
+
+
+class SpotifyTop100ArtistStat(models.Model):
+    """Songs an artist has on a Spotify Top 100 list, maintained by tracker.stats"""
+
+    artist = models.ForeignKey(Artist, on_delete=models.CASCADE)
+    top_100_list = models.ForeignKey(SpotifyTop100List, on_delete=models.CASCADE)
+    year = YearField()
+    published = models.BooleanField(default=False)
+    song_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [("artist", "top_100_list")]
+        indexes = [models.Index(fields=["published", "year"])]
+
+
+class SongPlayCount(models.Model):
+    """How often a song was played on a day, maintained by tracker.listening"""
+
+    song = models.ForeignKey(Song, on_delete=models.CASCADE)
+    date = models.DateField()
+    plays = models.PositiveIntegerField(default=0)
+    ms_played = models.PositiveBigIntegerField(default=0)
+    # Plays up to this one are counted, see tracker.listening
+    last_played_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = [("song", "date")]
+        indexes = [models.Index(fields=["date"])]
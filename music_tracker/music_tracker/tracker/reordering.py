@@ -0,0 +1,124 @@
+"""Reordering ranked albums and list entries in bulk.
+
+Each kind of entry is numbered from 1 within a group, under a unique constraint on
+the group and the position, so moving rows one save at a time trips the
+constraint on any swap. Instead every change here is a fixed number of UPDATE
+statements whatever the number of rows: the rows that move are first parked above
+the group's highest position, where nothing can collide, then shifted down into
+place. SQLite checks the constraint row by row, so no step may ever pass through a
+taken position.
+
+None of this goes through `save`, so `reordered` stands in for the usual signals,
+see signals.py.
+"""
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Max
+from django.dispatch import Signal
+from django.utils import timezone
+
+from music_tracker.tracker.models import (
+    Album,
+    ArtistAlbumRankingEntry,
+    ObsessionSongs,
+    SpotifyTop100Songs,
+)
+
+# The field that groups each kind of entry, and the field that numbers it
+POSITIONS = {
+    Album: ("year", "rank"),
+    ObsessionSongs: ("obsession_list", "ordering"),
+    SpotifyTop100Songs: ("top_100_list", "ordering"),
+    ArtistAlbumRankingEntry: ("ranking", "rank"),
+}
+
+# Sent with the model, the group and the ids of the rows whose positions changed
+reordered = Signal()
+
+
+def get_entries(model, group):
+    """The `model` entries in `group`, in order. Unranked albums are left out."""
+    group_field, position_field = POSITIONS[model]
+    return model.objects.filter(
+        **{group_field: group, f"{position_field}__isnull": False}
+    ).order_by(position_field)
+
+
+def _park(entries, position_field, offset, moves):
+    """Give each row in `moves`, a dict of id to position, its position plus
+    `offset`, in one UPDATE"""
+    entries.model.objects.bulk_update(
+        [
+            entries.model(pk=pk, **{position_field: position + offset})
+            for pk, position in moves.items()
+        ],
+        [position_field],
+    )
+
+
+def _unpark(entries, position_field, offset):
+    """Shift every parked row in `entries` down by `offset`"""
+    changes = {position_field: F(position_field) - offset}
+    if any(field.name == "updated_at" for field in entries.model._meta.fields):
+        changes["updated_at"] = timezone.now()
+    entries.filter(**{f"{position_field}__gt": offset}).update(**changes)
+
+
+def _get_offset(entries, position_field):
+    return entries.aggregate(highest=Max(position_field))["highest"] or 0
+
+
+def reorder(model, group, ids):
+    """Give the entries in `group` the positions they hold now, in the order of
+    `ids`, which has to hold every one of them exactly once. Gaps stay where they
+    are, so a year with a partial top ten keeps its honorable mentions after 10."""
+    _, position_field = POSITIONS[model]
+    ids = [str(pk) for pk in ids]
+
+    with transaction.atomic():
+        entries = get_entries(model, group)
+        current = {
+            str(pk): position
+            for pk, position in entries.select_for_update().values_list(
+                "pk", position_field
+            )
+        }
+        if len(ids) != len(set(ids)) or set(ids) != current.keys():
+            raise ValidationError(
+                "The new order has to list every entry exactly once. "
+                "Reload the page and try again."
+            )
+
+        moves = {
+            pk: position
+            for position, pk in zip(sorted(current.values()), ids)
+            if current[pk] != position
+        }
+        if moves:
+            offset = max(current.values())
+            _park(entries, position_field, offset, moves)
+            _unpark(entries, position_field, offset)
+            reordered.send(sender=model, group=group, ids=list(moves))
+    return len(moves)
+
+
+def insert(entry, position):
+    """Save the new `entry` at `position` in its group, moving everything from there
+    on down by one in two UPDATEs rather than one per row"""
+    group_field, position_field = POSITIONS[type(entry)]
+    with transaction.atomic():
+        entries = get_entries(type(entry), getattr(entry, group_field))
+        following = entries.filter(**{f"{position_field}__gte": position})
+        ids = list(following.values_list("pk", flat=True))
+        if ids:
+            offset = _get_offset(entries, position_field)
+            following.update(**{position_field: F(position_field) + offset + 1})
+            _unpark(entries, position_field, offset)
+            reordered.send(
+                sender=type(entry), group=getattr(entry, group_field), ids=ids
+            )
+
+        setattr(entry, position_field, position)
+        entry.save()
+    return entry
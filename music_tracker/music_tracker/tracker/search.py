@@ -0,0 +1,168 @@
+"""Full-text search over artists, albums and songs.
+
+An FTS5 table with the trigram tokenizer, tracker_search, holds every artist's
+name and every album's and song's title along with its artist credit, so a
+search is one indexed lookup rather than LIKE scans across the credits. Its rows
+are numbered by tracker_search_key, which maps them back to the objects. Signals
+keep it in sync with the ORM, see signals.py, and `rebuild` catches it up after
+bulk changes.
+"""
+
+from uuid import UUID
+
+from django.db import connection, connections, router, transaction
+from django.db.models.expressions import RawSQL
+
+from music_tracker.tracker.models import Album, Artist, Song
+
+KINDS = {Artist: "artist", Album: "album", Song: "song"}
+
+# Trigrams can't match anything shorter, so short words fall back to LIKE
+MIN_MATCH_LENGTH = 3
+
+_CHUNK_SIZE = 500
+
+
+# The table each kind is indexed from, and its title and artists columns
+_SOURCES = {
+    "artist": ("tracker_artist", "source.name", "''"),
+    "album": ("tracker_album", "source.title", "source.artist_credit"),
+    "song": ("tracker_song", "source.title", "source.artist_credit"),
+}
+
+
+def _hex(id):
+    # UUIDs are stored as hex on SQLite
+    return id.hex if isinstance(id, UUID) else UUID(str(id)).hex
+
+
+def _chunks(ids):
+    ids = [_hex(id) for id in ids]
+    for start in range(0, len(ids), _CHUNK_SIZE):
+        yield ids[start : start + _CHUNK_SIZE]
+
+
+def _insert(cursor, kind, where="", params=()):
+    table, title, artists = _SOURCES[kind]
+    cursor.execute(
+        "INSERT INTO tracker_search_key (kind, object_id) "
+        f"SELECT %s, source.id FROM {table} source {where}",
+        [kind, *params],
+    )
+    cursor.execute(
+        f"INSERT INTO tracker_search (rowid, title, artists) "
+        f"SELECT entry.id, {title}, {artists} FROM {table} source "
+        "JOIN tracker_search_key entry ON entry.kind = %s AND entry.object_id = source.id "
+        f"{where}",
+        [kind, *params],
+    )
+
+
+def index(model, ids):
+    """Bring the entries for the `model` objects `ids` up to date, dropping the
+    ones that have been deleted"""
+    kind = KINDS[model]
+    with transaction.atomic(), connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(
+                "DELETE FROM tracker_search WHERE rowid IN (SELECT id FROM "
+                "tracker_search_key WHERE kind = %s "
+                f"AND object_id IN ({placeholders}))",
+                [kind, *chunk],
+            )
+            cursor.execute(
+                "DELETE FROM tracker_search_key WHERE kind = %s "
+                f"AND object_id IN ({placeholders})",
+                [kind, *chunk],
+            )
+            _insert(cursor, kind, f"WHERE source.id IN ({placeholders})", chunk)
+
+
+def index_credits(artist_ids):
+    """Re-index the albums and songs credited to any of `artist_ids`, whose
+    entries include the artists' names"""
+    index(
+        Album,
+        Album.artists.through.objects.filter(artist_id__in=artist_ids).values_list(
+            "album_id", flat=True
+        ),
+    )
+    index(
+        Song,
+        Song.artists.through.objects.filter(artist_id__in=artist_ids).values_list(
+            "song_id", flat=True
+        ),
+    )
+
+
+def rebuild():
+    """Re-index everything from scratch, from the stored credits, see
+    `credits.rebuild`"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("DELETE FROM tracker_search")
+        cursor.execute("DELETE FROM tracker_search_key")
+        for kind in _SOURCES:
+            _insert(cursor, kind)
+
+
+def _escape_like(word):
+    return word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _matches(query, kinds):
+    """SQL for the kind and id of each match for `query` among `kinds`, best first,
+    or None when there's nothing to search for"""
+    words = query.split()
+    if not words:
+        return None
+
+    conditions, params = [], []
+    match_words = [word for word in words if len(word) >= MIN_MATCH_LENGTH]
+    if match_words:
+        # Quoted, so words are matched as they are rather than as FTS5 syntax
+        conditions.append("tracker_search MATCH %s")
+        params.append(
+            " ".join('"{}"'.format(word.replace('"', '""')) for word in match_words)
+        )
+    for word in words:
+        if len(word) < MIN_MATCH_LENGTH:
+            conditions.append(
+                "(tracker_search.title LIKE %s ESCAPE '\\' "
+                "OR tracker_search.artists LIKE %s ESCAPE '\\')"
+            )
+            params += [f"%{_escape_like(word)}%"] * 2
+
+    conditions.append(f"entry.kind IN ({', '.join(['%s'] * len(kinds))})")
+    params += kinds
+    ordering = "tracker_search.rank" if match_words else "tracker_search.title"
+
+    sql = (
+        "SELECT entry.kind, entry.object_id FROM tracker_search "
+        "JOIN tracker_search_key entry ON entry.id = tracker_search.rowid "
+        f"WHERE {' AND '.join(conditions)} ORDER BY {ordering}"
+    )
+    return sql, params
+
+
+def search(query, models=tuple(KINDS), limit=100):
+    """The (model, id) of the best `limit` matches for `query` among `models`"""
+    matches = _matches(query, [KINDS[model] for model in models])
+    if matches is None:
+        return []
+    sql, params = matches
+    models_by_kind = {kind: model for model, kind in KINDS.items()}
+
+    # Raw SQL goes to the default database unless it's pointed at the snapshot
+    with connections[router.db_for_read(Artist)].cursor() as cursor:
+        cursor.execute(f"{sql} LIMIT %s", [*params, limit])
+        return [(models_by_kind[kind], UUID(id)) for kind, id in cursor.fetchall()]
+
+
+def filter_queryset(queryset, query):
+    """`queryset` limited to the matches for `query`, for the admin's search"""
+    matches = _matches(query, [KINDS[queryset.model]])
+    if matches is None:
+        return queryset
+    sql, params = matches
+    return queryset.filter(pk__in=RawSQL(f"SELECT object_id FROM ({sql})", params))
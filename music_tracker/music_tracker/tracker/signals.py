@@ -0,0 +1,498 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_migrate,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from music_tracker.tracker import (
+    caching,
+    credits,
+    reordering,
+    search,
+    snapshot,
+    stats,
+)
+from music_tracker.tracker.models import (
+    Album,
+    Artist,
+    ArtistAlbumRanking,
+    ArtistAlbumRankingEntry,
+    List,
+    ObsessionArtistStat,
+    ObsessionList,
+    ObsessionSongs,
+    Song,
+    SpotifyTop100ArtistStat,
+    SpotifyTop100List,
+    SpotifyTop100Songs,
+    TopTenAlbumsList,
+)
+
+
+def _song_artist_ids(*song_ids):
+    return set(
+        Song.artists.through.objects.filter(song_id__in=song_ids).values_list(
+            "artist_id", flat=True
+        )
+    )
+
+
+def _list_artist_ids(list_record):
+    if isinstance(list_record, ObsessionList):
+        stats_rows = ObsessionArtistStat.objects.filter(obsession_list=list_record)
+    else:
+        stats_rows = SpotifyTop100ArtistStat.objects.filter(top_100_list=list_record)
+    return set(stats_rows.values_list("artist_id", flat=True))
+
+
+@receiver([post_save, post_delete])
+def invalidate_navigation(sender, **kwargs):
+    # Saving a list subclass doesn't send signals for the parent List, so match on
+    # the subclass
+    if issubclass(sender, List):
+        caching.invalidate_navigation()
+
+
+@receiver([post_save, post_delete], sender=Album)
+@receiver([post_save, post_delete], sender=Song)
+@receiver([post_save, post_delete], sender=ObsessionList)
+@receiver([post_save, post_delete], sender=SpotifyTop100List)
+def invalidate_admin_choices(sender, **kwargs):
+    # The admin's year and list filters
+    caching.invalidate_admin_choices(sender)
+
+
+@receiver(pre_save, sender=ObsessionSongs)
+@receiver(pre_save, sender=SpotifyTop100Songs)
+def remember_previous_song(sender, instance, **kwargs):
+    instance._previous_song_id = (
+        sender.objects.filter(pk=instance.pk).values_list("song_id", flat=True).first()
+        if instance.pk
+        else None
+    )
+    instance._previous_pages = _entry_pages(
+        sender.objects.filter(pk=instance.pk) if instance.pk else sender.objects.none()
+    )
+
+
+@receiver(post_save, sender=ObsessionSongs)
+@receiver(post_save, sender=SpotifyTop100Songs)
+def update_stats_for_entry(sender, instance, **kwargs):
+    song_ids = {instance.song_id, getattr(instance, "_previous_song_id", None)}
+    stats.refresh_artist_stats(_song_artist_ids(*song_ids))
+
+
+@receiver(pre_delete, sender=ObsessionSongs)
+@receiver(pre_delete, sender=SpotifyTop100Songs)
+def remember_entry_artists(sender, instance, **kwargs):
+    # The song's credits may be deleted in the same cascade, so look them up first
+    instance._artist_ids = _song_artist_ids(instance.song_id)
+
+
+@receiver(post_delete, sender=ObsessionSongs)
+@receiver(post_delete, sender=SpotifyTop100Songs)
+def update_stats_for_deleted_entry(sender, instance, **kwargs):
+    stats.refresh_artist_stats(getattr(instance, "_artist_ids", set()))
+
+
+@receiver(m2m_changed, sender=Song.artists.through)
+def update_stats_for_song_artists(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        if reverse:
+            instance._cleared_artist_ids = {instance.pk}
+        else:
+            instance._cleared_artist_ids = _song_artist_ids(instance.pk)
+    elif action == "post_clear":
+        stats.refresh_artist_stats(getattr(instance, "_cleared_artist_ids", set()))
+    elif action in ("post_add", "post_remove"):
+        stats.refresh_artist_stats({instance.pk} if reverse else pk_set)
+
+
+@receiver(post_save, sender=ObsessionList)
+@receiver(post_save, sender=SpotifyTop100List)
+def update_stats_for_list(sender, instance, **kwargs):
+    # Covers publishing, unpublishing and year changes
+    stats.refresh_artist_stats(_list_artist_ids(instance))
+
+
+@receiver(pre_delete, sender=ObsessionList)
+@receiver(pre_delete, sender=SpotifyTop100List)
+def remember_list_artists(sender, instance, **kwargs):
+    instance._artist_ids = _list_artist_ids(instance)
+
+
+@receiver(post_delete, sender=ObsessionList)
+@receiver(post_delete, sender=SpotifyTop100List)
+def update_stats_for_deleted_list(sender, instance, **kwargs):
+    stats.refresh_artist_stats(getattr(instance, "_artist_ids", set()))
+
+
+@receiver(post_save, sender=Artist)
+def bump_stats_version_for_artist(sender, instance, **kwargs):
+    # Cached stats embed artist names
+    caching.bump_stats_version()
+
+
+# Cached pages
+
+
+# The rows whose updated_at stands for each kind of page, see tracker/api.py
+_PAGE_ROWS = {
+    "top_ten": TopTenAlbumsList,
+    "obsessions": ObsessionList,
+    "spotify_top_100": SpotifyTop100List,
+}
+
+
+def _invalidate_pages(pages):
+    """Drop the cached `pages` and bump updated_at on the lists and artists they
+    show, so the API's ETags change along with them"""
+    caching.invalidate_pages(pages)
+
+    now = timezone.now()
+    for name, model in _PAGE_ROWS.items():
+        years = {arg for page, arg in pages if page == name}
+        if years:
+            model.objects.filter(year__in=years).update(updated_at=now)
+    artist_ids = {arg for page, arg in pages if page == "artist_stats"}
+    if artist_ids:
+        Artist.objects.filter(id__in=artist_ids).update(updated_at=now)
+
+
+def _list_pages_for_songs(song_ids):
+    """The obsession and Spotify Top 100 list pages that show any of `song_ids`"""
+    obsession_years = ObsessionSongs.objects.filter(song_id__in=song_ids).values_list(
+        "obsession_list__year", flat=True
+    )
+    spotify_years = SpotifyTop100Songs.objects.filter(song_id__in=song_ids).values_list(
+        "top_100_list__year", flat=True
+    )
+
+    return {("obsessions", year) for year in obsession_years} | {
+        ("spotify_top_100", year) for year in spotify_years
+    }
+
+
+def _album_pages(album_ids):
+    """The top ten pages and artist pages that show any of `album_ids`"""
+    years = Album.objects.filter(id__in=album_ids).values_list("year", flat=True)
+    artist_ids = Album.artists.through.objects.filter(
+        album_id__in=album_ids
+    ).values_list("artist_id", flat=True)
+    ranking_artist_ids = ArtistAlbumRankingEntry.objects.filter(
+        album_id__in=album_ids
+    ).values_list("ranking__artist_id", flat=True)
+
+    return (
+        {("top_ten", year) for year in years}
+        | {("artist_stats", artist_id) for artist_id in artist_ids}
+        | {("artist_stats", artist_id) for artist_id in ranking_artist_ids}
+    )
+
+
+def _artist_pages(artist_ids):
+    """Every page that shows the name of any of `artist_ids`"""
+    album_ids = Album.objects.filter(artists__in=artist_ids).values("id")
+    song_ids = Song.objects.filter(artists__in=artist_ids).values("id")
+
+    return (
+        {("artist_stats", artist_id) for artist_id in artist_ids}
+        | {
+            ("top_ten", year)
+            for year in Album.objects.filter(id__in=album_ids).values_list(
+                "year", flat=True
+            )
+        }
+        | _list_pages_for_songs(song_ids)
+    )
+
+
+def _entry_pages(entries):
+    """The list pages and artist pages that show the list entries in `entries`"""
+    pages = set()
+    for entry in entries.select_related("song"):
+        if isinstance(entry, ObsessionSongs):
+            pages.add(("obsessions", entry.obsession_list.year))
+            pages |= {
+                ("artist_stats", artist_id)
+                for artist_id in _song_artist_ids(entry.song_id)
+            }
+        else:
+            pages.add(("spotify_top_100", entry.top_100_list.year))
+    return pages
+
+
+@receiver(pre_save, sender=Album)
+def remember_previous_album_year(sender, instance, **kwargs):
+    instance._previous_pages = {
+        ("top_ten", year)
+        for year in Album.objects.filter(pk=instance.pk).values_list("year", flat=True)
+    }
+
+
+@receiver(post_save, sender=Album)
+def invalidate_album_pages(sender, instance, **kwargs):
+    _invalidate_pages(
+        _album_pages([instance.pk]) | getattr(instance, "_previous_pages", set())
+    )
+
+
+@receiver(pre_delete, sender=Album)
+def remember_album_pages(sender, instance, **kwargs):
+    instance._pages = _album_pages([instance.pk])
+
+
+@receiver(m2m_changed, sender=Album.artists.through)
+def invalidate_album_artist_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        album_ids = (
+            Album.objects.filter(artists=instance).values("id")
+            if reverse
+            else [instance.pk]
+        )
+        instance._cleared_pages = _album_pages(album_ids)
+    elif action == "post_clear":
+        _invalidate_pages(getattr(instance, "_cleared_pages", set()))
+    elif action in ("post_add", "post_remove"):
+        if reverse:
+            pages = _album_pages(pk_set) | {("artist_stats", instance.pk)}
+        else:
+            pages = _album_pages([instance.pk]) | {
+                ("artist_stats", artist_id) for artist_id in pk_set
+            }
+        _invalidate_pages(pages)
+
+
+@receiver(post_save, sender=Song)
+def invalidate_song_pages(sender, instance, **kwargs):
+    _invalidate_pages(_list_pages_for_songs([instance.pk]))
+
+
+@receiver(m2m_changed, sender=Song.artists.through)
+def invalidate_song_artist_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        if reverse:
+            song_ids = Song.objects.filter(artists=instance).values("id")
+            artist_ids = {instance.pk}
+        else:
+            song_ids = [instance.pk]
+            artist_ids = _song_artist_ids(instance.pk)
+        instance._cleared_pages = _list_pages_for_songs(song_ids) | {
+            ("artist_stats", artist_id) for artist_id in artist_ids
+        }
+    elif action == "post_clear":
+        _invalidate_pages(getattr(instance, "_cleared_pages", set()))
+    elif action in ("post_add", "post_remove"):
+        song_ids, artist_ids = (
+            (pk_set, {instance.pk}) if reverse else ([instance.pk], pk_set)
+        )
+        _invalidate_pages(
+            _list_pages_for_songs(song_ids)
+            | {("artist_stats", artist_id) for artist_id in artist_ids}
+        )
+
+
+@receiver(post_save, sender=Artist)
+def invalidate_artist_pages(sender, instance, **kwargs):
+    _invalidate_pages(_artist_pages([instance.pk]))
+
+
+@receiver(pre_delete, sender=Artist)
+def remember_artist_pages(sender, instance, **kwargs):
+    instance._pages = _artist_pages([instance.pk])
+
+
+@receiver(post_save, sender=ObsessionSongs)
+@receiver(post_save, sender=SpotifyTop100Songs)
+def invalidate_entry_pages(sender, instance, **kwargs):
+    _invalidate_pages(
+        _entry_pages(sender.objects.filter(pk=instance.pk))
+        | getattr(instance, "_previous_pages", set())
+    )
+
+
+@receiver(pre_delete, sender=ObsessionSongs)
+@receiver(pre_delete, sender=SpotifyTop100Songs)
+def remember_entry_pages(sender, instance, **kwargs):
+    instance._pages = _entry_pages(sender.objects.filter(pk=instance.pk))
+
+
+@receiver(pre_save, sender=ArtistAlbumRanking)
+def remember_previous_ranking_artist(sender, instance, **kwargs):
+    instance._previous_pages = {
+        ("artist_stats", artist_id)
+        for artist_id in ArtistAlbumRanking.objects.filter(pk=instance.pk).values_list(
+            "artist_id", flat=True
+        )
+    }
+
+
+@receiver(post_save, sender=ArtistAlbumRanking)
+def invalidate_ranking_pages(sender, instance, **kwargs):
+    _invalidate_pages(
+        {("artist_stats", instance.artist_id)}
+        | getattr(instance, "_previous_pages", set())
+    )
+
+
+@receiver(post_save, sender=ArtistAlbumRankingEntry)
+def invalidate_ranking_entry_pages(sender, instance, **kwargs):
+    _invalidate_pages({("artist_stats", instance.ranking.artist_id)})
+
+
+@receiver(pre_delete, sender=ArtistAlbumRanking)
+@receiver(pre_delete, sender=ArtistAlbumRankingEntry)
+def remember_ranking_pages(sender, instance, **kwargs):
+    ranking = instance if sender is ArtistAlbumRanking else instance.ranking
+    instance._pages = {("artist_stats", ranking.artist_id)}
+
+
+@receiver(post_delete, sender=Album)
+@receiver(post_delete, sender=Artist)
+@receiver(post_delete, sender=ObsessionSongs)
+@receiver(post_delete, sender=SpotifyTop100Songs)
+@receiver(post_delete, sender=ArtistAlbumRanking)
+@receiver(post_delete, sender=ArtistAlbumRankingEntry)
+def invalidate_deleted_pages(sender, instance, **kwargs):
+    _invalidate_pages(getattr(instance, "_pages", set()))
+
+
+@receiver(reordering.reordered)
+def invalidate_reordered_pages(sender, ids, **kwargs):
+    if sender is Album:
+        pages = _album_pages(ids)
+    elif sender is ArtistAlbumRankingEntry:
+        pages = {
+            ("artist_stats", artist_id)
+            for artist_id in ArtistAlbumRankingEntry.objects.filter(
+                pk__in=ids
+            ).values_list("ranking__artist_id", flat=True)
+        }
+    elif sender is ObsessionSongs:
+        entries = ObsessionSongs.objects.filter(pk__in=ids)
+        pages = {
+            ("obsessions", year)
+            for year in entries.values_list("obsession_list__year", flat=True)
+        } | {
+            ("artist_stats", artist_id)
+            for artist_id in _song_artist_ids(
+                *entries.values_list("song_id", flat=True)
+            )
+        }
+    else:
+        pages = {
+            ("spotify_top_100", year)
+            for year in SpotifyTop100Songs.objects.filter(pk__in=ids).values_list(
+                "top_100_list__year", flat=True
+            )
+        }
+    _invalidate_pages(pages)
+
+
+# Artist credits and the search index, which reads the credits
+
+
+@receiver(pre_save, sender=Song)
+def set_full_display(sender, instance, **kwargs):
+    instance.full_display = instance.format_full_info(
+        instance.album.title if instance.album else None
+    )
+
+
+@receiver([post_save, post_delete], sender=Album)
+@receiver([post_save, post_delete], sender=Song)
+def index_object(sender, instance, **kwargs):
+    search.index(sender, [instance.pk])
+
+
+@receiver(post_save, sender=Album)
+def refresh_album_song_credits(sender, instance, **kwargs):
+    # Songs show their album's title
+    credits.refresh(Song, Song.objects.filter(album_id=instance.pk).values("id"))
+
+
+@receiver(pre_delete, sender=Album)
+def remember_album_songs(sender, instance, **kwargs):
+    instance._song_ids = list(instance.song_set.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Album)
+def refresh_orphaned_song_credits(sender, instance, **kwargs):
+    credits.refresh(Song, getattr(instance, "_song_ids", []))
+
+
+@receiver(post_save, sender=Artist)
+def refresh_artist_credits(sender, instance, **kwargs):
+    credits.refresh_artists([instance.pk])
+    search.index(Artist, [instance.pk])
+    search.index_credits([instance.pk])
+
+
+@receiver(pre_delete, sender=Artist)
+def remember_credited_objects(sender, instance, **kwargs):
+    # The credits are deleted in the cascade, without m2m_changed
+    instance._credited = {
+        model: list(model.objects.filter(artists=instance).values_list("id", flat=True))
+        for model in (Album, Song)
+    }
+
+
+@receiver(post_delete, sender=Artist)
+def refresh_deleted_artist_credits(sender, instance, **kwargs):
+    search.index(Artist, [instance.pk])
+    for model, ids in getattr(instance, "_credited", {}).items():
+        credits.refresh(model, ids)
+        search.index(model, ids)
+
+
+@receiver(m2m_changed, sender=Album.artists.through)
+@receiver(m2m_changed, sender=Song.artists.through)
+def refresh_credited_objects(
+    sender, instance, action, reverse, pk_set, model, **kwargs
+):
+    if action == "pre_clear":
+        instance._cleared_ids = (
+            list(model.objects.filter(artists=instance).values_list("id", flat=True))
+            if reverse
+            else [instance.pk]
+        )
+        return
+    if action == "post_clear":
+        credited_model = model if reverse else type(instance)
+        ids = getattr(instance, "_cleared_ids", [])
+    elif action in ("post_add", "post_remove"):
+        credited_model, ids = (
+            (model, pk_set) if reverse else (type(instance), [instance.pk])
+        )
+    else:
+        return
+
+    credits.refresh(credited_model, ids)
+    search.index(credited_model, ids)
+
+
+# Snapshot
+
+
+@receiver([post_save, post_delete, m2m_changed])
+def refresh_snapshot(sender, **kwargs):
+    if sender._meta.app_label == "tracker":
+        snapshot.schedule_refresh()
+
+
+@receiver(reordering.reordered)
+def refresh_reordered_snapshot(sender, **kwargs):
+    snapshot.schedule_refresh()
+
+
+@receiver(post_migrate)
+def refresh_migrated_snapshot(sender, using, **kwargs):
+    # The snapshot has to have the new schema before the new code reads it
+    if sender.name == "music_tracker.tracker" and using == DEFAULT_DB_ALIAS:
+        snapshot.refresh()
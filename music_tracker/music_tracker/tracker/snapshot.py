@@ -0,0 +1,178 @@
+"""A read-only snapshot of the primary database for public pages.
+
+Views wrapped in `reads_snapshot` read from the "snapshot" database, a copy of the
+primary taken with SQLite's online backup API and swapped into place atomically
+after every committed write. It's opened immutable, so readers take no locks and
+never wait on the admin.
+"""
+
+import fcntl
+import os
+import sqlite3
+import tempfile
+import threading
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+SNAPSHOT_ALIAS = "snapshot"
+
+reading: ContextVar[bool] = ContextVar("reading", default=False)
+
+# The primary the snapshot is taken from. Tests and benchmarks swap in databases of
+# their own that the snapshot doesn't reflect, so reads stay on the primary then.
+PRIMARY_NAME = str(settings.DATABASES[DEFAULT_DB_ALIAS]["NAME"])
+
+_local = threading.local()
+
+
+def is_enabled():
+    return (
+        SNAPSHOT_ALIAS in settings.DATABASES
+        and str(connections[DEFAULT_DB_ALIAS].settings_dict["NAME"]) == PRIMARY_NAME
+    )
+
+
+def _use_snapshot():
+    """Whether the snapshot can serve reads, reopening it if it's been replaced"""
+    if not is_enabled():
+        return False
+    try:
+        stat = os.stat(settings.SNAPSHOT_DATABASE_PATH)
+    except FileNotFoundError:
+        return False
+
+    # An immutable database is never checked for changes, so a connection would go
+    # on reading the file it opened
+    identity = (stat.st_ino, stat.st_mtime_ns)
+    connection = connections[SNAPSHOT_ALIAS]
+    if getattr(connection, "snapshot_identity", None) != identity:
+        connection.close()
+        connection.snapshot_identity = identity
+    return True
+
+
+def reads_snapshot(view):
+    """Route the view's reads to the snapshot, when there is one"""
+    if iscoroutinefunction(view):
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if not await sync_to_async(_use_snapshot)():
+                return await view(request, *args, **kwargs)
+
+            # The ORM's sync_to_async calls copy the context, so they see this too
+            token = reading.set(True)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                reading.reset(token)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _use_snapshot():
+            return view(request, *args, **kwargs)
+
+        token = reading.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            reading.reset(token)
+
+    return wrapper
+
+
+def write_snapshot(path, source=None):
+    """Copy `source`, a sqlite3 connection that defaults to the primary's, to
+    `path`, replacing whatever is there in one step"""
+    if source is None:
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        source = primary.connection
+
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        destination = sqlite3.connect(temp_path)
+        try:
+            source.backup(destination)
+            # Immutable readers can't use a WAL
+            destination.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            destination.close()
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def refresh():
+    """Bring the snapshot up to date, then run anything waiting on it"""
+    if not is_enabled():
+        return
+
+    path = settings.SNAPSHOT_DATABASE_PATH
+    _local.refreshing = True
+    try:
+        # Serialize refreshes across workers, so an older copy can never replace a
+        # newer one
+        with open(f"{path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            write_snapshot(path)
+
+        callbacks = getattr(_local, "after_refresh", [])
+        _local.after_refresh = []
+        for callback in callbacks:
+            callback()
+    finally:
+        _local.refreshing = False
+
+
+def schedule_refresh():
+    """Refresh the snapshot once the current transaction commits"""
+    if not is_enabled():
+        return
+    pending = connections[DEFAULT_DB_ALIAS].run_on_commit
+    if not any(func is refresh for _, func, _ in pending):
+        transaction.on_commit(refresh, robust=True)
+
+
+def after_refresh(callback):
+    """Run `callback` again once the snapshot has caught up with the current
+    transaction, for cache invalidations that pages rendered from the old
+    snapshot would otherwise undo"""
+    if is_enabled() and not getattr(_local, "refreshing", False):
+        _local.after_refresh = [*getattr(_local, "after_refresh", []), callback]
+        schedule_refresh()
+
+
+class SnapshotRouter:
+    """Sends the tracker's reads inside `reads_snapshot` views to the snapshot and
+    everything else, including every write, to the primary"""
+
+    def db_for_read(self, model, **hints):
+        # Sessions and users change between refreshes, so they stay on the primary
+        if reading.get() and model._meta.app_label == "tracker":
+            return SNAPSHOT_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The snapshot is a copy of the primary, so their rows can be related
+        databases = {DEFAULT_DB_ALIAS, SNAPSHOT_ALIAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        return False if db == SNAPSHOT_ALIAS else None
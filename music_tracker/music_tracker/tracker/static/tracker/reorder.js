@@ -0,0 +1,27 @@
+// Drag and drop for the admin's reorder page. The hidden inputs move with their
+// entries, so the form posts the ids in the new order.
+document.addEventListener("DOMContentLoaded", () => {
+  const list = document.querySelector(".reorder-entries");
+  if (!list) {
+    return;
+  }
+  let dragged = null;
+
+  list.addEventListener("dragstart", (event) => {
+    dragged = event.target.closest("li");
+    event.dataTransfer.effectAllowed = "move";
+  });
+  list.addEventListener("dragover", (event) => {
+    const target = event.target.closest("li");
+    if (!dragged || !target || target === dragged) {
+      return;
+    }
+    event.preventDefault();
+    const { top, height } = target.getBoundingClientRect();
+    const after = event.clientY > top + height / 2;
+    list.insertBefore(dragged, after ? target.nextSibling : target);
+  });
+  list.addEventListener("dragend", () => {
+    dragged = null;
+  });
+});
@@ -0,0 +1,190 @@
+from django.db import transaction
+from django.db.models import Count
+
+from music_tracker.tracker import caching
+from music_tracker.tracker.models import (
+    ObsessionArtistStat,
+    ObsessionArtistSummary,
+    ObsessionSongs,
+    SpotifyTop100ArtistStat,
+    SpotifyTop100Songs,
+)
+
+
+def _obsession_stats(entries):
+    by_list = entries.values(
+        "song__artists",
+        "obsession_list",
+        "obsession_list__year",
+        "obsession_list__published",
+    ).annotate(songs=Count("song", distinct=True))
+
+    return [
+        ObsessionArtistStat(
+            artist_id=row["song__artists"],
+            obsession_list_id=row["obsession_list"],
+            year=row["obsession_list__year"],
+            published=row["obsession_list__published"],
+            song_count=row["songs"],
+        )
+        for row in by_list
+    ]
+
+
+def _obsession_summaries(entries):
+    by_artist = (
+        entries.filter(obsession_list__published=True)
+        .values("song__artists")
+        .annotate(
+            songs=Count("song", distinct=True),
+            lists=Count("obsession_list", distinct=True),
+        )
+    )
+
+    return [
+        ObsessionArtistSummary(
+            artist_id=row["song__artists"],
+            song_count=row["songs"],
+            list_count=row["lists"],
+        )
+        for row in by_artist
+    ]
+
+
+def _spotify_top_100_stats(entries):
+    by_list = entries.values(
+        "song__artists",
+        "top_100_list",
+        "top_100_list__year",
+        "top_100_list__published",
+    ).annotate(songs=Count("song", distinct=True))
+
+    return [
+        SpotifyTop100ArtistStat(
+            artist_id=row["song__artists"],
+            top_100_list_id=row["top_100_list"],
+            year=row["top_100_list__year"],
+            published=row["top_100_list__published"],
+            song_count=row["songs"],
+        )
+        for row in by_list
+    ]
+
+
+def refresh_artist_stats(artist_ids):
+    """Recompute every stats row for the given artists.
+
+    Changes to an entry, a song's credits or a list only ever touch the stats of the
+    artists involved, so recomputing just those artists keeps the tables current
+    without rescanning every list.
+    """
+    artist_ids = {artist_id for artist_id in artist_ids if artist_id is not None}
+    if not artist_ids:
+        return
+
+    obsessions = ObsessionSongs.objects.filter(song__artists__in=artist_ids)
+    spotify_songs = SpotifyTop100Songs.objects.filter(song__artists__in=artist_ids)
+
+    with transaction.atomic():
+        ObsessionArtistStat.objects.filter(artist_id__in=artist_ids).delete()
+        ObsessionArtistSummary.objects.filter(artist_id__in=artist_ids).delete()
+        SpotifyTop100ArtistStat.objects.filter(artist_id__in=artist_ids).delete()
+
+        ObsessionArtistStat.objects.bulk_create(_obsession_stats(obsessions))
+        ObsessionArtistSummary.objects.bulk_create(_obsession_summaries(obsessions))
+        SpotifyTop100ArtistStat.objects.bulk_create(
+            _spotify_top_100_stats(spotify_songs)
+        )
+
+    caching.bump_stats_version()
+
+
+def rebuild_stats():
+    """Recompute every stats table from scratch"""
+    obsessions = ObsessionSongs.objects.filter(song__artists__isnull=False)
+    spotify_songs = SpotifyTop100Songs.objects.filter(song__artists__isnull=False)
+
+    with transaction.atomic():
+        ObsessionArtistStat.objects.all().delete()
+        ObsessionArtistSummary.objects.all().delete()
+        SpotifyTop100ArtistStat.objects.all().delete()
+
+        ObsessionArtistStat.objects.bulk_create(_obsession_stats(obsessions))
+        ObsessionArtistSummary.objects.bulk_create(_obsession_summaries(obsessions))
+        SpotifyTop100ArtistStat.objects.bulk_create(
+            _spotify_top_100_stats(spotify_songs)
+        )
+
+    caching.bump_stats_version()
+
+
+def spotify_top_100_stats(years):
+    """Build the per-year tables and years clubs for the Spotify Top 100 stats page.
+
+    `years` are the published list years in order. Every count comes from a single
+    flat fetch of the stats table, aggregated in one pass.
+    """
+    counts_by_year = {year: {} for year in years}
+    years_by_artist = {}  # artist id -> [name, number of years]
+
+    rows = SpotifyTop100ArtistStat.objects.filter(published=True).values_list(
+        "year", "artist_id", "artist__name", "song_count"
+    )
+    for year, artist_id, name, song_count in rows:
+        counts_by_year.setdefault(year, {})[artist_id] = (name, song_count)
+        years_by_artist.setdefault(artist_id, [name, 0])[1] += 1
+
+    years_data = []
+    previous_counts = {}
+    for index, year in enumerate(years):
+        artist_counts = counts_by_year[year]
+
+        artists = []
+        for artist_id, (name, song_count) in artist_counts.items():
+            artist_entry = {
+                "name": name,
+                "id": artist_id,
+                "current_count": song_count,
+                "previous_count": previous_counts.get(artist_id, (name, 0))[1],
+            }
+
+            # Change is only meaningful after the first year
+            if index:
+                artist_entry["change"] = (
+                    artist_entry["current_count"] - artist_entry["previous_count"]
+                )
+
+            artists.append(artist_entry)
+
+        artists.sort(key=lambda x: (-x["current_count"], x["name"]))
+
+        years_data.append(
+            {
+                "year": year,
+                "is_first_year": index == 0,
+                "artists": artists,
+                "total_artists": len(artist_counts),
+            }
+        )
+        previous_counts = artist_counts
+
+    # Artists on 2+ lists, grouped by how many lists they're on
+    years_groups = {}
+    for artist_id, (name, num_years) in years_by_artist.items():
+        if num_years >= 2:
+            years_groups.setdefault(num_years, []).append(
+                {"name": name, "id": artist_id}
+            )
+
+    return {
+        "years_data": years_data,
+        "years_groups": [
+            {
+                "num_years": num_years,
+                "artists": sorted(
+                    years_groups.get(num_years, []), key=lambda x: x["name"]
+                ),
+            }
+            for num_years in range(2, len(years) + 1)
+        ],
+    }
@@ -1 +1,1666 @@
-# Create your tests here.
+import json
+import os
+import re
+import sqlite3
+import tempfile
+from io import StringIO
+from pathlib import Path
+from time import monotonic
+from unittest.mock import patch
+from uuid import uuid4
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.paginator import EmptyPage
+from django.core.signals import request_finished
+from django.db import connection
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from music_tracker.tracker import (
+    async_views,
+    caching,
+    importing,
+    listening,
+    metrics,
+    reordering,
+    search,
+    snapshot,
+    stats,
+    urls,
+)
+from music_tracker.tracker.admin import EstimatedCountPaginator
+from music_tracker.tracker.middleware import PerformanceMiddleware
+from music_tracker.tracker.models import (
+    Album,
+    Artist,
+    ArtistAlbumRanking,
+    ArtistAlbumRankingEntry,
+    ObsessionArtistStat,
+    ObsessionArtistSummary,
+    ObsessionList,
+    ObsessionSongs,
+    Song,
+    SongPlayCount,
+    SpotifyTop100ArtistStat,
+    SpotifyTop100List,
+    SpotifyTop100Songs,
+    TopTenAlbumsList,
+)
+
+UNCACHED = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# The most queries each URL may run, however long its lists are
+QUERY_BUDGETS = {
+    "index": 1,
+    "top_ten": 9,
+    "top_ten_decade": 8,
+    "obsessions": 7,
+    "obsessions_stats": 5,
+    "spotify_top_100": 7,
+    "spotify_top_100_stats": 6,
+    "artist_stats": 8,
+    "artist_stats_between": 9,
+    "performance_stats": 2,
+    "search": 8,
+    "api_top_ten_lists": 2,
+    "api_top_ten": 6,
+    "api_obsessions_lists": 2,
+    "api_obsessions": 4,
+    "api_obsessions_stats": 2,
+    "api_spotify_top_100_lists": 2,
+    "api_spotify_top_100": 4,
+    "api_spotify_top_100_stats": 3,
+    "api_artist": 5,
+    "api_artist_ranking": 3,
+}
+
+
+def create_year(year, length, artists):
+    """Publish every kind of list for `year`, each `length` entries long, with
+    albums and songs credited to `artists` in turn"""
+    TopTenAlbumsList.objects.create(title=f"{year} Albums", year=year, published=True)
+    obsession_list = ObsessionList.objects.create(
+        title=f"{year} Obsessions", year=year, published=True
+    )
+    top_100_list = SpotifyTop100List.objects.create(
+        title=f"{year} Top 100", year=year, published=True
+    )
+
+    albums = []
+    for i in range(length):
+        credits = [artists[i % len(artists)], artists[(i + 1) % len(artists)]]
+        album = Album.objects.create(
+            title=f"Album {year} {i}",
+            year=year,
+            listened=True,
+            rank=i + 1 if i < 20 else None,
+        )
+        album.artists.set(credits)
+        song = Song.objects.create(title=f"Song {year} {i}", year=year, album=album)
+        song.artists.set(credits)
+        ObsessionSongs.objects.create(
+            song=song, obsession_list=obsession_list, ordering=i + 1
+        )
+        SpotifyTop100Songs.objects.create(
+            song=song, top_100_list=top_100_list, ordering=i + 1
+        )
+        albums.append(album)
+    return albums
+
+
+# Tables that grow with the catalog, rather than with the number of years
+LARGE_TABLES = {
+    "tracker_album",
+    "tracker_album_artists",
+    "tracker_artist",
+    "tracker_artistalbumrankingentry",
+    "tracker_obsessionsongs",
+    "tracker_song",
+    "tracker_song_artists",
+    "tracker_spotifytop100songs",
+}
+
+PAGES = [
+    "/albums/2023",
+    "/albums/decade/2020s",
+    "/obsessions/2023",
+    "/obsessions/stats",
+    "/top-100/2023",
+    "/top-100-stats/",
+]
+
+
+# The tracker's URLs, with the public pages served by the async views
+urlpatterns = urls.get_public_urlpatterns(async_views)
+
+
+def get_full_scans(sql, params=()):
+    """The large tables `sql` scans in full, according to EXPLAIN QUERY PLAN"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        plan = [row[-1] for row in cursor.fetchall()]
+    # The plan names aliased tables by their alias, as in subqueries' U0 and
+    # joins' T3
+    tables = {
+        alias or table: table
+        for table, alias in re.findall(
+            r'(?:FROM|JOIN) "?(\w+)"?(?: (?:AS )?"?([A-Z]+\d+)\b)?', sql
+        )
+    }
+    return [
+        detail
+        for detail in plan
+        if detail.startswith("SCAN ")
+        and tables.get(detail.split()[1], detail.split()[1]) in LARGE_TABLES
+    ]
+
+
+@override_settings(CACHES=UNCACHED)
+class PublishedListsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.artists = [Artist.objects.create(name=f"Artist {i}") for i in range(4)]
+        cls.short_albums = create_year(2022, 12, cls.artists)
+        cls.long_albums = create_year(2023, 40, cls.artists)
+
+        ranking = ArtistAlbumRanking.objects.create(
+            artist=cls.artists[0], published=True
+        )
+        for rank, album in enumerate(
+            Album.objects.filter(artists=cls.artists[0]), start=1
+        ):
+            ArtistAlbumRankingEntry.objects.create(
+                ranking=ranking, album=album, rank=rank
+            )
+        cls.quiet_artist = Artist.objects.create(name="Quiet Artist")
+        cls.short_albums[0].artists.add(cls.quiet_artist)
+        ArtistAlbumRankingEntry.objects.create(
+            ranking=ArtistAlbumRanking.objects.create(
+                artist=cls.quiet_artist, published=True
+            ),
+            album=cls.short_albums[0],
+            rank=1,
+        )
+
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+
+    def assertNotModified(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Last-Modified", response)
+
+        # Nothing but the version query
+        with self.assertNumQueries(1):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        return response["ETag"]
+
+
+class QueryBudgetTests(PublishedListsTestCase):
+    def get_query_count(self, url, status_code=200):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status_code, url)
+        return queries
+
+    def assertWithinBudget(self, name, url, status_code=200):
+        queries = self.get_query_count(url, status_code)
+        budget = QUERY_BUDGETS[name]
+        if len(queries) > budget:
+            self.fail(
+                f"{url} ran {len(queries)} queries, its budget is {budget}:\n"
+                + "\n".join(
+                    f"{i}. {query['sql']}" for i, query in enumerate(queries, start=1)
+                )
+            )
+        return len(queries)
+
+    def assertFlatBudget(self, name, short_url, long_url):
+        """The same page for a short and a long list must run the same queries"""
+        short_count = self.assertWithinBudget(name, short_url)
+        long_count = self.assertWithinBudget(name, long_url)
+        self.assertEqual(
+            short_count,
+            long_count,
+            f"{long_url} ran {long_count} queries but {short_url} ran {short_count}",
+        )
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names - QUERY_BUDGETS.keys(), set())
+
+    def test_index(self):
+        self.assertWithinBudget("index", "/", status_code=302)
+
+    def test_top_ten(self):
+        self.assertFlatBudget("top_ten", "/albums/2022", "/albums/2023")
+
+    def test_top_ten_decade(self):
+        self.assertWithinBudget("top_ten_decade", "/albums/decade/2020s")
+
+    def test_obsessions(self):
+        self.assertFlatBudget("obsessions", "/obsessions/2022", "/obsessions/2023")
+
+    def test_obsessions_stats(self):
+        self.assertWithinBudget("obsessions_stats", "/obsessions/stats")
+
+    def test_spotify_top_100(self):
+        self.assertFlatBudget("spotify_top_100", "/top-100/2022", "/top-100/2023")
+
+    def test_spotify_top_100_stats(self):
+        self.assertWithinBudget("spotify_top_100_stats", "/top-100-stats/")
+
+    def test_artist_stats(self):
+        self.assertFlatBudget(
+            "artist_stats",
+            f"/artist/{self.quiet_artist.id}",
+            f"/artist/{self.artists[0].id}",
+        )
+
+    def test_artist_stats_between(self):
+        self.assertFlatBudget(
+            "artist_stats_between",
+            f"/artist/{self.quiet_artist.id}/2020-2029",
+            f"/artist/{self.artists[0].id}/2020-2029",
+        )
+
+    def test_performance_stats(self):
+        self.client.force_login(self.staff)
+        self.assertWithinBudget("performance_stats", "/performance/")
+
+    def test_search(self):
+        self.assertWithinBudget("search", "/search?q=Album+2023")
+
+    def test_api(self):
+        for name, url in [
+            ("api_top_ten_lists", "/api/top-ten"),
+            ("api_obsessions_lists", "/api/obsessions"),
+            ("api_obsessions_stats", "/api/obsessions/stats"),
+            ("api_spotify_top_100_lists", "/api/top-100"),
+            ("api_spotify_top_100_stats", "/api/top-100/stats"),
+            ("api_artist", f"/api/artists/{self.artists[0].id}"),
+            ("api_artist_ranking", f"/api/artists/{self.artists[0].id}/ranking"),
+        ]:
+            with self.subTest(url=url):
+                self.assertWithinBudget(name, url)
+        self.assertFlatBudget("api_top_ten", "/api/top-ten/2022", "/api/top-ten/2023")
+        self.assertFlatBudget(
+            "api_obsessions", "/api/obsessions/2022", "/api/obsessions/2023"
+        )
+        self.assertFlatBudget(
+            "api_spotify_top_100", "/api/top-100/2022", "/api/top-100/2023"
+        )
+
+
+class QueryPlanTests(PublishedListsTestCase):
+    def assertNoFullScans(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+
+        for query in queries:
+            scans = get_full_scans(query["sql"])
+            if scans:
+                self.fail(f"{url} scans {', '.join(scans)} in full:\n{query['sql']}")
+
+    def test_pages(self):
+        for url in PAGES:
+            with self.subTest(url=url):
+                self.assertNoFullScans(url)
+
+    def test_artist_stats(self):
+        self.assertNoFullScans(f"/artist/{self.artists[0].id}")
+
+    def test_artist_stats_between(self):
+        self.assertNoFullScans(f"/artist/{self.artists[0].id}/2023-2023")
+
+    def test_aliased_scans(self):
+        albums = Album.objects.filter(
+            pk=self.long_albums[0].pk,
+            id__in=Song.objects.filter(title__contains="2023").values("album_id"),
+        )
+        sql, params = albums.query.sql_with_params()
+        self.assertIn('"tracker_song" U0', sql)
+        self.assertEqual(len(get_full_scans(sql, params)), 1)
+
+
+class YearRangeTests(PublishedListsTestCase):
+    def test_years_are_integers(self):
+        self.assertEqual(Album.objects.filter(year__gte=2023).count(), 40)
+        self.assertEqual(
+            list(
+                TopTenAlbumsList.objects.order_by("year").values_list("year", flat=True)
+            ),
+            [2022, 2023],
+        )
+
+    def test_top_tens_between(self):
+        albums = Album.get_top_tens_between(2020, 2029)
+        self.assertEqual(
+            [(album.year, album.rank) for album in albums],
+            [(2022, rank) for rank in range(1, 11)]
+            + [(2023, rank) for rank in range(1, 11)],
+        )
+        self.assertFalse(Album.get_top_tens_between(2010, 2019).exists())
+
+    def test_decade_page(self):
+        response = self.client.get("/albums/decade/2020s")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Album 2022 0")
+        self.assertContains(response, "Album 2023 9")
+        self.assertNotContains(response, "Album 2023 10")
+
+    def test_decade_without_lists(self):
+        self.assertEqual(self.client.get("/albums/decade/1990s").status_code, 404)
+        self.assertEqual(self.client.get("/albums/decade/1995s").status_code, 404)
+
+    def test_artist_span(self):
+        response = self.client.get(f"/artist/{self.artists[0].id}/2023-2023")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Album 2023 0")
+        self.assertNotContains(response, "Album 2022 0")
+        self.assertEqual(
+            [row["year"] for row in response.context["obsessions"]["lists"]], [2023]
+        )
+        self.assertEqual(response.context["obsessions"]["song_count"], 20)
+
+    def test_backwards_artist_span(self):
+        response = self.client.get(f"/artist/{self.artists[0].id}/2023-2022")
+        self.assertEqual(response.status_code, 404)
+
+
+class AsyncViewTests(PublishedListsTestCase):
+    async def assertSamePages(self, urls):
+        for url in urls:
+            with self.subTest(url=url):
+                expected = await self.async_client.get(url)
+                with self.settings(ROOT_URLCONF=__name__):
+                    response = await self.async_client.get(url)
+                    self.assertTrue(iscoroutinefunction(response.resolver_match.func))
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.content, expected.content)
+
+    async def test_pages(self):
+        await self.assertSamePages(
+            [
+                "/",
+                "/albums/2022",
+                *PAGES,
+                f"/artist/{self.artists[0].id}",
+                f"/artist/{self.quiet_artist.id}",
+                f"/artist/{self.artists[0].id}/2023-2023",
+                "/search?q=Artist+2023",
+            ]
+        )
+
+    async def test_not_found(self):
+        await self.assertSamePages(
+            [
+                "/albums/2010",
+                "/albums/decade/1990s",
+                "/obsessions/2010",
+                "/top-100/2010",
+                f"/artist/{uuid4()}",
+                f"/artist/{self.artists[0].id}/2023-2022",
+            ]
+        )
+
+
+class ApiTests(PublishedListsTestCase):
+    def test_list(self):
+        response = self.client.get("/api/obsessions/2023")
+        self.assertEqual(response.json()["songs"][0]["title"], "Song 2023 0")
+        self.assertEqual(len(response.json()["songs"]), 40)
+
+    def test_not_modified(self):
+        for url in [
+            "/api/top-ten",
+            "/api/top-ten/2023",
+            "/api/obsessions/2023",
+            "/api/obsessions/stats",
+            "/api/top-100/2023",
+            "/api/top-100/stats",
+            f"/api/artists/{self.artists[0].id}",
+            f"/api/artists/{self.artists[0].id}/ranking",
+        ]:
+            with self.subTest(url=url):
+                self.assertNotModified(url)
+
+    def test_song_changes(self):
+        etag = self.assertNotModified("/api/obsessions/2023")
+        song = Song.objects.get(title="Song 2023 0")
+        song.title = "Renamed"
+        song.save()
+        self.assertNotEqual(self.assertNotModified("/api/obsessions/2023"), etag)
+
+        etag = self.assertNotModified("/api/obsessions/2023")
+        song.artists.add(self.quiet_artist)
+        self.assertNotEqual(self.assertNotModified("/api/obsessions/2023"), etag)
+
+    def test_deleted_entry(self):
+        etag = self.assertNotModified("/api/top-100/2023")
+        SpotifyTop100Songs.objects.filter(top_100_list__year=2023).first().delete()
+        self.assertNotEqual(self.assertNotModified("/api/top-100/2023"), etag)
+
+    def test_album_changes(self):
+        top_ten_etag = self.assertNotModified("/api/top-ten/2023")
+        artist_etag = self.assertNotModified(f"/api/artists/{self.artists[0].id}")
+        album = Album.objects.get(title="Album 2023 0")
+        album.title = "Renamed"
+        album.save()
+        self.assertNotEqual(self.assertNotModified("/api/top-ten/2023"), top_ten_etag)
+        self.assertNotEqual(
+            self.assertNotModified(f"/api/artists/{self.artists[0].id}"), artist_etag
+        )
+
+    def test_unpublished(self):
+        ObsessionList.objects.filter(year=2023).update(published=False)
+        self.assertEqual(self.client.get("/api/obsessions/2023").status_code, 404)
+        self.assertEqual(self.client.get("/api/artists/nope").status_code, 404)
+
+
+class ConditionalPageTests(PublishedListsTestCase):
+    def test_not_modified(self):
+        for url in [
+            *PAGES,
+            f"/artist/{self.artists[0].id}",
+            f"/artist/{self.artists[0].id}/2023-2023",
+        ]:
+            with self.subTest(url=url):
+                self.assertNotModified(url)
+
+    def test_cache_control(self):
+        response = self.client.get("/albums/2023")
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn(
+            f"s-maxage={settings.PAGE_SHARED_MAX_AGE}", response["Cache-Control"]
+        )
+
+    def test_changes(self):
+        etag = self.assertNotModified("/obsessions/2022")
+        artist = self.artists[1]
+        artist.name = "Renamed"
+        artist.save()
+        self.assertNotEqual(self.assertNotModified("/obsessions/2022"), etag)
+
+        # Every page shows the navigation
+        etag = self.assertNotModified("/obsessions/stats")
+        TopTenAlbumsList.objects.create(title="2021 Albums", year=2021, published=True)
+        self.assertNotEqual(self.assertNotModified("/obsessions/stats"), etag)
+
+    @override_settings(CACHES=LOCAL_CACHE)
+    def test_cached_page_follows_version(self):
+        cache.clear()
+        etag = self.assertNotModified("/obsessions/2023")
+        # Changed under the cached page, as by a request that raced the change
+        Song.objects.filter(title="Song 2023 0").update(title="Renamed")
+        ObsessionList.objects.filter(year=2023).update(updated_at=timezone.now())
+
+        response = self.client.get("/obsessions/2023")
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertContains(response, "Renamed")
+
+    def test_missing_pages(self):
+        for url in ["/albums/2010", "/albums/decade/1990s", "/artist/nope"]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertNotIn("ETag", response)
+
+    async def test_async_views(self):
+        with self.settings(ROOT_URLCONF=__name__):
+            response = await self.async_client.get("/albums/2023")
+            cached = await self.async_client.get(
+                "/albums/2023", headers={"If-None-Match": response["ETag"]}
+            )
+        self.assertEqual(cached.status_code, 304)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class NavigationCacheTests(PublishedListsTestCase):
+    def setUp(self):
+        cache.clear()
+        # Logged in, so the pages themselves aren't cached
+        self.client.force_login(self.staff)
+
+    def test_skips_list_queries(self):
+        self.client.get("/obsessions/2023")
+        with CaptureQueriesContext(connection) as cached:
+            self.client.get("/obsessions/2023")
+        cache.delete(caching.NAVIGATION_KEY)
+        with CaptureQueriesContext(connection) as uncached:
+            self.client.get("/obsessions/2023")
+        self.assertEqual(len(uncached) - len(cached), 3)
+
+    def assertInvalidated(self, change):
+        self.client.get("/albums/2023")
+        self.assertIsNotNone(cache.get(caching.NAVIGATION_KEY))
+        change()
+        self.assertIsNone(cache.get(caching.NAVIGATION_KEY))
+
+    def test_save(self):
+        self.assertInvalidated(
+            lambda: ObsessionList.objects.create(title="2021 Obsessions", year=2021)
+        )
+
+    def test_publish(self):
+        top_ten_list = TopTenAlbumsList.objects.get(year=2022)
+        top_ten_list.published = False
+        self.assertInvalidated(top_ten_list.save)
+        self.assertNotContains(self.client.get("/albums/2023"), 'href="/albums/2022"')
+
+        top_ten_list.published = True
+        self.assertInvalidated(top_ten_list.save)
+        self.assertContains(self.client.get("/albums/2023"), 'href="/albums/2022"')
+
+    def test_delete(self):
+        self.assertInvalidated(SpotifyTop100List.objects.get(year=2022).delete)
+        self.assertNotContains(self.client.get("/albums/2023"), 'href="/top-100/2022"')
+
+    def test_invalidated_after_commit(self):
+        self.client.get("/albums/2023")
+        with self.captureOnCommitCallbacks(execute=True):
+            TopTenAlbumsList.objects.get(year=2022).delete()
+            # Another request renders the navigation before the change commits
+            cache.set(caching.NAVIGATION_KEY, "stale")
+        self.assertIsNone(cache.get(caching.NAVIGATION_KEY))
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class PageCacheTests(PublishedListsTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidated_after_commit(self):
+        album = self.long_albums[0]
+        self.assertContains(self.client.get("/albums/2023"), "Album 2023 0")
+        with self.captureOnCommitCallbacks(execute=True):
+            album.title = "Renamed"
+            album.save()
+            # Another request renders the page before the change commits, without
+            # the change
+            Album.objects.filter(pk=album.pk).update(title="Album 2023 0")
+            self.assertContains(self.client.get("/albums/2023"), "Album 2023 0")
+            Album.objects.filter(pk=album.pk).update(title="Renamed")
+        self.assertContains(self.client.get("/albums/2023"), "Renamed")
+
+    def get_pages(self):
+        """The cached pages the invalidation tests watch, by (name, arg)"""
+        pages = {
+            ("top_ten_decade", "2020"): "/albums/decade/2020s",
+            **{
+                (name, str(year)): f"{prefix}/{year}"
+                for name, prefix in [
+                    ("top_ten", "/albums"),
+                    ("obsessions", "/obsessions"),
+                    ("spotify_top_100", "/top-100"),
+                ]
+                for year in [2022, 2023]
+            },
+        }
+        for artist in [*self.artists, self.quiet_artist]:
+            pages["artist_stats", str(artist.id)] = f"/artist/{artist.id}"
+        return pages
+
+    def get_dropped_pages(self, change):
+        """The watched pages that are no longer cached after `change`"""
+        pages = self.get_pages()
+        for url in pages.values():
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+        change()
+        generation = cache.get(caching.PAGE_GENERATION_KEY)
+        return {
+            page
+            for page in pages
+            if cache.get(caching._page_key(generation, *page)) is None
+        }
+
+    def artist_pages(self, *indexes):
+        return {("artist_stats", str(self.artists[i].id)) for i in indexes}
+
+    def test_album_save(self):
+        album = self.long_albums[0]
+        album.title = "Renamed"
+        self.assertEqual(
+            self.get_dropped_pages(album.save),
+            {("top_ten", "2023"), ("top_ten_decade", "2020")} | self.artist_pages(0, 1),
+        )
+        self.assertContains(self.client.get("/albums/2023"), "Renamed")
+        self.assertContains(self.client.get(f"/artist/{self.artists[0].id}"), "Renamed")
+
+    def test_album_delete(self):
+        self.assertEqual(
+            self.get_dropped_pages(self.long_albums[1].delete),
+            {("top_ten", "2023"), ("top_ten_decade", "2020")} | self.artist_pages(1, 2),
+        )
+        self.assertNotContains(self.client.get("/albums/2023"), ": Album 2023 1 -")
+
+    def test_song_save(self):
+        song = Song.objects.get(title="Song 2023 2")
+        song.title = "Renamed"
+        self.assertEqual(
+            self.get_dropped_pages(song.save),
+            {("obsessions", "2023"), ("spotify_top_100", "2023")},
+        )
+        self.assertContains(self.client.get("/obsessions/2023"), "Renamed")
+        self.assertContains(self.client.get("/top-100/2023"), "Renamed")
+
+    def test_song_delete(self):
+        self.assertEqual(
+            self.get_dropped_pages(Song.objects.get(title="Song 2022 0").delete),
+            {("obsessions", "2022"), ("spotify_top_100", "2022")}
+            | self.artist_pages(0, 1),
+        )
+        self.assertNotContains(self.client.get("/obsessions/2022"), ">Song 2022 0 -")
+
+    def test_artist_save(self):
+        artist = self.artists[3]
+        artist.name = "Renamed"
+        dropped = self.get_dropped_pages(artist.save)
+        # Every list and album page credits the artist somewhere, no other artist's
+        # page does
+        self.assertEqual(
+            dropped,
+            set(self.get_pages())
+            - self.artist_pages(0, 1, 2)
+            - {("artist_stats", str(self.quiet_artist.id))},
+        )
+        self.assertContains(self.client.get("/obsessions/2022"), "Renamed")
+
+    def test_entry_save(self):
+        entry = ObsessionSongs(
+            obsession_list=ObsessionList.objects.get(year=2022),
+            song=Song.objects.get(title="Song 2023 5"),
+            ordering=13,
+        )
+        self.assertEqual(
+            self.get_dropped_pages(entry.save),
+            {("obsessions", "2022")} | self.artist_pages(1, 2),
+        )
+        self.assertContains(self.client.get("/obsessions/2022"), "Song 2023 5")
+
+    def test_entry_delete(self):
+        entry = SpotifyTop100Songs.objects.get(song__title="Song 2022 3")
+        self.assertEqual(
+            self.get_dropped_pages(entry.delete), {("spotify_top_100", "2022")}
+        )
+        self.assertNotContains(self.client.get("/top-100/2022"), ": Song 2022 3 -")
+
+    def test_list_save(self):
+        # Every page shows the navigation
+        top_100_list = SpotifyTop100List.objects.get(year=2022)
+        top_100_list.published = False
+        self.assertEqual(
+            self.get_dropped_pages(top_100_list.save), set(self.get_pages())
+        )
+        self.assertEqual(self.client.get("/top-100/2022").status_code, 404)
+
+    def test_list_delete(self):
+        self.assertEqual(
+            self.get_dropped_pages(ObsessionList.objects.get(year=2022).delete),
+            set(self.get_pages()),
+        )
+        self.assertEqual(self.client.get("/obsessions/2022").status_code, 404)
+
+    def test_lost_generation(self):
+        self.assertContains(self.client.get("/obsessions/2023"), "Song 2023 0")
+        # Without signals, so only a new generation drops the page
+        Song.objects.filter(title="Song 2023 0").update(title="Renamed")
+        self.assertContains(self.client.get("/obsessions/2023"), "Song 2023 0")
+
+        # As when the cache culls it
+        cache.delete(caching.PAGE_GENERATION_KEY)
+        response = self.client.get("/obsessions/2023")
+        self.assertContains(response, "Renamed")
+        self.assertNotContains(response, "Song 2023 0")
+
+    def test_lost_stats_version(self):
+        years = [2022, 2023]
+        caching.get_spotify_top_100_stats(years, lambda years: "old")
+        self.assertEqual(
+            caching.get_spotify_top_100_stats(years, lambda years: "new"), "old"
+        )
+        cache.delete(caching.STATS_VERSION_KEY)
+        self.assertEqual(
+            caching.get_spotify_top_100_stats(years, lambda years: "new"), "new"
+        )
+
+    def test_stats_version_bumped_after_commit(self):
+        years = [2022, 2023]
+        with self.captureOnCommitCallbacks(execute=True):
+            artist = self.artists[0]
+            artist.name = "Renamed"
+            artist.save()
+            # Another request builds the stats before the change commits
+            caching.get_spotify_top_100_stats(years, lambda years: "old")
+        self.assertEqual(
+            caching.get_spotify_top_100_stats(years, lambda years: "new"), "new"
+        )
+
+
+class ExportStaticTests(PublishedListsTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = Path(directory.name)
+
+    def export(self):
+        stdout = StringIO()
+        call_command("export_static", output=str(self.output), workers=1, stdout=stdout)
+        return stdout.getvalue()
+
+    def get_manifest(self):
+        return json.loads((self.output / "manifest.json").read_text())
+
+    def get_file(self, path):
+        return self.output / path.strip("/") / "index.html"
+
+    def test_manifest(self):
+        self.export()
+        manifest = self.get_manifest()
+        for path in [*PAGES, f"/artist/{self.artists[0].id}"]:
+            with self.subTest(path=path):
+                self.assertEqual(manifest[path], self.client.get(path)["ETag"])
+                self.assertIn(b"<title>", self.get_file(path).read_bytes())
+
+    def test_skips_unchanged_pages(self):
+        self.export()
+        self.assertIn(": 0 written", self.export())
+
+        # Every page shows the navigation, so only changes outside the lists leave
+        # some pages unchanged, like reordering an artist's album ranking
+        for path in self.get_manifest():
+            os.utime(self.get_file(path), (0, 0))
+        ranking = ArtistAlbumRanking.objects.get(artist=self.artists[0])
+        entries = reordering.get_entries(ArtistAlbumRankingEntry, ranking)
+        ids = list(entries.values_list("id", flat=True))
+        reordering.reorder(ArtistAlbumRankingEntry, ranking, ids[::-1])
+        self.assertIn(": 1 written", self.export())
+        rendered = [
+            path for path in self.get_manifest() if self.get_file(path).stat().st_mtime
+        ]
+        self.assertEqual(rendered, [f"/artist/{self.artists[0].id}"])
+
+    def test_removes_unpublished_pages(self):
+        self.export()
+        ObsessionList.objects.filter(year=2022).update(published=False)
+        self.assertIn("1 removed", self.export())
+        self.assertNotIn("/obsessions/2022", self.get_manifest())
+        self.assertFalse(self.get_file("/obsessions/2022").exists())
+        self.assertTrue(self.get_file("/obsessions/2023").exists())
+
+
+class SearchTests(PublishedListsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.band = Artist.objects.create(name="Radiohead")
+        cls.album = Album.objects.create(
+            title="OK Computer", year=2023, listened=True, rank=50
+        )
+        cls.album.artists.set([cls.band, cls.artists[0]])
+
+    def search(self, query, model=Album):
+        return [id for _, id in search.search(query, [model])]
+
+    def test_matches_titles_and_credits(self):
+        self.assertEqual(self.search("radiohead computer"), [self.album.id])
+        self.assertEqual(self.search("ok"), [self.album.id])
+        self.assertEqual(self.search("diohe", Artist), [self.band.id])
+        self.assertEqual(self.search('"computer*" OR'), [])
+
+    def test_follows_changes(self):
+        self.band.name = "On A Friday"
+        self.band.save()
+        self.assertEqual(self.search("radiohead"), [])
+        self.assertEqual(self.search("friday"), [self.album.id])
+
+        self.album.artists.remove(self.band)
+        self.assertEqual(self.search("friday"), [])
+        self.band.album_set.add(self.album)
+        self.assertEqual(self.search("friday"), [self.album.id])
+
+        self.band.delete()
+        self.assertEqual(self.search("friday"), [])
+        self.album.delete()
+        self.assertEqual(self.search("computer"), [])
+
+    def test_rebuild(self):
+        search.rebuild()
+        self.assertEqual(self.search("radiohead computer"), [self.album.id])
+        self.assertEqual(len(self.search("Song 2023", Song)), 40)
+
+    def test_admin(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+        # Every album has two artists credited, and shows up once
+        response = self.client.get("/admin/tracker/album/", {"q": "artist"})
+        self.assertEqual(response.context["cl"].result_count, Album.objects.count())
+
+        response = self.client.get("/admin/tracker/song/", {"q": "2022 11"})
+        self.assertEqual(
+            [str(song) for song in response.context["cl"].result_list],
+            [str(Song.objects.get(title="Song 2022 11"))],
+        )
+
+    def test_page(self):
+        Album.objects.create(title="OK Computer OKNOTOK", year=2023)
+        response = self.client.get("/search", {"q": "computer"})
+        self.assertEqual(
+            [album["title"] for album in response.context["albums"]], ["OK Computer"]
+        )
+        self.assertContains(self.client.get("/search", {"q": "Radiohead"}), "/artist/")
+
+
+class ArtistCreditTests(PublishedListsTestCase):
+    def get_song(self):
+        return Song.objects.get(title="Song 2023 0")
+
+    def test_stored_credits(self):
+        song = self.get_song()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                str(song), "Song 2023 0 - Artist 0, Artist 1 (Album 2023 0)"
+            )
+            self.assertEqual(song.display_artists(), "Artist 0, Artist 1")
+
+    def test_follows_changes(self):
+        artist = self.artists[1]
+        artist.name = "Renamed"
+        artist.save()
+        self.assertEqual(
+            str(self.get_song()), "Song 2023 0 - Artist 0, Renamed (Album 2023 0)"
+        )
+        self.assertEqual(
+            Album.objects.get(title="Album 2023 0").display_artists(),
+            "Artist 0, Renamed",
+        )
+
+        album = Album.objects.get(title="Album 2023 0")
+        album.title = "Retitled"
+        album.save()
+        self.assertEqual(
+            str(self.get_song()), "Song 2023 0 - Artist 0, Renamed (Retitled)"
+        )
+
+        self.artists[0].song_set.remove(self.get_song())
+        self.assertEqual(str(self.get_song()), "Song 2023 0 - Renamed (Retitled)")
+
+        artist.delete()
+        album.delete()
+        self.assertEqual(str(self.get_song()), "Song 2023 0 - ")
+
+    def test_backfill(self):
+        Song.objects.update(artist_credit="", full_display="")
+        Album.objects.update(artist_credit="")
+        call_command("backfill_artist_credits", stdout=StringIO())
+        self.assertEqual(
+            str(self.get_song()), "Song 2023 0 - Artist 0, Artist 1 (Album 2023 0)"
+        )
+        self.assertIn(
+            (Song, self.get_song().id), search.search("2023 Artist 0, Artist 1", [Song])
+        )
+
+
+class StatsTests(PublishedListsTestCase):
+    def get_stats(self):
+        return (
+            set(
+                ObsessionArtistStat.objects.values_list(
+                    "artist", "obsession_list", "year", "published", "song_count"
+                )
+            ),
+            set(
+                ObsessionArtistSummary.objects.values_list(
+                    "artist", "song_count", "list_count"
+                )
+            ),
+            set(
+                SpotifyTop100ArtistStat.objects.values_list(
+                    "artist", "top_100_list", "year", "published", "song_count"
+                )
+            ),
+        )
+
+    def assertStatsCurrent(self):
+        """The incrementally maintained stats match a rebuild from scratch"""
+        maintained = self.get_stats()
+        stats.rebuild_stats()
+        self.assertEqual(maintained, self.get_stats())
+
+    def get_song(self, title="Song 2023 0"):
+        return Song.objects.get(title=title)
+
+    def test_entries(self):
+        song = Song.objects.create(title="Quiet Song", year=2023)
+        song.artists.set([self.quiet_artist])
+        other_song = Song.objects.create(title="Other Song", year=2023)
+        other_song.artists.set([self.artists[2]])
+        self.assertStatsCurrent()
+
+        entries = [
+            ObsessionSongs.objects.create(
+                song=song,
+                obsession_list=ObsessionList.objects.get(year=2023),
+                ordering=100,
+            ),
+            SpotifyTop100Songs.objects.create(
+                song=song,
+                top_100_list=SpotifyTop100List.objects.get(year=2022),
+                ordering=100,
+            ),
+        ]
+        self.assertStatsCurrent()
+
+        for entry in entries:
+            with self.subTest(entry=entry):
+                # Moving an entry to another song counts for both songs' artists
+                entry.song = other_song
+                entry.save()
+                self.assertStatsCurrent()
+
+                entry.delete()
+                self.assertStatsCurrent()
+
+    def test_credits(self):
+        song = self.get_song()
+        song.artists.add(self.quiet_artist)
+        self.assertStatsCurrent()
+        song.artists.remove(self.artists[0])
+        self.assertStatsCurrent()
+        song.artists.clear()
+        self.assertStatsCurrent()
+
+        self.quiet_artist.song_set.add(song, self.get_song("Song 2022 1"))
+        self.assertStatsCurrent()
+        self.quiet_artist.song_set.remove(song)
+        self.assertStatsCurrent()
+        self.artists[1].song_set.clear()
+        self.assertStatsCurrent()
+
+    def test_publishing(self):
+        for model in [ObsessionList, SpotifyTop100List]:
+            list_record = model.objects.get(year=2022)
+            for published in [False, True]:
+                with self.subTest(model=model, published=published):
+                    list_record.published = published
+                    list_record.save()
+                    self.assertStatsCurrent()
+
+    def test_year_change(self):
+        for model in [ObsessionList, SpotifyTop100List]:
+            with self.subTest(model=model):
+                list_record = model.objects.get(year=2022)
+                list_record.year = 2021
+                list_record.save()
+                self.assertStatsCurrent()
+
+    def test_deletes(self):
+        self.get_song().delete()
+        self.assertStatsCurrent()
+        self.artists[2].delete()
+        self.assertStatsCurrent()
+        ObsessionList.objects.get(year=2022).delete()
+        self.assertStatsCurrent()
+        SpotifyTop100List.objects.get(year=2023).delete()
+        self.assertStatsCurrent()
+
+
+class AdminChangeListTests(PublishedListsTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+
+    def get_query_count(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_flat_query_counts(self):
+        obsession_lists = {
+            list_record.year: list_record.id
+            for list_record in ObsessionList.objects.all()
+        }
+        top_100_lists = {
+            list_record.year: list_record.id
+            for list_record in SpotifyTop100List.objects.all()
+        }
+        for url, short_query, long_query in [
+            ("/admin/tracker/album/", "year=2022", "year=2023"),
+            ("/admin/tracker/song/", "q=2022", "q=2023"),
+            (
+                "/admin/tracker/obsessionsongs/",
+                f"obsession_list__id__exact={obsession_lists[2022]}",
+                f"obsession_list__id__exact={obsession_lists[2023]}",
+            ),
+            (
+                "/admin/tracker/spotifytop100songs/",
+                f"top_100_list__id__exact={top_100_lists[2022]}",
+                f"top_100_list__id__exact={top_100_lists[2023]}",
+            ),
+            (
+                "/admin/tracker/artistalbumrankingentry/",
+                f"ranking__artist__id__exact={self.quiet_artist.id}",
+                f"ranking__artist__id__exact={self.artists[0].id}",
+            ),
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.get_query_count(f"{url}?{short_query}"),
+                    self.get_query_count(f"{url}?{long_query}"),
+                )
+
+    def test_ranking_album_pickers(self):
+        rankings = {
+            ranking.artist_id: ranking for ranking in ArtistAlbumRanking.objects.all()
+        }
+        short_url = f"/admin/tracker/artistalbumranking/{rankings[self.quiet_artist.id].id}/change/"
+        long_url = f"/admin/tracker/artistalbumranking/{rankings[self.artists[0].id].id}/change/"
+        response = self.client.get(long_url)
+        self.assertEqual(
+            self.get_query_count(short_url), self.get_query_count(long_url)
+        )
+
+        # Only the entries' albums are rendered, and the pickers search the artist's
+        self.assertNotContains(response, "Album 2023 2<")
+        albums_url = f"/admin/tracker/artistalbumranking/{rankings[self.artists[0].id].id}/albums/"
+        self.assertContains(response, albums_url)
+
+        results = self.client.get(albums_url, {"term": "2022"}).json()
+        self.assertEqual(
+            {result["text"] for result in results["results"]},
+            set(
+                Album.objects.filter(artists=self.artists[0], year=2022).values_list(
+                    "title", flat=True
+                )
+            ),
+        )
+        self.assertFalse(results["pagination"]["more"])
+        self.assertTrue(self.client.get(albums_url).json()["pagination"]["more"])
+
+    @override_settings(CACHES=LOCAL_CACHE)
+    def test_cached_filters(self):
+        self.client.get("/admin/tracker/album/")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/admin/tracker/album/")
+        self.assertEqual([query for query in queries if "DISTINCT" in query["sql"]], [])
+
+        Album.objects.create(title="New", year=2019)
+        response = self.client.get("/admin/tracker/album/")
+        decades = [
+            choice["display"]
+            for spec in response.context["cl"].filter_specs
+            if spec.title == "decade"
+            for choice in spec.choices(response.context["cl"])
+        ]
+        self.assertIn("2010s", decades)
+
+    def test_estimated_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            cursor.execute(
+                "UPDATE sqlite_stat1 SET stat = '50000 1' WHERE tbl = 'tracker_song'"
+            )
+        songs = Song.objects.order_by("title")
+        self.assertEqual(EstimatedCountPaginator(songs, 100).count, 50000)
+
+        # The estimate is stale, so the page that finds the end corrects it
+        paginator = EstimatedCountPaginator(songs, 10)
+        page = paginator.page(6)
+        self.assertEqual(len(page.object_list), 2)
+        self.assertFalse(page.has_next())
+        self.assertEqual((paginator.count, paginator.num_pages), (52, 6))
+
+        paginator = EstimatedCountPaginator(songs, 10)
+        with self.assertRaises(EmptyPage):
+            paginator.page(100)
+        self.assertEqual((paginator.count, paginator.num_pages), (52, 6))
+
+        response = self.client.get("/admin/tracker/song/")
+        self.assertEqual(response.context["cl"].paginator.num_pages, 1)
+        self.assertEqual(
+            EstimatedCountPaginator(songs.filter(year=2022), 100).count, 12
+        )
+        self.assertEqual(
+            EstimatedCountPaginator(Album.objects.order_by("title"), 100).count,
+            Album.objects.count(),
+        )
+
+
+class ReorderingTests(PublishedListsTestCase):
+    def reverse_list(self, year):
+        top_100_list = SpotifyTop100List.objects.get(year=year)
+        entries = reordering.get_entries(SpotifyTop100Songs, top_100_list)
+        ids = list(entries.values_list("id", flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            reordering.reorder(SpotifyTop100Songs, top_100_list, reversed(ids))
+        self.assertEqual(list(entries.values_list("id", flat=True)), ids[::-1])
+        self.assertEqual(
+            list(entries.values_list("ordering", flat=True)),
+            list(range(1, len(ids) + 1)),
+        )
+        return len(queries)
+
+    def test_reorder(self):
+        self.assertEqual(self.reverse_list(2022), self.reverse_list(2023))
+
+        # Swapping two albums only moves those two
+        first, second = Album.get_top_ten(2023)[:2]
+        ids = [album.id for album in Album.get_ranked_albums(2023).order_by("rank")]
+        ids[:2] = [second.id, first.id]
+        self.assertEqual(reordering.reorder(Album, 2023, ids), 2)
+        self.assertEqual(list(Album.get_top_ten(2023)[:2]), [second, first])
+
+    def get_ranks(self, year):
+        return list(
+            Album.get_ranked_albums(year).order_by("rank").values_list("id", "rank")
+        )
+
+    def test_reorder_partial_top_ten(self):
+        albums = self.short_albums[:5]
+        for rank, album in zip([1, 2, 3, 11, 12], albums):
+            album.rank = rank
+        Album.objects.filter(year=2022).update(rank=None)
+        Album.objects.bulk_update(albums, ["rank"])
+        before = self.get_ranks(2022)
+
+        # The unchanged order changes nothing
+        self.assertEqual(reordering.reorder(Album, 2022, [pk for pk, _ in before]), 0)
+        self.assertEqual(self.get_ranks(2022), before)
+
+        # An honorable mention moved to the top takes the first rank, and the
+        # others keep the ranks after 10
+        ids = [albums[3].id, *[album.id for album in albums[:3]], albums[4].id]
+        reordering.reorder(Album, 2022, ids)
+        self.assertEqual(self.get_ranks(2022), list(zip(ids, [1, 2, 3, 11, 12])))
+
+    def test_reorder_rejects_partial_orders(self):
+        ranking = ArtistAlbumRanking.objects.get(artist=self.artists[0])
+        entries = reordering.get_entries(ArtistAlbumRankingEntry, ranking)
+        ids = list(entries.values_list("id", flat=True))
+        for order in [ids[1:], ids + ids[:1], [*ids[1:], uuid4()]]:
+            with self.subTest(order=order), self.assertRaises(ValidationError):
+                reordering.reorder(ArtistAlbumRankingEntry, ranking, order)
+        self.assertEqual(list(entries.values_list("id", flat=True)), ids)
+
+    def test_insert(self):
+        query_counts = []
+        for year in (2022, 2023):
+            obsession_list = ObsessionList.objects.get(year=year)
+            song = Song.objects.create(title=f"Inserted {year}", year=year)
+            with CaptureQueriesContext(connection) as queries:
+                reordering.insert(
+                    ObsessionSongs(song=song, obsession_list=obsession_list), 5
+                )
+            query_counts.append(len(queries))
+
+            entries = reordering.get_entries(ObsessionSongs, obsession_list)
+            self.assertEqual(entries[4].song, song)
+            self.assertEqual(
+                list(entries.values_list("ordering", flat=True)),
+                list(range(1, entries.count() + 1)),
+            )
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    @override_settings(CACHES=LOCAL_CACHE)
+    def test_admin_reorder(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+        top_100_list = SpotifyTop100List.objects.get(year=2023)
+        url = f"/admin/tracker/spotifytop100list/{top_100_list.id}/reorder/"
+        self.assertContains(
+            self.client.get(
+                f"/admin/tracker/spotifytop100list/{top_100_list.id}/change/"
+            ),
+            url,
+        )
+        self.assertContains(
+            self.client.get(url), str(Song.objects.get(title="Song 2023 39"))
+        )
+
+        self.assertContains(self.client.get("/top-100/2023"), "Song 2023 0")
+        ids = list(top_100_list.get_songs().values_list("id", flat=True))
+        response = self.client.post(url, {"order": [ids[-1], *ids[:-1]]})
+        self.assertRedirects(response, url)
+        self.assertEqual(top_100_list.get_songs().first().song.title, "Song 2023 39")
+
+        # The cached page is dropped
+        response = self.client.get("/top-100/2023")
+        self.assertLess(
+            response.content.index(b"Song 2023 39"),
+            response.content.index(b"Song 2023 0"),
+        )
+
+        # A stale order is refused rather than half applied
+        response = self.client.post(url, {"order": ids[1:]}, follow=True)
+        self.assertContains(response, "exactly once")
+        self.assertEqual(top_100_list.get_songs().first().song.title, "Song 2023 39")
+
+
+class ImportTests(PublishedListsTestCase):
+    CSV = (
+        "title,artists,album,position\n"
+        "song 2023 0 ,artist 0; ARTIST 1,,2\n"
+        '"Brand New","New Artist;Artist 2","New Album",1\n'
+    )
+
+    def import_csv(self, text, kind="spotify_top_100", **kwargs):
+        return importing.import_list(
+            importing.read_rows(StringIO(text), "csv"), kind, **kwargs
+        )
+
+    def test_import(self):
+        self.assertEqual(self.import_csv(self.CSV, year=2024), {2024: 2})
+
+        top_100_list = SpotifyTop100List.objects.get(year=2024)
+        self.assertFalse(top_100_list.published)
+        self.assertEqual(
+            [entry.song for entry in top_100_list.get_songs()],
+            [
+                Song.objects.get(title="Brand New"),
+                Song.objects.get(title="Song 2023 0"),
+            ],
+        )
+        song = Song.objects.get(title="Brand New")
+        self.assertEqual(
+            song.full_display, "Brand New - Artist 2, New Artist (New Album)"
+        )
+        self.assertEqual(song.album.artist_credit, "Artist 2, New Artist")
+        self.assertEqual(
+            set(song.artists.values_list("name", flat=True)), {"Artist 2", "New Artist"}
+        )
+        self.assertEqual(Artist.objects.filter(name__iexact="new artist").count(), 1)
+        self.assertIn((Song, song.id), search.search("brand new"))
+        self.assertTrue(
+            SpotifyTop100ArtistStat.objects.filter(
+                artist__name="New Artist", year=2024
+            ).exists()
+        )
+
+    def test_import_json(self):
+        rows = [
+            {"title": f"Streamed {i}", "artists": ["Artist 3"], "year": 2020 + i % 2}
+            for i in range(30)
+        ]
+        for text in [json.dumps(rows), "\n".join(map(json.dumps, rows))]:
+            ObsessionList.objects.filter(year__in=[2020, 2021]).delete()
+            with self.subTest(text=text[:20]), patch.object(importing, "_READ_SIZE", 7):
+                counts = importing.import_list(
+                    importing.read_rows(StringIO(text), "json"), "obsessions"
+                )
+                self.assertEqual(counts, {2020: 15, 2021: 15})
+                self.assertEqual(
+                    ObsessionList.objects.get(year=2021).get_songs().first().song.title,
+                    "Streamed 1",
+                )
+                self.assertEqual(
+                    ObsessionArtistStat.objects.get(
+                        artist=self.artists[3], year=2020
+                    ).song_count,
+                    15,
+                )
+        self.assertEqual(Song.objects.filter(title__startswith="Streamed").count(), 30)
+
+    def test_import_is_flat(self):
+        query_counts = []
+        for year, length in [(2024, 5), (2025, 50)]:
+            text = "title,artists\n" + "".join(
+                f"Flat {year} {i},Flat Artist {year} {i}\n" for i in range(length)
+            )
+            with CaptureQueriesContext(connection) as queries:
+                self.import_csv(text, year=year)
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_import_refuses_bad_files(self):
+        for text, message in [
+            (self.CSV, "Already imported: 2023"),
+            ("title,position\nA,1\nB,1\n", "already has a song at 1"),
+            ("title,position\nA,1\nA,2\n", "on the 2023 list twice"),
+            ("title,position\nA,first\n", "not a position"),
+            ("title,year\nA,1066\n", "not a valid year"),
+        ]:
+            with (
+                self.subTest(text=text),
+                self.assertRaisesMessage(ValidationError, message),
+            ):
+                self.import_csv(text, year=2023)
+        self.assertEqual(
+            SpotifyTop100List.objects.get(year=2023).get_songs().count(), 40
+        )
+
+        self.import_csv(self.CSV, year=2023, replace=True)
+        self.assertEqual(
+            SpotifyTop100List.objects.get(year=2023).get_songs().count(), 2
+        )
+
+    def test_admin_import(self):
+        self.client.force_login(User.objects.create_superuser("admin"))
+        self.assertContains(
+            self.client.get("/admin/tracker/obsessionlist/"),
+            "/admin/tracker/obsessionlist/import/",
+        )
+        response = self.client.post(
+            "/admin/tracker/obsessionlist/import/",
+            {"file": SimpleUploadedFile("list.csv", self.CSV.encode()), "year": 2024},
+            follow=True,
+        )
+        self.assertContains(response, "Imported 2 songs for 2024")
+        self.assertEqual(ObsessionList.objects.get(year=2024).get_songs().count(), 2)
+
+        response = self.client.post(
+            "/admin/tracker/obsessionlist/import/",
+            {"file": SimpleUploadedFile("list.csv", self.CSV.encode()), "year": 2024},
+        )
+        self.assertContains(response, "Already imported: 2024")
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "list.json"
+            path.write_text(json.dumps([{"title": "From File", "artists": "Artist 0"}]))
+            call_command(
+                "import_list",
+                str(path),
+                "obsessions",
+                "--year",
+                "2024",
+                stdout=StringIO(),
+            )
+        self.assertEqual(
+            ObsessionList.objects.get(year=2024).get_songs().get().song.artist_credit,
+            "Artist 0",
+        )
+
+
+def extended_event(ts, title, artist, album="", ms_played=200_000):
+    return {
+        "ts": ts,
+        "ms_played": ms_played,
+        "master_metadata_track_name": title,
+        "master_metadata_album_artist_name": artist,
+        "master_metadata_album_album_name": album,
+    }
+
+
+class ListeningHistoryTests(PublishedListsTestCase):
+    def ingest(self, events):
+        return listening.ingest(
+            importing.read_rows(StringIO(json.dumps(events)), "json")
+        )
+
+    def get_play_counts(self, song):
+        return {
+            str(count.date): count.plays
+            for count in SongPlayCount.objects.filter(song=song)
+        }
+
+    def test_ingest(self):
+        song = Song.objects.get(title="Song 2023 0")
+        events = [
+            extended_event("2024-01-01T10:00:00Z", "Song 2023 0", "artist 1"),
+            extended_event("2024-01-01T11:00:00Z", "song 2023 0", "Artist 0"),
+            extended_event("2024-01-02T23:30:00Z", "Song 2023 0", "Artist 1"),
+            extended_event(
+                "2024-01-02T10:00:00Z", "Song 2023 0", "Artist 1", ms_played=5000
+            ),
+            extended_event("2024-01-02T10:00:00Z", None, None),
+            extended_event("2024-01-02T10:00:00Z", "Unknown", "Nobody"),
+        ]
+        report = self.ingest(events)
+        self.assertEqual(
+            {key: report[key] for key in ["events", "skipped", "matched", "song_days"]},
+            {"events": 6, "skipped": 2, "matched": 3, "song_days": 2},
+        )
+        self.assertEqual(report["unmatched"], {("Nobody", "Unknown"): 1})
+        self.assertEqual(self.get_play_counts(song), {"2024-01-01": 2, "2024-01-02": 1})
+
+        # Ingesting it again, or an export that overlaps it, counts each play once
+        self.ingest(events)
+        self.assertEqual(self.get_play_counts(song), {"2024-01-01": 2, "2024-01-02": 1})
+        self.ingest(
+            [
+                extended_event("2024-01-02T23:30:00Z", "Song 2023 0", "Artist 1"),
+                extended_event("2024-01-02T23:45:00Z", "Song 2023 0", "Artist 1"),
+                extended_event("2024-01-03T08:00:00Z", "Song 2023 0", "Artist 1"),
+            ]
+        )
+        self.assertEqual(
+            self.get_play_counts(song),
+            {"2024-01-01": 2, "2024-01-02": 2, "2024-01-03": 1},
+        )
+
+    def test_ingest_later_export(self):
+        song = Song.objects.get(title="Song 2023 0")
+        self.ingest(
+            [
+                extended_event("2024-01-01T10:00:00Z", "Song 2023 0", "Artist 0"),
+                extended_event("2024-01-01T11:00:00Z", "Song 2023 0", "Artist 0"),
+            ]
+        )
+        # Picks up partway through the day, with a play from before
+        report = self.ingest(
+            [
+                extended_event("2024-01-01T11:00:00Z", "Song 2023 0", "Artist 0"),
+                extended_event("2024-01-01T12:00:00Z", "Song 2023 0", "Artist 0"),
+            ]
+        )
+        self.assertEqual(report["counted"], 1)
+        self.assertEqual(self.get_play_counts(song), {"2024-01-01": 3})
+        count = SongPlayCount.objects.get(song=song)
+        self.assertEqual(count.ms_played, 600_000)
+        self.assertEqual(count.last_played_at.hour, 12)
+
+        # Doesn't overlap at all
+        self.ingest([extended_event("2024-01-01T18:00:00Z", "Song 2023 0", "Artist 0")])
+        self.assertEqual(self.get_play_counts(song), {"2024-01-01": 4})
+
+    def test_ingest_matches_albums(self):
+        live = Song.objects.create(
+            title="Song 2023 0",
+            year=2023,
+            album=Album.objects.create(title="Live", year=2023),
+        )
+        live.artists.add(self.artists[0])
+        self.ingest(
+            [
+                extended_event(
+                    "2024-01-01T10:00:00Z", "Song 2023 0", "Artist 0", "live"
+                ),
+                extended_event(
+                    "2024-01-01T10:00:00Z", "Song 2023 0", "Artist 0", "Album 2023 0"
+                ),
+            ]
+        )
+        self.assertEqual(self.get_play_counts(live), {"2024-01-01": 1})
+        self.assertEqual(
+            self.get_play_counts(Song.objects.get(album__title="Album 2023 0")),
+            {"2024-01-01": 1},
+        )
+
+    def test_command(self):
+        song = Song.objects.get(title="Song 2023 1")
+        with tempfile.TemporaryDirectory() as directory:
+            # A day split between two files of the same export adds up
+            first = Path(directory) / "StreamingHistory_music_0.json"
+            first.write_text(
+                json.dumps(
+                    [
+                        {
+                            "endTime": "2024-03-01 09:00",
+                            "artistName": "Artist 2",
+                            "trackName": "Song 2023 1",
+                            "msPlayed": 180000,
+                        }
+                    ]
+                )
+            )
+            second = Path(directory) / "history.csv"
+            second.write_text(
+                "endTime,artistName,trackName,msPlayed\n"
+                "2024-03-01 21:00,Artist 2,Song 2023 1,180000\n"
+                "2024-03-01 22:00,Artist 2,Song 2023 1,180000\n"
+            )
+            stdout = StringIO()
+            call_command(
+                "ingest_listening_history", str(first), str(second), stdout=stdout
+            )
+            call_command(
+                "ingest_listening_history", str(first), str(second), stdout=stdout
+            )
+        self.assertIn(
+            "3 plays matched, 0 already counted, 1 song days counted", stdout.getvalue()
+        )
+        self.assertIn("3 plays matched, 3 already counted", stdout.getvalue())
+        self.assertEqual(SongPlayCount.objects.get(song=song).plays, 3)
+        self.assertEqual(SongPlayCount.objects.get(song=song).ms_played, 540000)
+
+
+@override_settings(PERFORMANCE_METRICS_ENABLED=True, PERFORMANCE_SERVER_TIMING=True)
+class PerformanceTests(PublishedListsTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/obsessions/2023")
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r"^total;dur=[\d.]+, db;dur=[\d.]+;")
+        self.assertIn(f'desc="{len(queries)} queries"', timing)
+        self.assertRegex(timing, r"template;dur=[\d.]+$")
+
+        with self.settings(PERFORMANCE_SERVER_TIMING=False):
+            self.assertNotIn("Server-Timing", self.client.get("/obsessions/2023"))
+
+    def test_records_views(self):
+        for _ in range(3):
+            self.client.get("/obsessions/2023")
+        self.client.force_login(self.staff)
+        self.client.get("/admin/")
+
+        summary = metrics.get_summary()
+        # Only the tracker's own views
+        self.assertEqual(list(summary), ["obsessions"])
+        self.assertEqual(summary["obsessions"]["requests"], 3)
+        for metric in metrics.METRICS:
+            with self.subTest(metric=metric):
+                self.assertEqual(
+                    list(summary["obsessions"][metric]), ["p50", "p95", "p99"]
+                )
+
+    def test_percentiles(self):
+        histogram = metrics.RollingHistogram(100)
+        self.assertEqual(histogram.percentiles(), {})
+        for value in range(200, 0, -1):
+            histogram.add(value)
+        # Only the latest 100 samples, 100 down to 1
+        self.assertEqual(histogram.percentiles(), {"p50": 51, "p95": 96, "p99": 100})
+
+    def test_disabled(self):
+        with self.settings(PERFORMANCE_METRICS_ENABLED=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                PerformanceMiddleware(lambda request: None)
+            response = self.client.get("/obsessions/2023")
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(metrics.get_summary(), {})
+
+    def test_staff_only(self):
+        self.client.get("/obsessions/2023")
+        self.assertEqual(self.client.get("/performance/").status_code, 302)
+
+        self.client.force_login(User.objects.create_user("visitor"))
+        self.assertEqual(self.client.get("/performance/").status_code, 302)
+
+        self.client.force_login(self.staff)
+        response = self.client.get("/performance/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["views"]["obsessions"]["requests"], 1)
+
+
+class DatabaseTuningTests(TransactionTestCase):
+    def get_pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        self.assertEqual(
+            self.get_pragma("cache_size"), settings.SQLITE_PRAGMAS["cache_size"]
+        )
+        self.assertEqual(
+            self.get_pragma("busy_timeout"),
+            connection.settings_dict["OPTIONS"]["timeout"] * 1000,
+        )
+
+    def test_optimize_when_due(self):
+        connection.ensure_connection()
+        connection.next_optimize = monotonic() - 1
+        with CaptureQueriesContext(connection) as queries:
+            request_finished.send(sender=self.__class__)
+        self.assertEqual([query["sql"] for query in queries], ["PRAGMA optimize"])
+        self.assertGreater(connection.next_optimize, monotonic())
+
+        with CaptureQueriesContext(connection) as queries:
+            request_finished.send(sender=self.__class__)
+        self.assertEqual(len(queries), 0)
+
+
+class SnapshotTests(SimpleTestCase):
+    def test_write_snapshot(self):
+        source = sqlite3.connect(":memory:")
+        source.execute("CREATE TABLE tracker_artist (name TEXT)")
+        source.execute("INSERT INTO tracker_artist VALUES ('Snapshotted')")
+        source.commit()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "snapshot.sqlite3")
+            snapshot.write_snapshot(path, source)
+
+            reader = sqlite3.connect(
+                f"{Path(path).as_uri()}?mode=ro&immutable=1", uri=True
+            )
+            try:
+                self.assertEqual(
+                    reader.execute("SELECT name FROM tracker_artist").fetchall(),
+                    [("Snapshotted",)],
+                )
+                self.assertEqual(
+                    reader.execute("PRAGMA journal_mode").fetchone(), ("delete",)
+                )
+            finally:
+                reader.close()
+            # The temporary copy was swapped into place
+            self.assertEqual(os.listdir(directory), ["snapshot.sqlite3"])
+
+    def test_router(self):
+        router = snapshot.SnapshotRouter()
+        self.assertIsNone(router.db_for_read(Album))
+
+        token = snapshot.reading.set(True)
+        try:
+            self.assertEqual(router.db_for_read(Album), "snapshot")
+            self.assertIsNone(router.db_for_read(User))
+            self.assertEqual(router.db_for_write(Album), "default")
+        finally:
+            snapshot.reading.reset(token)
+
+        snapshot_artist, primary_artist = Artist(), Artist()
+        snapshot_artist._state.db = "snapshot"
+        primary_artist._state.db = "default"
+        self.assertTrue(router.allow_relation(snapshot_artist, primary_artist))
+
+        self.assertFalse(router.allow_migrate("snapshot", "tracker"))
+        self.assertIsNone(router.allow_migrate("default", "tracker"))
+
+    def test_disabled_for_test_database(self):
+        self.assertFalse(snapshot.is_enabled())
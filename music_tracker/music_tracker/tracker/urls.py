@@ -1,12 +1,67 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import path, register_converter
 
-from . import views
+from . import api, async_views, converters, views
 
-urlpatterns = [
-    path("", views.index, name="index"),
-    path("albums/<str:year>", views.top_ten_list, name="top_ten"),
-    path("obsessions/<str:year>", views.obsessions_list, name="obsessions"),
-    path("artist/<str:id>", views.artist_stats, name="artist_stats"),
-    path("top-100/<str:year>", views.spotify_top_100_list, name="spotify_top_100"),
-    path("top-100-stats/", views.spotify_top_100_stats, name="spotify_top_100_stats"),
+register_converter(converters.DecadeConverter, "decade")
+
+
+def get_public_urlpatterns(public_views):
+    """The public pages, served by `public_views`, either views or async_views"""
+    return [
+        path("", public_views.index, name="index"),
+        path("albums/<int:year>", public_views.top_ten_list, name="top_ten"),
+        path(
+            "albums/decade/<decade:decade>",
+            public_views.top_ten_decade,
+            name="top_ten_decade",
+        ),
+        path(
+            "obsessions/stats", public_views.obsessions_stats, name="obsessions_stats"
+        ),
+        path("obsessions/<int:year>", public_views.obsessions_list, name="obsessions"),
+        path("artist/<str:id>", public_views.artist_stats, name="artist_stats"),
+        path(
+            "artist/<str:id>/<int:first_year>-<int:last_year>",
+            public_views.artist_stats_between,
+            name="artist_stats_between",
+        ),
+        path(
+            "top-100/<int:year>",
+            public_views.spotify_top_100_list,
+            name="spotify_top_100",
+        ),
+        path(
+            "top-100-stats/",
+            public_views.spotify_top_100_stats,
+            name="spotify_top_100_stats",
+        ),
+        path("search", public_views.search_page, name="search"),
+    ]
+
+
+api_urlpatterns = [
+    path("api/top-ten", api.top_ten_lists, name="api_top_ten_lists"),
+    path("api/top-ten/<int:year>", api.top_ten_list, name="api_top_ten"),
+    path("api/obsessions", api.obsessions_lists, name="api_obsessions_lists"),
+    path("api/obsessions/stats", api.obsessions_stats, name="api_obsessions_stats"),
+    path("api/obsessions/<int:year>", api.obsessions_list, name="api_obsessions"),
+    path("api/top-100", api.spotify_top_100_lists, name="api_spotify_top_100_lists"),
+    path(
+        "api/top-100/stats",
+        api.spotify_top_100_stats,
+        name="api_spotify_top_100_stats",
+    ),
+    path(
+        "api/top-100/<int:year>", api.spotify_top_100_list, name="api_spotify_top_100"
+    ),
+    path("api/artists/<str:id>", api.artist, name="api_artist"),
+    path("api/artists/<str:id>/ranking", api.artist_ranking, name="api_artist_ranking"),
+]
+
+urlpatterns = get_public_urlpatterns(
+    async_views if settings.ASYNC_PUBLIC_VIEWS else views
+) + [
+    path("performance/", views.performance_stats, name="performance_stats"),
+    *api_urlpatterns,
 ]
@@ -0,0 +1,104 @@
+"""Row versions for conditional GET, see tracker/conditional.py.
+
+Each is a single aggregate query. The page invalidation signals bump updated_at on
+every list and artist a change shows up on, so a list's or an artist's own row
+also covers the titles and credits of its songs and albums.
+"""
+
+from uuid import UUID
+
+from django.db.models import Count, F, Func, IntegerField, Max, Q, Subquery
+from django.http import Http404
+
+from music_tracker.tracker.models import Artist, ArtistAlbumRanking, List
+
+
+def _found(version):
+    """`version`, or None when its aggregate matched no rows"""
+    return version if version["updated"] else None
+
+
+def _over_table(queryset, function, field, **kwargs):
+    """`function` of `field` over all of `queryset`, as a scalar subquery"""
+    return Subquery(
+        queryset.order_by().values(value=Func(F(field), function=function, **kwargs))
+    )
+
+
+def get_lists_version(model):
+    # Every list of the kind, since unpublishing one bumps its updated_at too. Any
+    # change to their entries bumps the lists' own updated_at, so the stats built
+    # from them don't need to scan the entries.
+    return _found(
+        model.objects.aggregate(
+            updated=Max("updated_at"), lists=Count("id", filter=Q(published=True))
+        )
+    )
+
+
+def get_list_version(model, year, entries=None):
+    aggregates = {"updated": Max("updated_at")}
+    if entries:
+        aggregates |= {
+            "entries_updated": Max(f"{entries}__updated_at"),
+            "entries": Count(entries),
+        }
+    return _found(model.get_published().filter(year=year).aggregate(**aggregates))
+
+
+def get_artist_id(id):
+    try:
+        return UUID(id)
+    except ValueError:
+        raise Http404
+
+
+def get_artist_version(id):
+    # Publishing a list changes the artist's stats without touching the artist
+    return (
+        Artist.objects.filter(id=get_artist_id(id))
+        .values(
+            "updated_at",
+            lists_updated=_over_table(List.objects, "MAX", "updated_at"),
+            lists=_over_table(List.objects, "COUNT", "id", output_field=IntegerField()),
+        )
+        .first()
+    )
+
+
+def get_ranking_version(id):
+    return _found(
+        ArtistAlbumRanking.objects.filter(
+            artist_id=get_artist_id(id), published=True
+        ).aggregate(
+            updated=Max("updated_at"),
+            artist_updated=Max("artist__updated_at"),
+            entries_updated=Max("artistalbumrankingentry__updated_at"),
+            entries=Count("artistalbumrankingentry"),
+        )
+    )
+
+
+def get_navigation_version():
+    """Every page shows the navigation, so every HTML page version covers every
+    list"""
+    return _found(
+        List.objects.aggregate(
+            updated=Max("updated_at"), lists=Count("id", filter=Q(published=True))
+        )
+    )
+
+
+def get_list_page_version(model, first_year, last_year):
+    """The navigation's version, for pages of `model`'s lists from `first_year` to
+    `last_year`, or None when none of them are published"""
+    published = Q(
+        published=True,
+        **{f"{model._meta.model_name}__year__range": (first_year, last_year)},
+    )
+    version = List.objects.aggregate(
+        updated=Max("updated_at"),
+        lists=Count("id", filter=Q(published=True)),
+        pages=Count("id", filter=published),
+    )
+    return version if version["pages"] else None
@@ -1,17 +1,35 @@
-from django.db.models import Count
+import os
+from uuid import UUID
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db.models import Count, Q
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from music_tracker.tracker import (
+    caching,
+    conditional,
+    metrics,
+    search,
+    snapshot,
+    stats,
+    versions,
+)
 from music_tracker.tracker.models import (
     Album,
     Artist,
+    ObsessionArtistSummary,
     ObsessionList,
     ObsessionSongs,
+    Song,
     SpotifyTop100List,
     SpotifyTop100Songs,
     TopTenAlbumsList,
 )
 
 
+@snapshot.reads_snapshot
 def index(request):
     most_recent_top_ten = TopTenAlbumsList.get_most_recent()
 
@@ -19,10 +37,22 @@ def index(request):
 
 
 def get_navigation_links():
-    top_ten_lists = TopTenAlbumsList.get_published().order_by("year")
-    obsessions_lists = ObsessionList.get_published().order_by("year")
-    spotify_lists = SpotifyTop100List.get_published().order_by("year")
+    return caching.get_navigation(build_navigation_links)
+
+
+def build_navigation_links():
+    return navigation_links(*get_navigation_lists())
+
 
+def get_navigation_lists():
+    return [
+        TopTenAlbumsList.get_published().order_by("year"),
+        ObsessionList.get_published().order_by("year"),
+        SpotifyTop100List.get_published().order_by("year"),
+    ]
+
+
+def navigation_links(top_ten_lists, obsessions_lists, spotify_lists):
     top_ten_links = [
         {
             "title": list.title,
@@ -31,6 +61,12 @@ def get_navigation_links():
         for list in top_ten_lists
     ]
 
+    decades = sorted({list.year // 10 * 10 for list in top_ten_lists})
+    top_ten_links += [
+        {"title": f"Top Albums of the {decade}s", "year": f"decade/{decade}s"}
+        for decade in decades
+    ]
+
     obsession_links = [
         {
             "title": list.title,
@@ -58,138 +94,209 @@ def get_navigation_links():
     }
 
 
+def album_entries(albums, ranked=True):
+    return [
+        {
+            "album_title": album.title,
+            "artists": list(album.artists.all()),
+            **({"rank": album.rank} if ranked else {}),
+        }
+        for album in albums
+    ]
+
+
+def song_entries(entries, ordered=False):
+    return [
+        {
+            "title": entry.song.title,
+            "artists": list(entry.song.artists.all()),
+            **({"ordering": entry.ordering} if ordered else {}),
+        }
+        for entry in entries
+    ]
+
+
+@conditional.cache_public
+@snapshot.reads_snapshot
+@conditional.versioned(
+    lambda year: versions.get_list_page_version(TopTenAlbumsList, year, year)
+)
+@caching.cached_page("top_ten")
 def top_ten_list(request, year):
     list_record = get_object_or_404(TopTenAlbumsList, year=year, published=True)
 
-    top_ten_records = Album.get_top_ten(year)
-    honorable_mentions_records = Album.get_honorable_mentions(year)
+    top_ten_records = Album.get_top_ten(year).for_display()
+    honorable_mentions_records = Album.get_honorable_mentions(year).for_display()
 
     context = {
         "list_title": list_record.title,
         "year": list_record.year,
-        "top_ten": [
-            {
-                "album_title": album.title,
-                "artists": [artist for artist in album.artists.all().order_by("name")],
-                "rank": album.rank,
-            }
-            for album in top_ten_records
-        ],
-        "honorable_mentions": [
-            {
-                "album_title": album.title,
-                "artists": [artist for artist in album.artists.all().order_by("name")],
-            }
-            for album in honorable_mentions_records
-        ],
+        "top_ten": album_entries(top_ten_records),
+        "honorable_mentions": album_entries(honorable_mentions_records, ranked=False),
         "navigation": get_navigation_links(),
     }
     return render(request, "tracker/top-ten-albums.html", context)
 
 
-def obsessions_list(request, year):
-    if year == "stats":
-        return obsessions_stats(request)
+def decade_years(list_records, albums):
+    """The top ten of each list in `list_records`, from `albums`"""
+    albums_by_year = {}
+    for album in albums:
+        albums_by_year.setdefault(album.year, []).append(album)
+
+    return [
+        {
+            "list_title": list_record.title,
+            "year": list_record.year,
+            "top_ten": album_entries(albums_by_year.get(list_record.year, [])),
+        }
+        for list_record in list_records
+    ]
+
+
+@conditional.cache_public
+@snapshot.reads_snapshot
+@conditional.versioned(
+    lambda decade: versions.get_list_page_version(TopTenAlbumsList, decade, decade + 9)
+)
+@caching.cached_page("top_ten_decade")
+def top_ten_decade(request, decade):
+    list_records = list(
+        TopTenAlbumsList.get_published()
+        .filter(year__range=(decade, decade + 9))
+        .order_by("year")
+    )
+    if not list_records:
+        raise Http404
+
+    context = {
+        "page_title": f"Top Albums of the {decade}s",
+        "decade": decade,
+        "years": decade_years(
+            list_records, Album.get_top_tens_between(decade, decade + 9).for_display()
+        ),
+        "navigation": get_navigation_links(),
+    }
+    return render(request, "tracker/top-ten-decade.html", context)
+
 
+@conditional.cache_public
+@snapshot.reads_snapshot
+@conditional.versioned(
+    lambda year: versions.get_list_page_version(ObsessionList, year, year)
+)
+@caching.cached_page("obsessions")
+def obsessions_list(request, year):
     list_record = get_object_or_404(ObsessionList, year=year, published=True)
 
     context = {
         "list_title": list_record.title,
         "year": list_record.year,
-        "songs": [
-            {
-                "title": obsession.song.title,
-                "artists": [
-                    artist for artist in obsession.song.artists.all().order_by("name")
-                ],
-            }
-            for obsession in list_record.get_songs().all()
-        ],
+        "songs": song_entries(list_record.get_songs().for_display()),
         "navigation": get_navigation_links(),
     }
 
     return render(request, "tracker/obsessions.html", context)
 
 
+@conditional.cache_public
+@snapshot.reads_snapshot
+@conditional.versioned(
+    lambda year: versions.get_list_page_version(SpotifyTop100List, year, year)
+)
+@caching.cached_page("spotify_top_100")
 def spotify_top_100_list(request, year):
     list_record = get_object_or_404(SpotifyTop100List, year=year, published=True)
 
     context = {
         "list_title": list_record.title,
         "year": list_record.year,
-        "songs": [
-            {
-                "title": entry.song.title,
-                "artists": [
-                    artist for artist in entry.song.artists.all().order_by("name")
-                ],
-                "ordering": entry.ordering,
-            }
-            for entry in list_record.get_songs().all()
-        ],
+        "songs": song_entries(list_record.get_songs().for_display(), ordered=True),
         "navigation": get_navigation_links(),
     }
 
     return render(request, "tracker/top-100.html", context)
 
 
-def obsessions_stats(request):
-    all_songs = ObsessionSongs.get_songs()
-    by_artist = all_songs.values("song__artists__name", "song__artists__id")
-
-    song_count = by_artist.annotate(Count("song_id", distinct=True)).order_by(
-        "-song_id__count",
-        "song__artists__name",
-    )
-    list_count = by_artist.annotate(Count("obsession_list_id", distinct=True)).order_by(
-        "-obsession_list_id__count",
-        "song__artists__name",
+def get_obsession_summaries():
+    return ObsessionArtistSummary.objects.values(
+        "artist_id", "artist__name", "song_count", "list_count"
     )
 
-    context = {
-        "page_title": "Obsessions Stats",
+
+def obsessions_stats_tables(summaries):
+    return {
         "by_songs": [
             {
-                "name": record["song__artists__name"],
-                "id": record["song__artists__id"],
-                "songs": record["song_id__count"],
+                "name": record["artist__name"],
+                "id": record["artist_id"],
+                "songs": record["song_count"],
             }
-            for record in song_count.all()
+            for record in sorted(
+                summaries, key=lambda x: (-x["song_count"], x["artist__name"])
+            )
         ],
         "by_years": [
             {
-                "name": record["song__artists__name"],
-                "id": record["song__artists__id"],
-                "years": record["obsession_list_id__count"],
+                "name": record["artist__name"],
+                "id": record["artist_id"],
+                "years": record["list_count"],
             }
-            for record in list_count.all()
+            for record in sorted(
+                summaries, key=lambda x: (-x["list_count"], x["artist__name"])
+            )
         ],
+    }
+
+
+@conditional.cache_public
+@snapshot.reads_snapshot
+@conditional.versioned(versions.get_navigation_version)
+@caching.cached_page("obsessions_stats")
+def obsessions_stats(request):
+    context = {
+        "page_title": "Obsessions Stats",
+        **obsessions_stats_tables(list(get_obsession_summaries())),
         "navigation": get_navigation_links(),
     }
 
     return render(request, "tracker/obsessions-stats.html", context)
 
 
-def artist_stats(request, id):
-    artist = get_object_or_404(Artist, id=id)
+def artist_page_arg(id):
+    try:
+        return str(UUID(id))
+    except ValueError:
+        return id
 
-    # Show a table of which years they have songs on the obsessions list
-    obsession_list_songs = artist.get_obsession_list_songs()
 
-    song_count = obsession_list_songs.aggregate(Count("song_id", distinct=True))
-    list_count = obsession_list_songs.aggregate(
-        Count("obsession_list_id", distinct=True)
-    )
+def get_summary_artists():
+    return Artist.objects.select_related("artistalbumranking", "obsessionartistsummary")
 
-    by_year = obsession_list_songs.values("obsession_list_id__year")
-    song_count_by_year = by_year.annotate(Count("song_id")).order_by(
-        "obsession_list_id__year"
-    )
 
-    # Get album ranking for this artist
+def get_ranked_albums(artist, years=None):
+    """The artist's published album ranking, or None"""
     album_ranking = artist.get_published_album_ranking()
+    if not album_ranking:
+        return None
+    ranked_albums = album_ranking.get_ranked_albums()
+    if years:
+        ranked_albums = ranked_albums.filter(album__year__range=years)
+    return ranked_albums
+
+
+def get_span_obsession_songs(artist, years):
+    """The artist's obsession list entries in the span `years`"""
+    return artist.get_obsession_list_songs().filter(obsession_list__year__range=years)
+
+
+def artist_summary(
+    artist, ranked_albums, listed_albums, obsession_stats, years=None, span_songs=0
+):
+    """The artist page's context from its fetched parts. `span_songs` is the number
+    of obsession list songs in the span `years`."""
     ranking_data = None
-    if album_ranking:
+    if ranked_albums is not None:
         ranking_data = {
             "albums": [
                 {
@@ -198,162 +305,223 @@ def artist_stats(request, id):
                     "rank": entry.rank,
                     "notes": entry.notes,
                 }
-                for entry in album_ranking.get_ranked_albums()
+                for entry in ranked_albums
             ]
         }
 
-    context = {
+    # One fetch of every listed album, split up by how they charted
+    albums = {"charted": [], "honorable_mentions": [], "other_albums": []}
+    for album in listed_albums:
+        if album.rank is None:
+            albums["other_albums"].append({"title": album.title, "year": album.year})
+        elif album.rank < 11:
+            albums["charted"].append(
+                {"title": album.title, "year": album.year, "rank": album.rank}
+            )
+        else:
+            albums["honorable_mentions"].append(
+                {"title": album.title, "year": album.year}
+            )
+
+    # Show a table of which years they have songs on the obsessions list
+    obsession_lists = [
+        {"year": stat.year, "song_count": stat.song_count} for stat in obsession_stats
+    ]
+    if years:
+        # The summary covers every year, so the span's songs are counted directly
+        obsession_summary = ObsessionArtistSummary(
+            artist=artist,
+            song_count=span_songs,
+            list_count=len(obsession_lists),
+        )
+    else:
+        try:
+            obsession_summary = artist.obsessionartistsummary
+        except ObsessionArtistSummary.DoesNotExist:
+            obsession_summary = ObsessionArtistSummary(artist=artist)
+
+    return {
         "artist_name": artist.name,
         "artist_id": artist.id,
+        "years": years,
         "album_ranking": ranking_data,
-        "albums": {
-            "charted": [
-                {
-                    "title": album.title,
-                    "year": album.year,
-                    "rank": album.rank,
-                }
-                for album in artist.get_top_ten_albums().all()
-            ],
-            "honorable_mentions": [
-                {
-                    "title": album.title,
-                    "year": album.year,
-                }
-                for album in artist.get_honorable_mention_albums().all()
-            ],
-            "other_albums": [
-                {
-                    "title": album.title,
-                    "year": album.year,
-                }
-                for album in artist.get_other_albums().all()
-            ],
-        },
+        "albums": albums,
         "obsessions": {
-            "song_count": song_count["song_id__count"],
-            "list_count": list_count["obsession_list_id__count"],
-            "lists": [
-                {
-                    "year": obsession_list["obsession_list_id__year"],
-                    "song_count": obsession_list["song_id__count"],
-                }
-                for obsession_list in song_count_by_year
-            ],
+            "song_count": obsession_summary.song_count,
+            "list_count": obsession_summary.list_count,
+            "lists": obsession_lists,
         },
+    }
+
+
+def build_artist_summary(id, years=None):
+    """Everything on an artist's page, limited to the (first, last) span `years`
+    when it's given"""
+    artist = get_object_or_404(get_summary_artists(), id=id)
+
+    span_songs = 0
+    if years:
+        span_songs = get_span_obsession_songs(artist, years).aggregate(
+            songs=Count("song", distinct=True)
+        )["songs"]
+
+    return artist_summary(
+        artist,
+        get_ranked_albums(artist, years),
+        artist.get_listed_albums(years),
+        artist.get_obsession_stats(years),
+        years,
+        span_songs,
+    )
+
+
+@conditional.cache_public
+@snapshot.reads_snapshot
+@conditional.versioned(versions.get_artist_version)
+@caching.cached_page("artist_stats", artist_page_arg)
+def artist_stats(request, id):
+    context = {
+        **caching.get_artist_summary(artist_page_arg(id), build_artist_summary),
         "navigation": get_navigation_links(),
     }
 
     return render(request, "tracker/artist-stats.html", context)
 
 
+# Spans are open ended, so there's no way to invalidate their pages; they rely on
+# the year indexes instead
+@conditional.cache_public
+@snapshot.reads_snapshot
+@conditional.versioned(
+    lambda id, first_year, last_year: versions.get_artist_version(id)
+)
+def artist_stats_between(request, id, first_year, last_year):
+    if first_year > last_year:
+        raise Http404
+
+    context = {
+        **build_artist_summary(artist_page_arg(id), (first_year, last_year)),
+        "navigation": get_navigation_links(),
+    }
+
+    return render(request, "tracker/artist-stats.html", context)
+
+
+def get_published_spotify_years():
+    return (
+        SpotifyTop100List.get_published()
+        .order_by("year")
+        .values_list("year", flat=True)
+    )
+
+
+@conditional.cache_public
+@snapshot.reads_snapshot
+@conditional.versioned(versions.get_navigation_version)
+@caching.cached_page("spotify_top_100_stats")
 def spotify_top_100_stats(request):
-    # Get all published Spotify Top 100 lists ordered by year
-    published_lists = SpotifyTop100List.get_published().order_by("year")
-
-    if not published_lists.exists():
-        context = {
-            "page_title": "Spotify Top 100 Stats",
-            "years_data": [],
-            "navigation": get_navigation_links(),
-        }
-        return render(request, "tracker/spotify-top-100-stats.html", context)
-
-    years_data = []
-    previous_year_data = {}  # Store artist song counts from the previous year
-    all_artists_by_years = {}  # Track which artists appear in which years
-
-    for current_list in published_lists:
-        # Get all songs for this year's list
-        songs_this_year = (
-            SpotifyTop100Songs.objects.filter(top_100_list=current_list)
-            .select_related("song")
-            .prefetch_related("song__artists")
-        )
+    published_years = list(get_published_spotify_years())
 
-        # Count songs per artist for this year
-        artist_counts = {}
-        for song_entry in songs_this_year:
-            for artist in song_entry.song.artists.all():
-                if artist.id not in artist_counts:
-                    artist_counts[artist.id] = {"name": artist.name, "count": 0}
-                artist_counts[artist.id]["count"] += 1
-
-                # Track this artist for the years club calculation
-                if artist.id not in all_artists_by_years:
-                    all_artists_by_years[artist.id] = {
-                        "name": artist.name,
-                        "years": set(),
-                    }
-                all_artists_by_years[artist.id]["years"].add(current_list.year)
-
-        # Create the data structure for this year
-        year_data = {
-            "year": current_list.year,
-            "is_first_year": len(years_data) == 0,
-            "artists": [],
-        }
+    context = {
+        "page_title": "Spotify Top 100 Stats",
+        **caching.get_spotify_top_100_stats(
+            published_years, stats.spotify_top_100_stats
+        ),
+        "navigation": get_navigation_links(),
+    }
 
-        # Create artist entries with previous year comparison
-        for artist_id, data in artist_counts.items():
-            artist_entry = {
-                "name": data["name"],
-                "id": artist_id,
-                "current_count": data["count"],
-                "previous_count": previous_year_data.get(artist_id, {}).get("count", 0),
-            }
+    return render(request, "tracker/spotify-top-100-stats.html", context)
 
-            # Calculate change (only meaningful if not the first year)
-            if not year_data["is_first_year"]:
-                artist_entry["change"] = (
-                    artist_entry["current_count"] - artist_entry["previous_count"]
-                )
 
-            year_data["artists"].append(artist_entry)
+# The most matches a search shows, before the ones the public pages don't show are
+# dropped
+SEARCH_LIMIT = 100
 
-        # Sort artists by count (descending) then name (ascending)
-        year_data["artists"].sort(key=lambda x: (-x["current_count"], x["name"]))
 
-        # Count unique artists for this year
-        year_data["total_artists"] = len(artist_counts)
+def get_search_query(request):
+    return request.GET.get("q", "").strip()[:100]
 
-        years_data.append(year_data)
 
-        # Store this year's data for next iteration
-        previous_year_data = artist_counts
+def get_search_querysets(hits):
+    """The artists, albums and songs among `hits`, from `search.search`, that the
+    public pages show"""
+    ids = {model: [] for model in search.KINDS}
+    for model, id in hits:
+        ids[model].append(id)
 
-    # Calculate years groups data
-    total_published_lists = len(published_lists)
-    years_groups = {}
+    published_songs = Q(
+        id__in=ObsessionSongs.objects.filter(obsession_list__published=True).values(
+            "song_id"
+        )
+    ) | Q(
+        id__in=SpotifyTop100Songs.objects.filter(top_100_list__published=True).values(
+            "song_id"
+        )
+    )
 
-    for artist_id, artist_data in all_artists_by_years.items():
-        num_years = len(artist_data["years"])
-        if num_years >= 2:  # Only include artists with 2+ years
-            if num_years not in years_groups:
-                years_groups[num_years] = []
-            years_groups[num_years].append(
-                {"name": artist_data["name"], "id": artist_id}
-            )
+    return [
+        Artist.objects.filter(id__in=ids[Artist]),
+        Album.objects.filter(
+            id__in=ids[Album],
+            listened=True,
+            year__in=TopTenAlbumsList.get_published().values("year"),
+        ).for_display(),
+        Song.objects.filter(published_songs, id__in=ids[Song]).for_display(),
+    ]
 
-    # Sort artists alphabetically within each group
-    for num_years in years_groups:
-        years_groups[num_years].sort(key=lambda x: x["name"])
 
-    # Create ordered list of groups (2 years through total years)
-    ordered_groups = []
-    for num_years in range(2, total_published_lists + 1):
-        if num_years in years_groups:
-            ordered_groups.append(
-                {"num_years": num_years, "artists": years_groups[num_years]}
-            )
-        else:
-            ordered_groups.append({"num_years": num_years, "artists": []})
+def search_results(hits, artists, albums, songs):
+    """The search page's results, best match first"""
+    order = {id: position for position, (model, id) in enumerate(hits)}
+
+    def ranked(records):
+        return sorted(records, key=lambda record: order[record.id])
+
+    return {
+        "artists": [
+            {"id": artist.id, "name": artist.name} for artist in ranked(artists)
+        ],
+        "albums": [
+            {
+                "title": album.title,
+                "year": album.year,
+                "artists": list(album.artists.all()),
+            }
+            for album in ranked(albums)
+        ],
+        "songs": [
+            {
+                "title": song.title,
+                "album_title": song.album.title if song.album else None,
+                "artists": list(song.artists.all()),
+            }
+            for song in ranked(songs)
+        ],
+    }
+
+
+@conditional.cache_public
+@snapshot.reads_snapshot
+def search_page(request):
+    query = get_search_query(request)
+    hits = search.search(query, limit=SEARCH_LIMIT)
 
     context = {
-        "page_title": "Spotify Top 100 Stats",
-        "years_data": years_data,
-        "years_groups": ordered_groups,
+        "page_title": "Search",
+        "query": query,
+        **search_results(hits, *get_search_querysets(hits)),
         "navigation": get_navigation_links(),
     }
 
-    return render(request, "tracker/spotify-top-100-stats.html", context)
+    return render(request, "tracker/search.html", context)
+
+
+@staff_member_required
+def performance_stats(request):
+    return JsonResponse(
+        {
+            "enabled": settings.PERFORMANCE_METRICS_ENABLED,
+            "pid": os.getpid(),
+            "views": metrics.get_summary(),
+        }
+    )